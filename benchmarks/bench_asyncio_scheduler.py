@@ -0,0 +1,73 @@
+"""Benchmark of the asyncio scheduler against the multiprocessing scheduler
+on a wide graph of simulated-latency LLM calls.
+
+Usage: python benchmarks/bench_asyncio_scheduler.py --calls 5000 --latency 0.05
+"""
+import argparse
+import asyncio
+import time
+from typing import Callable
+
+import feste
+from feste import scheduler
+from feste.prompt import Prompt
+from feste.task import FesteBase, feste_task
+
+
+class SimulatedLLM(FesteBase):
+    """Backend that simulates the network latency of a completion call.
+
+    :param latency: simulated latency in seconds
+    """
+    def __init__(self, latency: float) -> None:
+        super().__init__()
+        self.latency = latency
+
+    @classmethod
+    def async_variants(cls) -> dict[Callable, Callable]:
+        return {cls.complete._obj: cls.acomplete}
+
+    @feste_task
+    def complete(self, prompt: str) -> str:
+        time.sleep(self.latency)
+        return prompt.upper()
+
+    async def acomplete(self, prompt: str) -> str:
+        await asyncio.sleep(self.latency)
+        return prompt.upper()
+
+
+def build_graph(num_calls: int, latency: float) -> list:
+    prompt = Prompt("Answer the question: {{question}}")
+    llm = SimulatedLLM(latency)
+    return [llm.complete(prompt(question=f"question {i}"))
+            for i in range(num_calls)]
+
+
+def run(name: str, num_calls: int, latency: float, **kwargs) -> None:  # type: ignore
+    graph = build_graph(num_calls, latency)
+    start = time.perf_counter()
+    feste.compute(graph, **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>16}: {elapsed:8.2f}s  {num_calls / elapsed:10.1f} calls/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--num-workers", type=int, default=None)
+    parser.add_argument("--max-concurrency", type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"{args.calls} calls with {args.latency * 1000:.0f}ms simulated latency")
+    run("asyncio", args.calls, args.latency,
+        scheduler_fn=scheduler.get_asyncio,
+        max_concurrency=args.max_concurrency)
+    run("multiprocessing", args.calls, args.latency,
+        scheduler_fn=scheduler.get_multiprocessing,
+        num_workers=args.num_workers)
+
+
+if __name__ == "__main__":
+    main()
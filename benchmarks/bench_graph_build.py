@@ -0,0 +1,80 @@
+"""Benchmark of the graph construction time and peak memory, building
+graphs of completion calls (``wide``, each call rendering its prompt) or
+of a single chain of dependent calls (``chain``) and collecting them.
+
+Usage: python benchmarks/bench_graph_build.py --nodes 10000,100000,1000000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from feste.backend.cohere import Cohere
+from feste.graph import FesteGraph
+from feste.prompt import Prompt
+from feste.task import feste_task
+
+
+@feste_task
+def append(text: str, suffix: str) -> str:
+    return text + suffix
+
+
+def build_wide(num_nodes: int) -> list:
+    prompt = Prompt("Answer the question: {{question}}")
+    api = Cohere(api_key="invalid-key", check_api_key=False)
+    return [api.generate(prompt(question=f"question {i}"))
+            for i in range(num_nodes // 2)]
+
+
+def build_chain(num_nodes: int) -> list:
+    output = append("", "a")
+    for _ in range(num_nodes - 1):
+        output = append(output, "a")
+    return [output]
+
+
+def run(shape: str, num_nodes: int, memory: bool) -> None:
+    build = build_wide if shape == "wide" else build_chain
+    gc.collect()
+    start = time.perf_counter()
+    outputs = build(num_nodes)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    feste_graph, _, _ = FesteGraph.collect(outputs)
+    collect_time = time.perf_counter() - start
+    num_tasks = len(feste_graph)
+    del outputs, feste_graph
+
+    peak = ""
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        outputs = build(num_nodes)
+        feste_graph, _, _ = FesteGraph.collect(outputs)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del outputs, feste_graph
+        peak = f"  peak {peak_bytes / 2**20:8.1f} MiB"
+    print(f"{shape:>6} {num_tasks:>9} tasks: build {build_time:7.2f}s  "
+          f"collect {collect_time:6.2f}s  "
+          f"{(build_time + collect_time) / num_tasks * 1e6:6.1f}us/task{peak}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", default="10000,100000,1000000",
+                        help="comma separated graph sizes")
+    parser.add_argument("--shape", choices=["wide", "chain", "all"], default="all")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the peak memory measurement (tracemalloc)")
+    args = parser.parse_args()
+
+    shapes = ["wide", "chain"] if args.shape == "all" else [args.shape]
+    for num_nodes in map(int, args.nodes.split(",")):
+        for shape in shapes:
+            run(shape, num_nodes, not args.no_memory)
+
+
+if __name__ == "__main__":
+    main()
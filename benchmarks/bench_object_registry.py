@@ -0,0 +1,53 @@
+"""Benchmark of the task payloads serialized by the multiprocessing
+scheduler with and without the worker object registry, on a graph of
+completion calls sharing the same backend and prompt.
+
+Usage: python benchmarks/bench_object_registry.py --calls 20000
+"""
+import argparse
+import time
+
+from dask.core import get_dependencies
+from dask.multiprocessing import _dumps
+
+from feste.backend.cohere import Cohere
+from feste.graph import FesteGraph
+from feste.prompt import Prompt
+from feste.registry import ObjectRegistry
+from feste.task import FesteBase
+
+
+def build_graph(num_calls: int) -> dict:
+    prompt = Prompt("Answer the question: {{question}}")
+    api = Cohere(api_key="invalid-key", check_api_key=False)
+    outputs = [api.generate(prompt(question=f"question {i}"))
+               for i in range(num_calls)]
+    feste_graph, _, _ = FesteGraph.collect(outputs)
+    return dict(feste_graph)
+
+
+def run(name: str, dsk: dict, dumps) -> None:  # type: ignore
+    start = time.perf_counter()
+    total_bytes = 0
+    for key, task in dsk.items():
+        data = {dep: None for dep in get_dependencies(dsk, key)}
+        total_bytes += len(dumps((task, data)))
+    elapsed = time.perf_counter() - start
+    print(f"{name:>10}: {elapsed:8.2f}s  {total_bytes / len(dsk):10.1f} bytes/task")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=20_000)
+    args = parser.parse_args()
+
+    dsk = build_graph(args.calls)
+    registry = ObjectRegistry()
+    registry.register_graph(dsk, (FesteBase,))
+    print(f"{len(dsk)} tasks, registry of {len(_dumps(registry))} bytes")
+    run("cloudpickle", dsk, _dumps)
+    run("registry", dsk, registry.dumps)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Benchmark of the prompt render throughput with and without the
+compiled template cache. Each render uses a pickled copy of the prompt,
+as done when tasks are sent to the worker processes.
+
+Usage: python benchmarks/bench_prompt_render.py --rows 100000
+"""
+import argparse
+import pickle
+import time
+
+from feste.prompt import Prompt
+
+TEMPLATE = """Your name is SmartChat and you are an assistant.
+{% for example in examples %}
+Question: {{ example.question }}
+Answer: {{ example.answer }}
+{% endfor %}
+You should answer the following question: {{ question }}
+Answer:"""
+
+EXAMPLES = [
+    {"question": "What is your name?", "answer": "SmartChat."},
+    {"question": "Who are you?", "answer": "An assistant."},
+]
+
+
+def render_uncached(prompt: Prompt, **kwargs) -> str:  # type: ignore
+    compiled_template = prompt.environment.from_string(prompt.template)
+    return compiled_template.render(**kwargs)
+
+
+def render_cached(prompt: Prompt, **kwargs) -> str:  # type: ignore
+    return Prompt.__call__._obj(prompt, **kwargs)  # type: ignore
+
+
+def run(name: str, render, payload: bytes, rows: int) -> None:  # type: ignore
+    start = time.perf_counter()
+    for i in range(rows):
+        prompt = pickle.loads(payload)
+        render(prompt, examples=EXAMPLES, question=f"question {i}")
+    elapsed = time.perf_counter() - start
+    print(f"{name:>10}: {elapsed:8.2f}s  {rows / elapsed:10.1f} renders/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    payload = pickle.dumps(Prompt(TEMPLATE))
+    run("uncached", render_uncached, payload, args.rows)
+    run("cached", render_cached, payload, args.rows)
+
+
+if __name__ == "__main__":
+    main()
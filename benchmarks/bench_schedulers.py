@@ -0,0 +1,160 @@
+"""Offline benchmark suite of the schedulers and optimizations, on graphs
+of simulated completions from the fake LLM backend (no API is called).
+
+For each graph shape, scheduler, optimization setting and scheduling
+policy (see feste.priority) it reports the
+makespan and tasks/sec with the simulated latency, and the scheduler
+overhead per task, measured as the makespan with zero latency divided
+by the number of tasks.
+
+Graph shapes:
+    wide     independent prompt -> completion calls
+    chain    a few deep chains of completions of the previous completion
+    diamond  fan-out of completions from a root, joined and completed again
+    mixed    two backends with different latencies and post-processing tasks
+    skewed   one deep chain of completions next to independent completions
+
+Usage: python benchmarks/bench_schedulers.py --tasks 2000 --latency 0.05
+"""
+import argparse
+import itertools
+import time
+from typing import Any, Callable
+
+import feste
+from feste import context, scheduler
+from feste.backend.fake import FakeLLM, LatencyModel
+from feste.graph import FesteGraph
+from feste.prompt import Prompt
+from feste.task import feste_task
+
+
+@feste_task
+def join(texts: list[str]) -> str:
+    return " ".join(text[:8] for text in texts)
+
+
+@feste_task
+def post_process(text: str) -> str:
+    return text.strip().lower()
+
+
+def wide(n: int, latency: LatencyModel) -> list:
+    prompt = Prompt("Answer the question: {{question}}")
+    llm = FakeLLM(latency=latency)
+    return [llm.complete(prompt(question=f"question {i}")) for i in range(n // 2)]
+
+
+def chain(n: int, latency: LatencyModel, num_chains: int = 4) -> list:
+    llm = FakeLLM(latency=latency)
+    outputs = []
+    for i in range(num_chains):
+        text = llm.complete(f"chain {i}")
+        for _ in range(n // num_chains - 1):
+            text = llm.complete(text)
+        outputs.append(text)
+    return outputs
+
+
+def diamond(n: int, latency: LatencyModel) -> Any:
+    prompt = Prompt("Expand the topic {{topic}}, part {{part}}")
+    llm = FakeLLM(latency=latency)
+    root = llm.complete("topic")
+    parts = [llm.complete(prompt(topic=root, part=i)) for i in range((n - 3) // 2)]
+    return llm.complete(join(parts))
+
+
+def mixed(n: int, latency: LatencyModel) -> list:
+    prompt = Prompt("Summarize: {{text}}")
+    fast = FakeLLM("fast", latency=latency._replace(base=latency.base / 2))
+    slow = FakeLLM("slow", latency=latency._replace(base=latency.base * 2))
+    outputs = []
+    for i in range(n // 4):
+        llm = fast if i % 2 else slow
+        outputs.append(post_process(llm.complete(prompt(text=f"document {i}"))))
+    return outputs
+
+
+def skewed(n: int, latency: LatencyModel) -> list:
+    llm = FakeLLM(latency=latency)
+    text = llm.complete("chain")
+    for _ in range(n // 8 - 1):
+        text = llm.complete(post_process(text))
+    return [text] + [llm.complete(f"question {i}") for i in range(n // 2)]
+
+
+SHAPES: dict[str, Callable[[int, LatencyModel], Any]] = {
+    "wide": wide,
+    "chain": chain,
+    "diamond": diamond,
+    "mixed": mixed,
+    "skewed": skewed,
+}
+
+SCHEDULERS: dict[str, Callable] = {
+    "asyncio": scheduler.get_asyncio,
+    "multiprocessing": scheduler.get_multiprocessing,
+}
+
+# Optimization setting -> (optimize_graph, scheduler.dynamic_batching)
+SETTINGS: dict[str, tuple[bool, bool]] = {
+    "none": (False, False),
+    "static": (True, False),
+    "dynamic": (True, True),
+}
+
+
+def makespan(graph: Any, scheduler_fn: Callable, optimize_graph: bool,
+             dynamic_batching: bool, priority: str, **kwargs: Any) -> float:
+    with context.set(**{"scheduler.dynamic_batching": dynamic_batching,
+                        "scheduler.priority": priority}):
+        start = time.perf_counter()
+        feste.compute(graph, scheduler_fn=scheduler_fn,
+                      optimize_graph=optimize_graph, **kwargs)
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=2000,
+                        help="approximate number of tasks per graph")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--per-item", type=float, default=0.002,
+                        help="latency added per prompt of a request")
+    parser.add_argument("--distribution", default="lognormal")
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--shapes", nargs="+", default=list(SHAPES))
+    parser.add_argument("--schedulers", nargs="+", default=list(SCHEDULERS))
+    parser.add_argument("--settings", nargs="+", default=list(SETTINGS))
+    parser.add_argument("--priorities", nargs="+", default=["order", "critical_path"])
+    parser.add_argument("--num-workers", type=int, default=None)
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help="maximum tasks in flight of the asyncio scheduler")
+    args = parser.parse_args()
+
+    latency = LatencyModel(args.latency, args.per_item, args.distribution, args.jitter)
+    zero_latency = LatencyModel(0.0)
+    print(f"{'shape':>8} {'scheduler':>16} {'setting':>8} {'priority':>14} {'tasks':>7} "
+          f"{'makespan':>10} {'tasks/s':>10} {'overhead/task':>14}")
+    for shape in args.shapes:
+        num_tasks = len(FesteGraph.collect(SHAPES[shape](args.tasks, latency))[0])
+        for scheduler_name in args.schedulers:
+            kwargs = {}
+            if scheduler_name == "multiprocessing":
+                kwargs["num_workers"] = args.num_workers
+            else:
+                kwargs["max_concurrency"] = args.max_concurrency
+            for setting, priority in itertools.product(args.settings, args.priorities):
+                options = SETTINGS[setting] + (priority,)
+                overhead = makespan(SHAPES[shape](args.tasks, zero_latency),
+                                    SCHEDULERS[scheduler_name], *options, **kwargs)
+                elapsed = makespan(SHAPES[shape](args.tasks, latency),
+                                   SCHEDULERS[scheduler_name], *options, **kwargs)
+                print(f"{shape:>8} {scheduler_name:>16} {setting:>8} {priority:>14} "
+                      f"{num_tasks:>7} {elapsed:9.2f}s {num_tasks / elapsed:10.1f} "
+                      f"{overhead / num_tasks * 1e6:12.1f}us")
+
+
+if __name__ == "__main__":
+    main()
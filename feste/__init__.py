@@ -1,7 +1,12 @@
 __version__ = "0.1.0"
 
-from feste.compute import compute
+from feste.compute import as_completed, compute
+from feste.pipeline import stream_compute
+from feste.vectorize import map
 
 __all__ = [
+    "as_completed",
     "compute",
+    "map",
+    "stream_compute",
 ]
@@ -1,7 +1,27 @@
-from feste.backend.cohere import Cohere
-from feste.backend.openai import OpenAI
+import importlib
+from typing import Any
+
+# The backends are imported on first use, so the SDKs of the other
+# backends (e.g. openai and cohere) aren't imported with them
+_backends = {
+    "OpenAI": "feste.backend.openai",
+    "Cohere": "feste.backend.cohere",
+    "FakeLLM": "feste.backend.fake",
+}
 
 __all__ = [
     "OpenAI",
     "Cohere",
+    "FakeLLM",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    module = _backends.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module), name)
+
+
+def __dir__() -> list[str]:
+    return sorted(list(globals()) + __all__)
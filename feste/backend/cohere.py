@@ -1,8 +1,13 @@
 from concurrent.futures import Executor, Future
-from typing import NamedTuple, Optional
+from functools import partial
+from typing import Any, Callable, NamedTuple, Optional
 
 import cohere
+import requests
+from urllib3 import Retry
 
+from feste.connection import PoolConfig, get_async_client, get_session
+from feste.optimization import BoundCall
 from feste.task import FesteBase, feste_task
 
 
@@ -37,6 +42,54 @@ class DummyExecutor(Executor):
         return f
 
 
+class PooledClient(cohere.Client):
+    """Cohere client that sends the requests through the session shared
+    by the process (see :func:`feste.connection.get_session`), instead of
+    a new session per request, so connections are kept alive. The other
+    clients of the SDK are left unchanged.
+
+    :param pool: the connection pool configuration
+    """
+    def __init__(self, *args: Any, pool: PoolConfig = PoolConfig(),
+                 **kwargs: Any) -> None:
+        # The API key may be checked (with a request) by the constructor
+        self.pool = pool
+        super().__init__(*args, **kwargs)
+
+    def _request(self, endpoint: str, json: Any = None, method: str = "POST",
+                 stream: bool = False) -> Any:
+        headers = {
+            "Authorization": f"BEARER {self.api_key}",
+            "Content-Type": "application/json",
+            "Request-Source": self.request_source,
+        }
+        url = f"{self.api_url}/{self.api_version}/{endpoint}"
+        # Same retries as the sessions created by the SDK
+        retries = Retry(total=self.max_retries, backoff_factor=0.5,
+                        allowed_methods=["POST", "GET"],
+                        status_forcelist=cohere.RETRY_STATUS_CODES,
+                        raise_on_status=False)
+        session = get_session("cohere", self.pool, retries)
+        if stream:
+            return session.request(method, url, headers=headers, json=json,
+                                   **self.request_dict, stream=True)
+        try:
+            response = session.request(method, url, headers=headers, json=json,
+                                       timeout=self.timeout, **self.request_dict)
+        except requests.exceptions.ConnectionError as e:
+            raise cohere.error.CohereConnectionError(str(e)) from e
+        except requests.exceptions.RequestException as e:
+            raise cohere.error.CohereError(
+                f"Unexpected exception ({e.__class__.__name__}): {e}") from e
+        try:
+            json_response = response.json()
+        except ValueError:
+            raise cohere.error.CohereAPIError.from_response(
+                response, message=f"Failed to decode json body: {response.text}")
+        self._check_response(json_response, response.headers, response.status_code)
+        return json_response
+
+
 class Cohere(FesteBase):
     """This is the Cohere API main class.
 
@@ -49,22 +102,66 @@ class Cohere(FesteBase):
     :param client_name: optional client name
     :param check_api_key: if API key should be checked (offline)
     :param max_retries: default number of retries
+    :param http_pool: configuration of the HTTP connection pool, which is
+                      created once per process and shared by the tasks (the
+                      asynchronous client keeps its own pool, see :meth:`agenerate`)
     """
     def __init__(self, api_key: str,
                  client_name: Optional[str] = None,
                  check_api_key: bool = True,
-                 max_retries: int = 3) -> None:
+                 max_retries: int = 3,
+                 http_pool: PoolConfig = PoolConfig()) -> None:
         super().__init__()
-        self.client = cohere.Client(api_key=api_key,
-                                    num_workers=1,
-                                    check_api_key=check_api_key,
-                                    max_retries=max_retries,
-                                    client_name=client_name)
+        self.http_pool = http_pool
+        self.api_key = api_key
+        self.client_name = client_name
+        self.max_retries = max_retries
+        self.client = PooledClient(api_key=api_key,
+                                   num_workers=1,
+                                   check_api_key=check_api_key,
+                                   max_retries=max_retries,
+                                   client_name=client_name,
+                                   pool=http_pool)
         # Cohere API uses a thread pool internally, we don't need it as we
         # are already paralelizing the calls. So we just replace the
         # executor here with a dummy serial one.
         self.client._executor = DummyExecutor()
 
+    @classmethod
+    def deterministic_tasks(cls) -> dict[Callable, Optional[Callable[[BoundCall], bool]]]:
+        """Generations with temperature zero are deterministic."""
+        return {
+            cls.generate._obj: cls._zero_temperature,
+        }
+
+    @staticmethod
+    def _zero_temperature(call: BoundCall) -> bool:
+        complete_params = call.other_args.get("complete_params")
+        return isinstance(complete_params, GenerateParams) and \
+            complete_params.temperature == 0
+
+    @classmethod
+    def cacheable_tasks(cls) -> list[Callable]:
+        """Tasks with responses that can be cached."""
+        return [cls.generate._obj]
+
+    @classmethod
+    def remote_tasks(cls) -> list[Callable]:
+        """Tasks making requests to the Cohere API."""
+        return [cls.generate._obj]
+
+    @classmethod
+    def async_variants(cls) -> dict[Callable, Callable]:
+        """Coroutine variants used by the asyncio scheduler."""
+        return {
+            cls.generate._obj: cls.agenerate,
+        }
+
+    @classmethod
+    def transient_errors(cls) -> tuple[type[BaseException], ...]:
+        """Connection errors are retried."""
+        return (cohere.error.CohereConnectionError,)
+
     @feste_task
     def generate(self, prompt: str,
                  complete_params: GenerateParams = GenerateParams()) -> str:
@@ -77,3 +174,23 @@ class Cohere(FesteBase):
         all_params.update({"prompt": prompt})
         ret = self.client.generate(**all_params)
         return str(ret.generations[0].text)
+
+    async def agenerate(self, prompt: str,
+                        complete_params: GenerateParams = GenerateParams()) -> str:
+        """Coroutine variant of :meth:`generate`, it uses the Cohere
+        asynchronous client, which is shared by the tasks of the event loop.
+        The client keeps its own ``aiohttp`` connection pool, so the
+        ``http_pool`` configuration doesn't apply to it.
+
+        :param prompt: input prompt text
+        :param complete_params: the API parameters (e.g. temperature, etc)
+        """
+        all_params = complete_params._asdict()
+        all_params.update({"prompt": prompt})
+        factory = partial(cohere.AsyncClient, api_key=self.api_key,
+                          check_api_key=False, max_retries=self.max_retries,
+                          client_name=self.client_name)
+        client = get_async_client(
+            f"cohere-{self.api_key}-{self.client_name}-{self.max_retries}", factory)
+        ret = await client.generate(**all_params)
+        return str(ret.generations[0].text)
@@ -0,0 +1,224 @@
+import asyncio
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, NamedTuple, Optional
+
+from dask.base import tokenize
+
+from feste.optimization import BatchOptimization, BoundCall, Optimization
+from feste.task import FesteBase, feste_task
+
+
+class FakeLLMError(Exception):
+    """Simulated transient error (e.g. a rate limit or server error)."""
+
+
+class FakeLLMRateLimitError(FakeLLMError):
+    """Simulated throttling of the requests over the backend capacity."""
+
+
+class LatencyModel(NamedTuple):
+    """Simulated latency of a request, which is the base latency plus a
+    cost per prompt of the request, scaled by a random factor drawn from
+    the distribution.
+
+    :param base: base latency of a request in seconds
+    :param per_item: latency added per prompt of the request in seconds
+    :param distribution: ``constant``, ``uniform`` (factor in
+                         ``[1 - jitter, 1 + jitter]``) or ``lognormal``
+                         (factor with median 1 and ``jitter`` sigma)
+    :param jitter: spread of the random factor
+    """
+    base: float = 0.05
+    per_item: float = 0.0
+    distribution: str = "constant"
+    jitter: float = 0.0
+
+    def sample(self, rng: random.Random, num_items: int = 1) -> float:
+        """Draws the latency of a request.
+
+        :param rng: the random generator
+        :param num_items: number of prompts of the request
+        :return: latency in seconds
+        """
+        latency = self.base + self.per_item * num_items
+        if self.distribution == "constant":
+            factor = 1.0
+        elif self.distribution == "uniform":
+            factor = rng.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+        elif self.distribution == "lognormal":
+            factor = rng.lognormvariate(0.0, self.jitter)
+        else:
+            raise ValueError(f"unknown latency distribution: {self.distribution}")
+        return max(latency * factor, 0.0)
+
+
+class FakeLLM(FesteBase):
+    """Deterministic fake LLM backend that simulates completions offline,
+    to benchmark the schedulers and optimizations without calling paid
+    APIs. The completion of a prompt is its upper case text followed by
+    the name of the backend, and the latencies are drawn from generators
+    seeded by the prompt, so they are the same in every run.
+
+    Errors are drawn from a generator seeded once per process, so the
+    retries of a failed call can succeed.
+
+    :param name: name of the backend, appended to the completions
+    :param latency: the latency model of the requests
+    :param error_rate: probability of a request raising :class:`FakeLLMError`
+    :param seed: seed of the random generators
+    :param capacity: maximum number of concurrent requests in the current
+                     process, the requests over it raise
+                     :class:`FakeLLMRateLimitError` (None for no limit)
+    """
+    # Maximum number of prompts sent in a single batched request
+    MAX_BATCH_SIZE = 20
+
+    def __init__(self, name: str = "fake",
+                 latency: LatencyModel = LatencyModel(),
+                 error_rate: float = 0.0, seed: int = 0,
+                 capacity: Optional[int] = None) -> None:
+        super().__init__()
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self.capacity = capacity
+        self.requests = 0
+        self.throttled = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self._error_rng = random.Random(seed)
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def batching_key(self) -> Any:
+        """Calls from instances with the same name are batched."""
+        return (type(self), self.name)
+
+    def checkpoint_token(self) -> Any:
+        """The request counters aren't part of the token."""
+        return (type(self).__qualname__, self.name, self.latency,
+                self.error_rate, self.seed, self.capacity)
+
+    @classmethod
+    def optimizations(cls) -> list[Optimization]:
+        """Completions are batched."""
+        batch_optim = BatchOptimization({
+            cls.complete._obj: cls.complete_batch._obj,
+        }, max_batch_size=cls.MAX_BATCH_SIZE)
+        return [batch_optim]
+
+    @classmethod
+    def deterministic_tasks(cls) -> dict[Callable, Optional[Callable[[BoundCall], bool]]]:
+        """Fake completions are always deterministic."""
+        return {
+            cls.complete._obj: None,
+            cls.complete_batch._obj: None,
+        }
+
+    @classmethod
+    def cacheable_tasks(cls) -> list[Callable]:
+        """Tasks with responses that can be cached."""
+        return [cls.complete._obj, cls.complete_batch._obj]
+
+    @classmethod
+    def remote_tasks(cls) -> list[Callable]:
+        """Tasks making (simulated) requests."""
+        return [cls.complete._obj, cls.complete_batch._obj]
+
+    @classmethod
+    def async_variants(cls) -> dict[Callable, Callable]:
+        """Coroutine variants used by the asyncio scheduler."""
+        return {
+            cls.complete._obj: cls.acomplete,
+            cls.complete_batch._obj: cls.acomplete_batch,
+        }
+
+    @classmethod
+    def transient_errors(cls) -> tuple[type[BaseException], ...]:
+        """Simulated errors are transient."""
+        return (FakeLLMError,)
+
+    @classmethod
+    def throttling_errors(cls) -> tuple[type[BaseException], ...]:
+        """Requests over the capacity are throttled."""
+        return (FakeLLMRateLimitError,)
+
+    @contextmanager
+    def _slot(self) -> Iterator[None]:
+        """Holds one of the concurrent requests of the capacity."""
+        with self._lock:
+            if self.capacity is not None and self.active >= self.capacity:
+                self.throttled += 1
+                raise FakeLLMRateLimitError(f"{self.name} is over capacity")
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def _request(self, prompts: list[str]) -> tuple[list[str], float]:
+        """Simulates a request, returning the completions and the latency."""
+        with self._lock:
+            self.requests += 1
+            failed = self._error_rng.random() < self.error_rate
+        rng = random.Random(tokenize(self.seed, self.name, prompts, pure=True))
+        latency = self.latency.sample(rng, len(prompts))
+        if failed:
+            raise FakeLLMError(f"simulated error of {self.name}")
+        return [f"{prompt.upper()} [{self.name}]" for prompt in prompts], latency
+
+    @feste_task
+    def complete(self, prompt: str) -> str:
+        """Simulated completion.
+
+        :param prompt: input prompt text
+        """
+        with self._slot():
+            (text,), latency = self._request([prompt])
+            time.sleep(latency)
+        return text
+
+    @feste_task
+    def complete_batch(self, prompt: list[str]) -> list[str]:
+        """Simulated completion, but batched.
+
+        :param prompt: input prompt text list
+        """
+        with self._slot():
+            texts, latency = self._request(list(prompt))
+            time.sleep(latency)
+        return texts
+
+    async def acomplete(self, prompt: str) -> str:
+        """Coroutine variant of :meth:`complete`.
+
+        :param prompt: input prompt text
+        """
+        with self._slot():
+            (text,), latency = self._request([prompt])
+            await asyncio.sleep(latency)
+        return text
+
+    async def acomplete_batch(self, prompt: list[str]) -> list[str]:
+        """Coroutine variant of :meth:`complete_batch`.
+
+        :param prompt: input prompt text list
+        """
+        with self._slot():
+            texts, latency = self._request(list(prompt))
+            await asyncio.sleep(latency)
+        return texts
@@ -1,8 +1,13 @@
-from typing import Any, NamedTuple, Optional
+import time
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Iterable, NamedTuple, Optional
 
 import openai
 
-from feste.optimization import BatchOptimization, Optimization
+from feste.connection import (PoolConfig, aiohttp_session, get_async_client,
+                              get_session)
+from feste.optimization import BatchOptimization, BoundCall, Optimization
+from feste.streaming import StreamedText, emit
 from feste.task import FesteBase, feste_task
 
 
@@ -30,21 +35,42 @@ class OpenAI(FesteBase):
 
     :param api_key: the OpenAI API key
     :param organization: optional organization
+    :param http_pool: configuration of the HTTP connection pool, which is
+                      created once per process and shared by the tasks
     """
+    # Maximum number of prompts sent in a single batched request
+    MAX_BATCH_SIZE = 20
+
     def __init__(self, api_key: str,
-                 organization: Optional[str] = None) -> None:
+                 organization: Optional[str] = None,
+                 http_pool: PoolConfig = PoolConfig()) -> None:
         super().__init__()
         self.set_api_key(api_key, organization)
         self.api_key = api_key
         self.organization = organization
+        self.http_pool = http_pool
 
     def _api_key_guard(self) -> None:
         """OpenAI Python client doesn't do proper encapsulation of
         API Keys, see: https://github.com/openai/openai-python/issues/233.
         Therefore, we need to set the API in each process before each call
-        to make sure it is set in the object."""
+        to make sure it is set in the object. The HTTP session shared by
+        the process is also set, so connections are kept alive."""
         if openai.api_key is None:
             self.set_api_key(self.api_key, self.organization)
+        openai.requestssession = get_session("openai", self.http_pool)
+
+    def _aiosession_guard(self) -> None:
+        """Sets the aiohttp session shared by the tasks of the event loop
+        for the asynchronous calls, instead of a new session per call."""
+        self._api_key_guard()
+        session = get_async_client(f"openai-{hash(self.http_pool)}",
+                                   partial(aiohttp_session, self.http_pool))
+        openai.aiosession.set(session)
+
+    def batching_key(self) -> Any:
+        """Calls from instances with the same credentials are batched."""
+        return (type(self), self.api_key, self.organization)
 
     @staticmethod
     def set_api_key(api_key: str, organization: Optional[str] = None) -> None:
@@ -61,15 +87,77 @@ class OpenAI(FesteBase):
         """Optimizations implemented for OpenAI API."""
         batch_optim = BatchOptimization({
             cls.complete._obj: cls.complete_batch._obj,
-        })
+        }, max_batch_size=cls.MAX_BATCH_SIZE)
         return [batch_optim,]
 
+    @classmethod
+    def deterministic_tasks(cls) -> dict[Callable, Optional[Callable[[BoundCall], bool]]]:
+        """Completions with temperature zero are deterministic."""
+        return {
+            cls.complete._obj: cls._zero_temperature,
+            cls.complete_batch._obj: cls._zero_temperature,
+            cls.complete_stream._obj: cls._zero_temperature,
+        }
+
+    @staticmethod
+    def _zero_temperature(call: BoundCall) -> bool:
+        complete_params = call.other_args.get("complete_params")
+        return isinstance(complete_params, CompleteParams) and \
+            complete_params.temperature == 0
+
+    @classmethod
+    def cacheable_tasks(cls) -> list[Callable]:
+        """Tasks with responses that can be cached."""
+        return [cls.complete._obj, cls.complete_batch._obj,
+                cls.complete_stream._obj]
+
+    @classmethod
+    def remote_tasks(cls) -> list[Callable]:
+        """Tasks making requests to the OpenAI API."""
+        return [cls.complete._obj, cls.complete_batch._obj,
+                cls.complete_stream._obj]
+
+    @classmethod
+    def async_variants(cls) -> dict[Callable, Callable]:
+        """Coroutine variants used by the asyncio scheduler."""
+        return {
+            cls.complete._obj: cls.acomplete,
+            cls.complete_batch._obj: cls.acomplete_batch,
+            cls.complete_stream._obj: cls.acomplete_stream,
+        }
+
+    @classmethod
+    def streaming_tasks(cls) -> list[Callable]:
+        """Streamed completions emit the text as it is generated."""
+        return [cls.complete_stream._obj]
+
+    @classmethod
+    def transient_errors(cls) -> tuple[type[BaseException], ...]:
+        """Rate limit, server and connection errors are retried."""
+        return (openai.error.RateLimitError, openai.error.APIError,
+                openai.error.APIConnectionError, openai.error.Timeout,
+                openai.error.ServiceUnavailableError, openai.error.TryAgain)
+
+    @classmethod
+    def throttling_errors(cls) -> tuple[type[BaseException], ...]:
+        """Rate limit errors (HTTP 429) signal throttling."""
+        return (openai.error.RateLimitError,)
+
     @staticmethod
     def _prepare_parameters(complete_params: CompleteParams) -> dict[str, Any]:
         all_params = complete_params._asdict()
         all_params = {k: v for k, v in all_params.items() if v is not None}
         return all_params
 
+    @staticmethod
+    def _join_chunks(chunks: Iterable[Any]) -> list[str]:
+        """Joins the text of the chunks of a streamed response by choice."""
+        texts: dict[int, list[str]] = {}
+        for chunk in chunks:
+            for choice in chunk.choices:
+                texts.setdefault(int(choice.index), []).append(str(choice.text))
+        return ["".join(texts[index]) for index in sorted(texts)]
+
     @feste_task
     def complete(self, prompt: str,
                  complete_params: CompleteParams = CompleteParams()) -> str:
@@ -82,6 +170,8 @@ class OpenAI(FesteBase):
         all_params.update({"prompt": prompt})
         self._api_key_guard()
         ret = openai.Completion.create(**all_params)
+        if complete_params.stream:
+            return self._join_chunks(ret)[0]
         text = str(ret.choices[0].text)
         return text
 
@@ -98,5 +188,92 @@ class OpenAI(FesteBase):
         all_params.update({"prompt": prompt})
         self._api_key_guard()
         ret = openai.Completion.create(**all_params)
+        if complete_params.stream:
+            return self._join_chunks(ret)
         choices = [str(r.text) for r in ret.choices]
         return choices
+
+    @feste_task
+    def complete_stream(self, prompt: str,
+                        complete_params: CompleteParams = CompleteParams()) \
+            -> StreamedText:
+        """This is the OpenAI official complete() API with streaming, the
+        text is emitted as it is generated to the subscriber in the
+        ``scheduler.stream_callback`` context (see :mod:`feste.streaming`).
+
+        :param prompt: input prompt text
+        :param complete_params: the API parameters (e.g. temperature, etc)
+        :return: the text, with the time to first token
+        """
+        all_params = self._prepare_parameters(complete_params._replace(stream=True))
+        all_params.update({"prompt": prompt})
+        self._api_key_guard()
+        start = time.monotonic()
+        texts = []
+        time_to_first_token = None
+        for chunk in openai.Completion.create(**all_params):
+            if time_to_first_token is None:
+                time_to_first_token = time.monotonic() - start
+            delta = str(chunk.choices[0].text)
+            texts.append(delta)
+            emit(delta)
+        return StreamedText("".join(texts), time_to_first_token,
+                            time.monotonic() - start)
+
+    async def acomplete(self, prompt: str,
+                        complete_params: CompleteParams = CompleteParams()) -> str:
+        """Coroutine variant of :meth:`complete`.
+
+        :param prompt: input prompt text
+        :param complete_params: the API parameters (e.g. temperature, etc)
+        """
+        all_params = self._prepare_parameters(complete_params)
+        all_params.update({"prompt": prompt})
+        self._aiosession_guard()
+        ret = await openai.Completion.acreate(**all_params)
+        if complete_params.stream:
+            return self._join_chunks([chunk async for chunk in ret])[0]
+        text = str(ret.choices[0].text)
+        return text
+
+    async def acomplete_batch(self, prompt: list[str],
+                              complete_params: CompleteParams = CompleteParams()) \
+            -> list[str]:
+        """Coroutine variant of :meth:`complete_batch`.
+
+        :param prompt: input prompt text list
+        :param complete_params: the API parameters (e.g. temperature, etc)
+        """
+        all_params = self._prepare_parameters(complete_params)
+        all_params.update({"prompt": prompt})
+        self._aiosession_guard()
+        ret = await openai.Completion.acreate(**all_params)
+        if complete_params.stream:
+            return self._join_chunks([chunk async for chunk in ret])
+        choices = [str(r.text) for r in ret.choices]
+        return choices
+
+    async def acomplete_stream(self, prompt: str,
+                               complete_params: CompleteParams = CompleteParams()) \
+            -> StreamedText:
+        """Coroutine variant of :meth:`complete_stream`.
+
+        :param prompt: input prompt text
+        :param complete_params: the API parameters (e.g. temperature, etc)
+        :return: the text, with the time to first token
+        """
+        all_params = self._prepare_parameters(complete_params._replace(stream=True))
+        all_params.update({"prompt": prompt})
+        self._aiosession_guard()
+        start = time.monotonic()
+        texts = []
+        time_to_first_token = None
+        chunks: AsyncIterator[Any] = await openai.Completion.acreate(**all_params)
+        async for chunk in chunks:
+            if time_to_first_token is None:
+                time_to_first_token = time.monotonic() - start
+            delta = str(chunk.choices[0].text)
+            texts.append(delta)
+            emit(delta)
+        return StreamedText("".join(texts), time_to_first_token,
+                            time.monotonic() - start)
@@ -0,0 +1,220 @@
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Hashable, Iterable, Mapping
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+from cloudpickle import dumps, loads
+from dask.base import tokenize
+from dask.core import _execute_task
+
+from feste.optimization import bind_task
+
+
+def cacheable_tasks_from_backends() -> set[Callable]:
+    """Collect the functions of the tasks that can have their responses
+    cached from all classes inheriting from the backend FesteBase class."""
+    # TODO: Avoid circular imports from task
+    from feste.task import FesteBase
+    functions: set[Callable] = set()
+    for subclass in FesteBase.__subclasses__():
+        functions.update(subclass.cacheable_tasks())
+    return functions
+
+
+def response_cache_key(task: Any, data: Mapping,
+                       cacheable: Iterable[Callable]) -> Optional[str]:
+    """Computes the response cache key of a task, which is a hash of the
+    backend, the function and all its arguments (e.g. model, parameters
+    and the rendered prompt).
+
+    :param task: the task
+    :param data: results of the task dependencies
+    :param cacheable: functions that can be cached
+    :return: the cache key or None if the task can't be cached
+    """
+    call = bind_task(task)
+    if call is None or call.function not in cacheable:
+        return None
+    backend = type(call.obj)
+    batch_arg = _execute_task(call.batch_arg, data)
+    other_args = {name: _execute_task(value, data)
+                  for name, value in call.other_args.items()}
+    cache_key = tokenize(backend.__module__, backend.__qualname__,
+                         call.function.__qualname__, batch_arg,
+                         sorted(other_args.items()), pure=True)
+    return str(cache_key)
+
+
+class ResponseCache:
+    """Persistent response cache for backend calls, stored in a SQLite
+    database so it can be shared by multiple processes. When set in the
+    ``scheduler.response_cache`` context, the schedulers look up the
+    cache before dispatching backend tasks and store their responses.
+
+    .. note:: Responses are cached regardless of sampling parameters
+              (e.g. temperature), so a cached call will always return
+              the same response.
+
+    :param path: the SQLite database path
+    :param max_size: maximum size in bytes of the stored responses, the
+                     least recently used ones are evicted first
+    :param max_age: maximum age in seconds of the stored responses
+    """
+    def __init__(self, path: Union[Path, str],
+                 max_size: Optional[int] = None,
+                 max_age: Optional[float] = None) -> None:
+        self.path = str(path)
+        self.max_size = max_size
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._create_table()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """The SQLite connection of the current process and thread."""
+        pid = os.getpid()
+        if getattr(self._local, "pid", None) != pid:
+            connection = sqlite3.connect(self.path, timeout=60.0,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+            self._local.pid = pid
+        return self._local.connection  # type: ignore
+
+    def _create_table(self) -> None:
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value BLOB, size INTEGER, "
+            "created REAL, accessed REAL)"
+        )
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        """Gets a response from the cache.
+
+        :param key: the cache key
+        :return: tuple (hit, response)
+        """
+        row = self.connection.execute(
+            "SELECT value, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+        if row is None or (self.max_age is not None
+                           and row[1] < now - self.max_age):
+            self.misses += 1
+            return False, None
+        self.connection.execute(
+            "UPDATE responses SET accessed = ? WHERE key = ?", (now, key)
+        )
+        self.hits += 1
+        return True, loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        """Stores a response in the cache and evicts old responses.
+
+        :param key: the cache key
+        :param value: the response
+        """
+        serialized = dumps(value)
+        now = time.time()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (key, serialized, len(serialized), now, now)
+        )
+        self.evict()
+
+    def evict(self) -> None:
+        """Evicts the responses older than the maximum age and the least
+        recently used responses exceeding the maximum size."""
+        if self.max_age is not None:
+            self.connection.execute(
+                "DELETE FROM responses WHERE created < ?",
+                (time.time() - self.max_age,)
+            )
+        if self.max_size is not None:
+            self.connection.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM (SELECT key, SUM(size) OVER "
+                "(ORDER BY accessed DESC, key) AS total FROM responses) "
+                "WHERE total > ?)", (self.max_size,)
+            )
+
+    def clear(self) -> None:
+        """Removes all responses from the cache."""
+        self.connection.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        return int(self.connection.execute(
+            "SELECT COUNT(*) FROM responses").fetchone()[0])
+
+    def stats(self) -> dict[str, int]:
+        """Returns the cache hit/miss counters of this process."""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+
+def lookup_responses(dsk: Mapping, state: dict, response_cache: ResponseCache,
+                     cacheable: Iterable[Callable],
+                     cache_keys: dict[Hashable, Optional[str]]) \
+        -> list[tuple[Hashable, Any]]:
+    """Looks up the response cache for the ready tasks. Tasks found in
+    the cache are removed from the ready list and marked as running
+    so they can be finished by the scheduler. The cache key of the
+    other tasks is kept in ``cache_keys`` (None if they can't be cached)
+    to store their responses when they finish.
+
+    :param dsk: the graph being executed
+    :param state: the scheduler state
+    :param response_cache: the response cache
+    :param cacheable: functions that can be cached
+    :param cache_keys: mapping from key to cache key, updated in place
+    :return: list of (key, response) found in the cache
+    """
+    found = []
+    for key in state["ready"]:
+        # Skip keys already looked up and keys created by the
+        # scheduler (e.g. dynamic batches)
+        if key in cache_keys or key not in state["dependencies"]:
+            continue
+        cache_key = response_cache_key(dsk[key], state["cache"], cacheable)
+        hit, response = False, None
+        if cache_key is not None:
+            hit, response = response_cache.get(cache_key)
+        if hit:
+            found.append((key, response))
+            cache_key = None
+        cache_keys[key] = cache_key
+
+    if found:
+        found_keys = {key for key, _ in found}
+        state["ready"] = [key for key in state["ready"] if key not in found_keys]
+        state["running"].update(found_keys)
+    return found
+
+
+def store_response(key: Hashable, response: Any,
+                   response_cache: Optional[ResponseCache],
+                   cache_keys: dict[Hashable, Optional[str]]) -> None:
+    """Stores the response of a finished task in the response cache, if
+    the task can be cached.
+
+    :param key: the finished key
+    :param response: the task response
+    :param response_cache: the response cache
+    :param cache_keys: mapping from key to cache key
+    """
+    cache_key = cache_keys.pop(key, None)
+    if response_cache is not None and cache_key is not None:
+        response_cache.set(cache_key, response)
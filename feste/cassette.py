@@ -0,0 +1,353 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections.abc import Awaitable
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+from cloudpickle import dumps, loads
+from dask.base import tokenize
+from dask.utils import apply
+
+from feste.cache import cacheable_tasks_from_backends
+from feste.optimization import BatchOptimization, BoundCall, bind_task
+from feste.streaming import StreamedText, emit, task_function
+
+# Cassette modes
+RECORD = "record"
+REPLAY = "replay"
+
+# SQLite connections (per path) of the current thread, they are kept out
+# of the cassette as each task gets its own copy in the workers
+_connections = threading.local()
+
+
+class CassetteMiss(KeyError):
+    """Raised when a call being replayed wasn't recorded in the cassette."""
+
+
+def call_key(call: BoundCall) -> str:
+    """Key of a backend call in the cassette, which is a hash of the
+    backend, the function and all its arguments.
+
+    :param call: the bound call
+    :return: the cassette key
+    """
+    backend = type(call.obj)
+    return str(tokenize(backend.__module__, backend.__qualname__,
+                        call.function.__qualname__, call.batch_arg,
+                        sorted(call.other_args.items()), pure=True))
+
+
+def batched_functions_from_backends() -> dict[Callable, Callable]:
+    """Collect the mapping from the batched variants of the task functions
+    to the single call functions, from the batch optimizations of the
+    classes inheriting from the backend FesteBase class."""
+    # TODO: Avoid circular imports from task
+    from feste.task import FesteBase
+    functions: dict[Callable, Callable] = {}
+    for subclass in FesteBase.__subclasses__():
+        for optimization in subclass.optimizations():
+            if isinstance(optimization, BatchOptimization):
+                for function, batched in optimization.rewrite_rules.items():
+                    functions[batched] = function
+    return functions
+
+
+class Cassette:
+    """Record/replay cassette of backend calls, stored in a SQLite
+    database. When set in the ``scheduler.cassette`` context, the
+    schedulers record every call of the cacheable backend tasks (see
+    :meth:`feste.task.FesteBase.cacheable_tasks`) with its parameters,
+    response (or error) and observed latency in ``record`` mode. In
+    ``replay`` mode the backends aren't called, the calls are served from
+    the cassette after waiting the recorded latency, so real workloads
+    can be benchmarked offline and reproducibly.
+
+    Batched calls are also recorded per prompt, so they can be replayed
+    when the calls are batched differently (e.g. with another batch size),
+    a batch served from single prompts waits the longest of their
+    latencies. Repeated calls with the same parameters are replayed in
+    the recorded order, the number of times each call was replayed is
+    kept in the database so it is shared by the copies of the cassette
+    in the worker processes.
+
+    :param path: the SQLite database path
+    :param mode: ``record`` or ``replay``
+    :param speed: replay speed factor of the recorded latencies, or None
+                  to replay without waiting
+    """
+    def __init__(self, path: Union[Path, str], mode: str = REPLAY,
+                 speed: Optional[float] = 1.0) -> None:
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"unknown cassette mode: {mode}")
+        self.path = str(path)
+        self.mode = mode
+        self.speed = speed
+        self.functions: Optional[set[Callable]] = None
+        self.batched: dict[Callable, Callable] = {}
+        # Replay session of the cassette and its copies in the workers
+        self._session = uuid.uuid4().hex
+        self._create_table()
+
+    def __getstate__(self) -> dict[str, Any]:
+        # The backend functions are only needed by the schedulers
+        state = self.__dict__.copy()
+        state["functions"], state["batched"] = None, {}
+        return state
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """The SQLite connection of the current process and thread."""
+        pid = os.getpid()
+        if getattr(_connections, "pid", None) != pid:
+            _connections.by_path = {}
+            _connections.pid = pid
+        connection = _connections.by_path.get(self.path)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=60.0,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            _connections.by_path[self.path] = connection
+        return connection  # type: ignore
+
+    def _create_table(self) -> None:
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS calls ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT, "
+            "backend TEXT, function TEXT, request BLOB, response BLOB, "
+            "error INTEGER, latency REAL, derived INTEGER, created REAL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS calls_key ON calls (key, derived, id)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS replays ("
+            "key TEXT PRIMARY KEY, session TEXT, count INTEGER)"
+        )
+
+    def load_backends(self) -> 'Cassette':
+        """Sets the functions recorded and the batched functions from the
+        backends, it is done by the schedulers before running the graph."""
+        self.functions = cacheable_tasks_from_backends()
+        self.batched = batched_functions_from_backends()
+        return self
+
+    def records(self, function: Any) -> bool:
+        """Returns if the calls of a task function are recorded.
+
+        :param function: the task function
+        """
+        if self.functions is None:
+            self.load_backends()
+        return function in self.functions  # type: ignore
+
+    def bind(self, function: Callable, args: Any, kwargs: Any) -> Optional[BoundCall]:
+        """Returns the bound call of a task function if its calls are
+        recorded in the cassette, None otherwise.
+
+        :param function: the task function
+        :param args: the positional arguments (the backend first)
+        :param kwargs: the keyword arguments
+        """
+        if not self.records(function):
+            return None
+        return bind_task((apply, function, list(args), dict(kwargs or {})))
+
+    def record(self, call: BoundCall, response: Any, latency: float,
+               error: bool = False, single: Optional[Callable] = None) -> None:
+        """Records a call, batched calls are also recorded per prompt.
+
+        :param call: the bound call
+        :param response: the response (or the exception raised)
+        :param latency: the observed latency in seconds
+        :param error: if the call raised the response
+        :param single: single call function of a batched call
+        """
+        backend = f"{type(call.obj).__module__}.{type(call.obj).__qualname__}"
+        request = zlib.compress(dumps((call.batch_arg, call.other_args)))
+        rows: list[tuple[str, str, Optional[bytes], Any, int]] = [
+            (call_key(call), call.function.__qualname__, request, response, 0)
+        ]
+        if single is not None and isinstance(call.batch_arg, (list, tuple)):
+            responses = response if not error else [response] * len(call.batch_arg)
+            for arg, arg_response in zip(call.batch_arg, responses):
+                arg_call = call._replace(function=single, batch_arg=arg)
+                rows.append((call_key(arg_call), single.__qualname__, None,
+                             arg_response, 1))
+        now = time.time()
+        self.connection.executemany(
+            "INSERT INTO calls (key, backend, function, request, response, "
+            "error, latency, derived, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(key, backend, function, request, zlib.compress(dumps(value)),
+              int(error), latency, derived, now)
+             for key, function, request, value, derived in rows]
+        )
+
+    def _lookup(self, key: str) -> Optional[tuple[Any, bool, float]]:
+        rows = self.connection.execute(
+            "SELECT response, error, latency FROM calls WHERE key = ? "
+            "ORDER BY derived, id", (key,)
+        ).fetchall()
+        if not rows:
+            return None
+        response, error, latency = rows[self._replay_index(key) % len(rows)]
+        return loads(zlib.decompress(response)), bool(error), latency
+
+    def _replay_index(self, key: str) -> int:
+        """Returns the number of times a call was replayed in the current
+        session, counting this replay. The counters of other sessions
+        are restarted."""
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT INTO replays (key, session, count) VALUES (?, ?, 1) "
+                "ON CONFLICT (key) DO UPDATE SET count = CASE WHEN "
+                "session = excluded.session THEN count + 1 ELSE 1 END, "
+                "session = excluded.session", (key, self._session)
+            )
+            (count,) = connection.execute(
+                "SELECT count FROM replays WHERE key = ?", (key,)).fetchone()
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return int(count) - 1
+
+    def lookup(self, call: BoundCall,
+               single: Optional[Callable] = None) -> tuple[Any, bool, float]:
+        """Looks up the recorded response of a call, a batched call that
+        wasn't recorded is served from the calls of its prompts.
+
+        :param call: the bound call
+        :param single: single call function of a batched call
+        :return: tuple (response, if it is an error, latency)
+        """
+        found = self._lookup(call_key(call))
+        if found is not None:
+            return found
+        if single is not None and isinstance(call.batch_arg, (list, tuple)):
+            responses, latency = [], 0.0
+            for arg in call.batch_arg:
+                arg_found = self._lookup(call_key(call._replace(function=single,
+                                                                batch_arg=arg)))
+                if arg_found is None:
+                    break
+                if arg_found[1]:
+                    return arg_found
+                responses.append(arg_found[0])
+                latency = max(latency, arg_found[2])
+            else:
+                return responses, False, latency
+        raise CassetteMiss(f"call to {call.function.__qualname__} "
+                           f"was not recorded in {self.path}")
+
+    def _replay_wait(self, latency: float) -> float:
+        return 0.0 if self.speed is None else latency / self.speed
+
+    @staticmethod
+    def _replay_result(response: Any, error: bool) -> Any:
+        if error:
+            raise response
+        if isinstance(response, StreamedText):
+            emit(str(response))
+        return response
+
+    def call(self, call: BoundCall, single: Optional[Callable], func: Callable,
+             *args: Any, **kwargs: Any) -> Any:
+        """Calls (or replays) a backend call.
+
+        :param call: the bound call
+        :param single: single call function of a batched call
+        :param func: the callable making the call
+        :return: the response
+        """
+        if self.mode == REPLAY:
+            response, error, latency = self.lookup(call, single)
+            time.sleep(self._replay_wait(latency))
+            return self._replay_result(response, error)
+        start = time.monotonic()
+        try:
+            response = func(*args, **kwargs)
+        except Exception as exc:
+            self.record(call, exc, time.monotonic() - start, True, single)
+            raise
+        self.record(call, response, time.monotonic() - start, False, single)
+        return response
+
+    async def acall(self, call: BoundCall, single: Optional[Callable],
+                    coroutine_fn: Callable[..., Awaitable],
+                    *args: Any, **kwargs: Any) -> Any:
+        """Coroutine variant of :meth:`call`.
+
+        :param call: the bound call
+        :param single: single call function of a batched call
+        :param coroutine_fn: the coroutine function making the call
+        :return: the response
+        """
+        if self.mode == REPLAY:
+            response, error, latency = self.lookup(call, single)
+            await asyncio.sleep(self._replay_wait(latency))
+            return self._replay_result(response, error)
+        start = time.monotonic()
+        try:
+            response = await coroutine_fn(*args, **kwargs)
+        except Exception as exc:
+            self.record(call, exc, time.monotonic() - start, True, single)
+            raise
+        self.record(call, response, time.monotonic() - start, False, single)
+        return response
+
+    def clear(self) -> None:
+        """Removes all recorded calls."""
+        self.connection.execute("DELETE FROM calls")
+        self.connection.execute("DELETE FROM replays")
+
+    def __len__(self) -> int:
+        return int(self.connection.execute(
+            "SELECT COUNT(*) FROM calls WHERE derived = 0").fetchone()[0])
+
+
+def call_with_cassette(cassette: Cassette, function: Callable,
+                       single: Optional[Callable], func: Callable,
+                       *args: Any, **kwargs: Any) -> Any:
+    """Calls a task function through the cassette.
+
+    :param cassette: the cassette
+    :param function: the task function (used to bind the call)
+    :param single: single call function of a batched task function
+    :param func: the callable making the call (e.g. with retries)
+    :return: the response
+    """
+    call = bind_task((apply, function, list(args), kwargs))
+    if call is None:
+        return func(*args, **kwargs)
+    return cassette.call(call, single, func, *args, **kwargs)
+
+
+def cassette_task(task: Any, function: Optional[Callable],
+                  cassette: Optional[Cassette]) -> Any:
+    """Wraps the call of a task with :func:`call_with_cassette`, keeping
+    the task arguments so they are still resolved by Dask. Tasks that
+    aren't recorded are returned unchanged.
+
+    :param task: the task (possibly already wrapped, e.g. with retries)
+    :param function: the task function of the unwrapped task
+    :param cassette: the cassette (None to disable)
+    :return: the wrapped task
+    """
+    if cassette is None or function is None or not cassette.records(function):
+        return task
+    # The functions of the tasks are pickled by value, so they are
+    # matched with the backend functions here instead of in the workers
+    wrapper = partial(call_with_cassette, cassette, function,
+                      cassette.batched.get(function), task_function(task))
+    if task[0] is apply:
+        return (apply, wrapper) + task[2:]
+    return (wrapper,) + task[1:]
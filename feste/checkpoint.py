@@ -0,0 +1,239 @@
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Hashable, Iterable, Mapping
+from functools import partial
+from pathlib import Path
+from typing import Any, Optional, Union
+from warnings import warn
+
+from cloudpickle import dumps, loads
+from dask.base import tokenize
+from dask.core import get_dependencies, has_tasks, istask, literal, toposort
+
+
+class CheckpointWarning(UserWarning):
+    """Warning issued when a result can't be checkpointed."""
+
+
+def _normalize(value: Any, names: Mapping[Hashable, str]) -> Any:
+    """Normalizes a task (or argument) into a structure that tokenizes
+    the same in any process, with the keys of the dependencies replaced
+    by their checkpoint keys."""
+    # TODO: Avoid circular imports from task
+    from feste.task import FesteBase
+    try:
+        if value in names:
+            return ("key", names[value])
+    except TypeError:
+        pass
+    if isinstance(value, FesteBase):
+        return ("object", _normalize(value.checkpoint_token(), names))
+    if isinstance(value, partial):
+        return ("partial", _normalize(value.func, names),
+                _normalize(value.args, names), _normalize(value.keywords, names))
+    if isinstance(value, type) or callable(value) and hasattr(value, "__qualname__"):
+        code = getattr(value, "__code__", None)
+        return ("function", getattr(value, "__module__", None), value.__qualname__,
+                code.co_code if code is not None else None)
+    if istask(value) or isinstance(value, (list, tuple)):
+        return (type(value).__name__, [_normalize(item, names) for item in value])
+    if isinstance(value, dict):
+        return ("dict", sorted(((_normalize(k, names), _normalize(v, names))
+                                for k, v in value.items()), key=repr))
+    return value
+
+
+def _creation_order(key: Hashable) -> tuple:
+    """Sort key of the graph keys in the order they were created: the
+    impure calls and the maps are named with a counter (see
+    :func:`feste.task.unique_name`), and the chunks of a map are
+    ordered by their index."""
+    if isinstance(key, tuple) and key:
+        return (str(key[0]),) + tuple((0, part) if isinstance(part, int)
+                                      else (1, str(part)) for part in key[1:])
+    return (str(key),)
+
+
+def checkpoint_keys(dsk: Mapping) -> dict[Hashable, str]:
+    """Computes the checkpoint key of the tasks of a graph, which is a
+    hash of the task (function, backend and arguments) and of the
+    checkpoint keys of its dependencies. Unlike the graph keys of the
+    impure calls, they are the same when the graph is built again in
+    another process. Identical tasks (e.g. sampling the same prompt
+    twice) are told apart by the order they were created in.
+
+    :param dsk: the graph
+    :return: mapping from key to checkpoint key
+    """
+    dependencies = {key: get_dependencies(dsk, key) for key in dsk}
+    names: dict[Hashable, str] = {}
+    seen: dict[str, int] = {}
+    for key in toposort(dsk, dependencies=dependencies):
+        token = str(tokenize(_normalize(dsk[key], names), pure=True))
+        names[key] = token
+        seen[token] = seen.get(token, 0) + 1
+    # Identical tasks get their index in the order they were created
+    duplicates: dict[str, list[Hashable]] = {}
+    for key, token in names.items():
+        if seen[token] > 1:
+            duplicates.setdefault(token, []).append(key)
+    for token, keys in duplicates.items():
+        for index, key in enumerate(sorted(keys, key=_creation_order)):
+            names[key] = f"{token}-{index}"
+    return names
+
+
+class Checkpoint:
+    """Checkpoint of the results of a computation, stored in a SQLite
+    database. When set in the ``scheduler.checkpoint`` context (or given
+    to the schedulers), the result of every task is stored as soon as it
+    finishes. In resume mode, the results already stored are preloaded
+    in the scheduler cache and only the missing tasks (and the
+    dependencies they still need) are executed, so a computation that
+    died can be resumed by computing the same graph again (see
+    :meth:`restore`).
+
+    The results are stored by checkpoint key (see :func:`checkpoint_keys`)
+    rather than by graph key, as the keys of the impure calls change
+    every time the graph is built.
+
+    :param path: the SQLite database path
+    :param resume: if the stored results are reused
+    """
+    def __init__(self, path: Union[Path, str], resume: bool = True) -> None:
+        self.path = str(path)
+        self.resume = resume
+        self.restored = 0
+        self.saved = 0
+        self._local = threading.local()
+        self._create_table()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """The SQLite connection of the current process and thread."""
+        pid = os.getpid()
+        if getattr(self._local, "pid", None) != pid:
+            connection = sqlite3.connect(self.path, timeout=60.0,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+            self._local.pid = pid
+        return self._local.connection  # type: ignore
+
+    def _create_table(self) -> None:
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value BLOB, created REAL)"
+        )
+
+    def _select(self, column: str, keys: list[str]) -> list[tuple]:
+        rows = []
+        # Stay below the SQLite limit of variables per query
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows.extend(self.connection.execute(
+                f"SELECT {column} FROM results WHERE key IN "
+                f"({', '.join('?' * len(chunk))})", chunk
+            ).fetchall())
+        return rows
+
+    def stored(self, keys: Iterable[str]) -> set[str]:
+        """Returns which of the given checkpoint keys have a stored result.
+
+        :param keys: the checkpoint keys
+        """
+        return {key for (key,) in self._select("key", list(keys))}
+
+    def load(self, keys: Iterable[str]) -> dict[str, Any]:
+        """Loads the stored results of the given checkpoint keys.
+
+        :param keys: the checkpoint keys
+        :return: mapping from checkpoint key to result, for the keys found
+        """
+        return {key: loads(value)
+                for key, value in self._select("key, value", list(keys))}
+
+    def save(self, key: str, value: Any) -> None:
+        """Stores a result, results that can't be pickled are skipped.
+
+        :param key: the checkpoint key
+        :param value: the result
+        """
+        try:
+            serialized = dumps(value)
+        except Exception as exc:
+            warn(f"Result of {key} was not checkpointed: {exc}", CheckpointWarning)
+            return
+        self.connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+            (key, serialized, time.time())
+        )
+        self.saved += 1
+
+    def restore(self, dsk: Mapping,
+                keys: Iterable[Hashable]) -> tuple[dict, dict[Hashable, str]]:
+        """Prepares a graph for execution, replacing the tasks needed by
+        the requested keys by their stored results and removing the
+        tasks that are no longer needed.
+
+        :param dsk: the graph
+        :param keys: the requested keys
+        :return: tuple (graph to execute, mapping from key to checkpoint key)
+        """
+        names = checkpoint_keys(dsk)
+        stored = self.stored(names.values()) if self.resume else set()
+        graph: dict = {}
+        found = []
+        stack = list(keys)
+        while stack:
+            key = stack.pop()
+            if key in graph or key not in dsk:
+                continue
+            graph[key] = dsk[key]
+            if names[key] in stored:
+                found.append(key)
+            else:
+                stack.extend(get_dependencies(dsk, key))
+        results = self.load(names[key] for key in found)
+        for key in found:
+            value = results[names[key]]
+            # Results looking like tasks (or keys) are kept as they are
+            graph[key] = (literal(value),) if has_tasks(graph, value) else value
+        self.restored += len(found)
+        return graph, names
+
+    def clear(self) -> None:
+        """Removes all stored results."""
+        self.connection.execute("DELETE FROM results")
+
+    def __len__(self) -> int:
+        return int(self.connection.execute(
+            "SELECT COUNT(*) FROM results").fetchone()[0])
+
+    def stats(self) -> dict[str, int]:
+        """Returns the restored/saved counters of this process."""
+        return {"restored": self.restored, "saved": self.saved, "entries": len(self)}
+
+
+def save_result(key: Hashable, result: Any, checkpoint: Optional[Checkpoint],
+                names: Mapping[Hashable, str]) -> None:
+    """Stores the result of a finished task in the checkpoint.
+
+    :param key: the finished key
+    :param result: the task result
+    :param checkpoint: the checkpoint (None to disable)
+    :param names: mapping from key to checkpoint key
+    """
+    if checkpoint is not None and key in names:
+        checkpoint.save(names[key], result)
@@ -1,20 +1,30 @@
 # This module contains modified code from Dask which is
 # licensed under BSD 3-Clause License for the following holder:
 # Copyright (c) 2014, Anaconda, Inc. and contributors.
-from typing import Any, Callable
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional, Union
+
+from dask.core import flatten
+from dask.local import nested_get
 
 from feste.graph import FesteGraph
 from feste.optimization import Optimizer
-from feste.scheduler import get_multiprocessing
+from feste.scheduler import get_multiprocessing, iter_multiprocessing
+from feste.trace import Tracer
 
 
 def compute(*args, scheduler_fn: Callable = get_multiprocessing,  # type: ignore
-            optimize_graph: bool = True, **kwargs) -> Any:
+            optimize_graph: bool = True,
+            trace: Optional[Union[Path, str]] = None, **kwargs) -> Any:
     """This function will compute the given objects using the default
     multiprocessing scheduler.
 
     :param scheduler_fn: a scheduler (defaults to multiprocessing scheduler)
     :param optimize_graph: if graph should be optimized
+    :param trace: optional path of a Chrome trace file to write with the
+                  execution timeline and critical path (see
+                  :class:`feste.trace.Tracer`)
     :return: computed objects
     """
     feste_graph, collections, repack = FesteGraph.collect(*args)
@@ -28,6 +38,48 @@ def compute(*args, scheduler_fn: Callable = get_multiprocessing,  # type: ignore
         keys.append(x.__dask_keys__())
         postcomputes.append(x.__dask_postcompute__())
 
-    results = scheduler_fn(dict(feste_graph), keys,
-                           optimize_graph=optimize_graph, **kwargs)
+    with Tracer() if trace is not None else nullcontext() as tracer:
+        results = scheduler_fn(dict(feste_graph), keys,
+                               optimize_graph=optimize_graph, **kwargs)
+    if tracer is not None:
+        tracer.write_chrome_trace(trace)
     return repack([f(r, *a) for r, (f, a) in zip(results, postcomputes)])  # type: ignore
+
+
+def as_completed(*args, scheduler_fn: Callable = iter_multiprocessing,  # type: ignore
+                 optimize_graph: bool = True,
+                 **kwargs) -> Iterator[tuple[Any, Any]]:
+    """This function will compute the given objects and yield the
+    ``(object, result)`` pairs as soon as each object is computed, in
+    completion order.
+
+    :param scheduler_fn: an iterator scheduler, that yields the
+                         ``(key, result)`` of the keys as they finish
+                         (defaults to multiprocessing scheduler)
+    :param optimize_graph: if graph should be optimized
+    :return: iterator of (object, result)
+    """
+    feste_graph, collections, _ = FesteGraph.collect(*args)
+
+    if optimize_graph:
+        optimizer = Optimizer.from_backends()
+        feste_graph = optimizer.apply(feste_graph)
+
+    keys, pending = [], []
+    waiting: dict[Any, list[int]] = {}
+    for i, x in enumerate(collections):
+        x_keys = x.__dask_keys__()
+        keys.append(x_keys)
+        pending.append(set(flatten(x_keys)))
+        for key in pending[i]:
+            waiting.setdefault(key, []).append(i)
+
+    finished = {}
+    for key, result in scheduler_fn(dict(feste_graph), keys,
+                                    optimize_graph=optimize_graph, **kwargs):
+        finished[key] = result
+        for i in waiting.pop(key, []):
+            pending[i].discard(key)
+            if not pending[i]:
+                f, a = collections[i].__dask_postcompute__()
+                yield collections[i], f(nested_get(keys[i], finished), *a)
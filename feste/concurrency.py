@@ -0,0 +1,394 @@
+import threading
+import time
+from collections.abc import Hashable, Mapping
+from functools import partial
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+
+from dask.utils import apply
+
+from feste.optimization import bind_task
+from feste.resilience import retried_errors
+from feste.streaming import task_function
+
+
+class Feedback(NamedTuple):
+    """Result of a backend call with the signals observed by the
+    :class:`ConcurrencyController`, sent back by the workers.
+
+    :param result: the call result
+    :param latency: duration of the call in seconds
+    :param throttled: number of throttling errors of the call (retried or
+                      raised)
+    """
+    result: Any
+    latency: float
+    throttled: int = 0
+
+
+def _count_throttled(errors: list[BaseException],
+                     throttling_errors: tuple[type[BaseException], ...]) -> int:
+    return sum(1 for exc in errors if isinstance(exc, throttling_errors))
+
+
+def _attach_feedback(exc: BaseException, errors: list[BaseException],
+                     throttling_errors: tuple[type[BaseException], ...],
+                     start: float) -> None:
+    """Attaches the feedback of a failed call to the error raised, which
+    is sent back to the scheduler (see :meth:`ConcurrencyController.fail`)."""
+    throttled = _count_throttled(errors + [exc], throttling_errors)
+    setattr(exc, "feste_feedback", Feedback(None, time.monotonic() - start, throttled))
+
+
+def call_with_feedback(throttling_errors: tuple[type[BaseException], ...],
+                       func: Callable, *args: Any, **kwargs: Any) -> Feedback:
+    """Calls a function, returning its result with the latency of the
+    call and the throttling errors retried by it (see
+    :func:`feste.resilience.call_with_retries`). The feedback of a failed
+    call is attached to the error raised, counting it if it is a
+    throttling error.
+
+    :param throttling_errors: exceptions signalling throttling
+    :param func: the function to call
+    :return: the :class:`Feedback` of the call
+    """
+    errors: list[BaseException] = []
+    token = retried_errors.set(errors)
+    start = time.monotonic()
+    try:
+        result = func(*args, **kwargs)
+    except Exception as exc:
+        _attach_feedback(exc, errors, throttling_errors, start)
+        raise
+    finally:
+        retried_errors.reset(token)
+    return Feedback(result, time.monotonic() - start,
+                    _count_throttled(errors, throttling_errors))
+
+
+async def await_with_feedback(throttling_errors: tuple[type[BaseException], ...],
+                              awaitable: Awaitable) -> Feedback:
+    """Coroutine variant of :func:`call_with_feedback`, awaiting the
+    awaitable (e.g. the execution of a task on the event loop).
+
+    :param throttling_errors: exceptions signalling throttling
+    :param awaitable: the awaitable
+    :return: the :class:`Feedback` of the call
+    """
+    errors: list[BaseException] = []
+    token = retried_errors.set(errors)
+    start = time.monotonic()
+    try:
+        result = await awaitable
+    except Exception as exc:
+        _attach_feedback(exc, errors, throttling_errors, start)
+        raise
+    finally:
+        retried_errors.reset(token)
+    return Feedback(result, time.monotonic() - start,
+                    _count_throttled(errors, throttling_errors))
+
+
+class AIMDLimit:
+    """Adaptive limit of the requests in flight to a backend, with
+    additive increase and multiplicative decrease (AIMD) as in TCP
+    congestion control. While the limit is in use and the backend is
+    healthy, it grows by ``increase`` requests per round trip (one
+    request per completed request during the initial slow start). It
+    is multiplied by ``backoff`` when a request is throttled, and by
+    ``latency_backoff`` when the short term latency grows over
+    ``latency_tolerance`` times the long term latency (the latency
+    gradient), which happens when requests start queueing in the
+    provider. Only one decrease is done per round trip: the signals of
+    the requests fired before the last decrease are ignored.
+
+    :param initial: initial limit
+    :param min_limit: minimum limit
+    :param max_limit: maximum limit
+    :param increase: requests added to the limit per round trip
+    :param backoff: factor applied to the limit on throttling
+    :param latency_tolerance: ratio of the short to the long term latency
+                              over which the limit is decreased
+    :param latency_backoff: factor applied to the limit when the
+                            latency grows
+    :param short_smoothing: weight of a new latency in the short term average
+    :param long_smoothing: weight of a new latency in the long term average
+    """
+    def __init__(self, initial: float = 4.0, min_limit: float = 1.0,
+                 max_limit: float = 256.0, increase: float = 1.0,
+                 backoff: float = 0.5, latency_tolerance: float = 2.0,
+                 latency_backoff: float = 0.9, short_smoothing: float = 0.2,
+                 long_smoothing: float = 0.02) -> None:
+        self.limit = min(max(initial, min_limit), max_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.latency_backoff = latency_backoff
+        self.short_smoothing = short_smoothing
+        self.long_smoothing = long_smoothing
+        self.in_flight = 0
+        self.throttled = 0
+        self.decreases = 0
+        self.short_latency: Optional[float] = None
+        self.long_latency: Optional[float] = None
+        self.slow_start = True
+        self.last_decrease = float("-inf")
+
+    def available(self) -> bool:
+        """If a new request can be fired within the limit."""
+        return self.in_flight < int(self.limit)
+
+    def acquire(self) -> float:
+        """Records a request fired, returning its start time."""
+        self.in_flight += 1
+        return time.monotonic()
+
+    def cancel(self) -> None:
+        """Releases a request without observing it (e.g. not fired)."""
+        self.in_flight = max(self.in_flight - 1, 0)
+
+    def _decrease(self, factor: float, now: float) -> None:
+        self.limit = max(self.min_limit, self.limit * factor)
+        self.last_decrease = now
+        self.slow_start = False
+        self.decreases += 1
+
+    def release(self, started: float, latency: Optional[float] = None,
+                throttled: int = 0) -> None:
+        """Releases a finished request and adapts the limit to its
+        latency and throttling errors.
+
+        :param started: the start time returned by :meth:`acquire`
+        :param latency: the latency of the request in seconds (None if
+                        unknown, e.g. not a backend call)
+        :param throttled: number of throttling errors of the request
+        """
+        saturated = self.in_flight >= int(self.limit)
+        self.in_flight = max(self.in_flight - 1, 0)
+        now = time.monotonic()
+        # Signals from before the last decrease were already acted upon
+        fresh = started > self.last_decrease
+        if throttled:
+            self.throttled += throttled
+            if fresh:
+                self._decrease(self.backoff, now)
+            return
+        if latency is None:
+            return
+        if self.short_latency is None or self.long_latency is None:
+            self.short_latency = self.long_latency = latency
+        else:
+            self.short_latency += self.short_smoothing * (latency - self.short_latency)
+            self.long_latency += self.long_smoothing * (latency - self.long_latency)
+        if self.short_latency > self.latency_tolerance * self.long_latency:
+            if fresh:
+                self._decrease(self.latency_backoff, now)
+            return
+        if saturated:
+            step = 1.0 if self.slow_start else self.increase / self.limit
+            self.limit = min(self.max_limit, self.limit + step)
+
+    def stats(self) -> dict[str, float]:
+        """Returns the current limit, requests in flight and counters."""
+        return {"limit": self.limit, "in_flight": self.in_flight,
+                "throttled": self.throttled, "decreases": self.decreases,
+                "latency": self.short_latency or 0.0}
+
+
+class ConcurrencyController:
+    """Adaptive concurrency control of the backend calls, consulted by
+    the schedulers before firing backend tasks (set it in the
+    ``scheduler.concurrency`` context). Each backend class gets its own
+    :class:`AIMDLimit` of requests in flight, which grows while the
+    latency and error rates are healthy and backs off on throttling
+    errors (see :meth:`feste.task.FesteBase.throttling_errors`, retried
+    or raised by the calls) and latency increases.
+    The number of workers (or the maximum concurrency of the asyncio
+    scheduler) is then only an upper bound. The limits are kept across
+    computations, so the controller keeps adapting to the backends, and
+    they are reported by :class:`feste.instrumentation.Instrumentation`.
+
+    :param limits: mapping from backend class to its limit, the limits of
+                   the other backends are created by ``limit_factory``
+    :param limit_factory: callable creating the limit of a backend
+    """
+    def __init__(self, limits: Optional[Mapping[type, AIMDLimit]] = None,
+                 limit_factory: Callable[[], AIMDLimit] = AIMDLimit) -> None:
+        self.limits: dict[type, AIMDLimit] = dict(limits or {})
+        self.limit_factory = limit_factory
+        # Key -> (limit, start time) of the requests in flight
+        self._fired: dict[Hashable, tuple[AIMDLimit, float]] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_fired"] = {}
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def limit_for(self, obj: Any) -> Optional[AIMDLimit]:
+        """Returns the limit of a backend object (None if it isn't a
+        backend), creating it on first use.
+
+        :param obj: the object bound to the task call
+        """
+        # TODO: Avoid circular imports from task
+        from feste.task import FesteBase
+        if not isinstance(obj, FesteBase):
+            return None
+        for cls in type(obj).__mro__:
+            if cls in self.limits:
+                return self.limits[cls]
+        limit = self.limits[type(obj)] = self.limit_factory()
+        return limit
+
+    def acquire(self, key: Hashable, task: Any) -> bool:
+        """Acquires a slot of the backend of a task before firing it.
+
+        :param key: the task key
+        :param task: the task
+        :return: False if the backend is at its limit, True otherwise
+                 (including tasks that aren't backend calls)
+        """
+        return self.acquire_limit(key, self.task_limit(task))
+
+    def task_limit(self, task: Any) -> Optional[AIMDLimit]:
+        """Returns the limit of the backend of a task (None if it isn't
+        a remote call, see :meth:`feste.task.FesteBase.remote_tasks`).
+
+        :param task: the task
+        """
+        obj = _backend_of(task)
+        if obj is None:
+            return None
+        with self._lock:
+            return self.limit_for(obj)
+
+    def acquire_limit(self, key: Hashable, limit: Optional[AIMDLimit]) -> bool:
+        """Acquires a slot of a limit (see :meth:`task_limit`) before
+        firing a task, e.g. with the limit of the task kept by the scheduler.
+
+        :param key: the task key
+        :param limit: the limit of the backend of the task (or None)
+        :return: False if the backend is at its limit, True otherwise
+        """
+        if limit is None:
+            return True
+        with self._lock:
+            if not limit.available():
+                return False
+            self._fired[key] = (limit, limit.acquire())
+            return True
+
+    def cancel(self, key: Hashable) -> None:
+        """Releases the slot of a task that wasn't fired (or was
+        abandoned) without observing it.
+
+        :param key: the task key
+        """
+        with self._lock:
+            fired = self._fired.pop(key, None)
+            if fired is not None:
+                fired[0].cancel()
+
+    def release(self, key: Hashable, result: Any) -> Any:
+        """Releases the slot of a finished task, adapting the limit of
+        its backend with the feedback of the call.
+
+        :param key: the task key
+        :param result: the task result, a :class:`Feedback` for the
+                       backend calls
+        :return: the task result, without the feedback
+        """
+        feedback = result if isinstance(result, Feedback) else None
+        with self._lock:
+            fired = self._fired.pop(key, None)
+            if fired is not None:
+                limit, started = fired
+                if feedback is None:
+                    limit.release(started)
+                else:
+                    limit.release(started, feedback.latency, feedback.throttled)
+        return feedback.result if feedback is not None else result
+
+    def fail(self, key: Hashable, exc: BaseException) -> None:
+        """Releases the slot of a failed task, adapting the limit of its
+        backend with the feedback attached to the error (e.g. throttled).
+        The feedback is only observed once, the other tasks failing with
+        the same error (e.g. of the same chunk) are released without it.
+
+        :param key: the task key
+        :param exc: the error raised by the task
+        """
+        feedback = vars(exc).pop("feste_feedback", None)
+        if isinstance(feedback, Feedback):
+            self.release(key, feedback)
+        else:
+            self.cancel(key)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Returns the stats of the limits by backend class name."""
+        with self._lock:
+            return {cls.__name__: limit.stats() for cls, limit in self.limits.items()}
+
+
+def _backend_of(unwrapped: Any) -> Any:
+    """Returns the backend object of a task calling a remote API (see
+    :meth:`feste.task.FesteBase.remote_tasks`), or None for the other
+    tasks (e.g. prompt rendering)."""
+    # TODO: Avoid circular imports from task
+    from feste.task import FesteBase
+    call = bind_task(unwrapped)
+    if call is None or not isinstance(call.obj, FesteBase) or \
+            call.function not in type(call.obj).remote_tasks():
+        return None
+    return call.obj
+
+
+def feedback_task(task: Any, unwrapped: Any,
+                  controller: Optional[ConcurrencyController]) -> Any:
+    """Wraps the call of a backend task with :func:`call_with_feedback`,
+    keeping the task arguments so they are still resolved by Dask. It
+    should be the outermost wrapper, as the task result is replaced by
+    its :class:`Feedback`. Tasks that aren't backend calls are returned
+    unchanged.
+
+    :param task: the task (possibly already wrapped, e.g. with retries)
+    :param unwrapped: the unwrapped task
+    :param controller: the concurrency controller (None to disable)
+    :return: the wrapped task
+    """
+    if controller is None:
+        return task
+    obj = _backend_of(unwrapped)
+    if obj is None:
+        return task
+    wrapper = partial(call_with_feedback, tuple(obj.throttling_errors()),
+                      task_function(task))
+    if task[0] is apply:
+        return (apply, wrapper) + task[2:]
+    return (wrapper,) + task[1:]
+
+
+def feedback_awaitable(awaitable: Awaitable, unwrapped: Any,
+                       controller: Optional[ConcurrencyController]) -> Awaitable:
+    """Wraps the execution of a backend task on the event loop with
+    :func:`await_with_feedback`, awaitables of other tasks are returned
+    unchanged.
+
+    :param awaitable: the execution of the task
+    :param unwrapped: the task
+    :param controller: the concurrency controller (None to disable)
+    :return: the wrapped awaitable
+    """
+    if controller is None:
+        return awaitable
+    obj = _backend_of(unwrapped)
+    if obj is None:
+        return awaitable
+    return await_with_feedback(tuple(obj.throttling_errors()), awaitable)
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Any, Callable, NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PoolConfig(NamedTuple):
+    """Configuration of the HTTP connection pool of a backend.
+
+    :param pool_connections: number of hosts with a connection pool
+    :param pool_maxsize: maximum number of connections kept per host
+    :param keep_alive: if connections are kept open and reused
+    :param keepalive_timeout: seconds an idle connection is kept open
+                              (asyncio clients)
+    """
+    pool_connections: int = 10
+    pool_maxsize: int = 32
+    keep_alive: bool = True
+    keepalive_timeout: float = 30.0
+
+
+class ConnectionStats(NamedTuple):
+    """Connection reuse statistics of the sessions of a backend.
+
+    :param requests: number of requests made
+    :param connections: number of connections opened
+    """
+    requests: int
+    connections: int
+
+    @property
+    def reused(self) -> int:
+        """Number of requests made on an already open connection."""
+        return max(self.requests - self.connections, 0)
+
+
+class CountingAdapter(HTTPAdapter):
+    """HTTP adapter that counts the requests sent and the connections
+    opened (including reconnections of dropped connections)."""
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self.num_requests = 0
+        self.num_connections = 0
+        self._counter_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        # Unpickled adapters start with a new pool and counters
+        CountingAdapter.__init__(self, pool_connections=state["_pool_connections"],
+                                 pool_maxsize=state["_pool_maxsize"],
+                                 max_retries=state["max_retries"],
+                                 pool_block=state["_pool_block"])
+
+    def count_connection(self) -> None:
+        with self._counter_lock:
+            self.num_connections += 1
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        count_connection = self.count_connection
+        pool_classes = {}
+        for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme.items():
+            class Connection(pool_cls.ConnectionCls):  # type: ignore
+                def connect(self) -> None:
+                    count_connection()
+                    super().connect()
+            pool_classes[scheme] = type(pool_cls.__name__, (pool_cls,),
+                                        {"ConnectionCls": Connection})
+        self.poolmanager.pool_classes_by_scheme = pool_classes
+
+    def send(self, *args: Any, **kwargs: Any) -> requests.Response:
+        with self._counter_lock:
+            self.num_requests += 1
+        return super().send(*args, **kwargs)
+
+
+class SharedSession(requests.Session):
+    """Requests session shared by all the tasks of a process. Clients
+    that close their sessions (e.g. OpenAI closes them periodically)
+    don't close the shared pool, it's only closed by :func:`close_sessions`.
+    """
+    def close(self) -> None:
+        pass
+
+    def close_pool(self) -> None:
+        """Closes the connections of the pool."""
+        super().close()
+
+
+# Sessions of the current process by (name, pool config, retries)
+_sessions: dict[tuple, SharedSession] = {}
+_sessions_pid: Optional[int] = None
+_sessions_lock = threading.Lock()
+
+# Asyncio clients of each event loop by name
+_async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_session(name: str, config: PoolConfig = PoolConfig(),
+                max_retries: Any = 0) -> SharedSession:
+    """Returns the HTTP session of a backend in the current process,
+    which is created once and reused by all the tasks, so connections
+    are kept alive between requests.
+
+    :param name: name of the backend
+    :param config: the connection pool configuration
+    :param max_retries: retries of the HTTP adapter (an int or an
+                        ``urllib3`` ``Retry``)
+    :return: the shared session
+    """
+    global _sessions_pid
+    key = (name, config, repr(max_retries))
+    with _sessions_lock:
+        if _sessions_pid != os.getpid():
+            # Sessions inherited from the parent process can't be used
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+        session = _sessions.get(key)
+        if session is None:
+            session = SharedSession()
+            adapter = CountingAdapter(pool_connections=config.pool_connections,
+                                      pool_maxsize=config.pool_maxsize,
+                                      max_retries=max_retries)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            if not config.keep_alive:
+                session.headers["Connection"] = "close"
+            _sessions[key] = session
+    return session
+
+
+def get_async_client(name: str, factory: Callable[[], Any]) -> Any:
+    """Returns the asyncio client (e.g. an ``aiohttp`` session) of a
+    backend in the running event loop, it is created once with the
+    factory and reused by all the tasks of the loop. The clients are
+    closed by :func:`aclose_clients` when the asyncio scheduler finishes.
+
+    :param name: name of the client
+    :param factory: callable creating the client
+    :return: the client
+    """
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    client = clients.get(name)
+    if client is None:
+        client = clients[name] = factory()
+    return client
+
+
+def aiohttp_session(config: PoolConfig = PoolConfig()) -> Any:
+    """Creates an ``aiohttp`` session with the connection pool
+    configuration, it must be called from a running event loop.
+
+    :param config: the connection pool configuration
+    """
+    import aiohttp
+    connector = aiohttp.TCPConnector(
+        limit_per_host=config.pool_maxsize,
+        keepalive_timeout=config.keepalive_timeout if config.keep_alive else None,
+        force_close=not config.keep_alive,
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+async def aclose_clients() -> None:
+    """Closes the asyncio clients of the running event loop."""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.close()
+
+
+def close_sessions() -> None:
+    """Closes the HTTP sessions of the current process."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close_pool()
+        _sessions.clear()
+
+
+def connection_stats() -> dict[str, ConnectionStats]:
+    """Returns the connection reuse statistics of the HTTP sessions of
+    the current process by backend name (with the multiprocessing
+    scheduler, the requests are made by the worker processes).
+
+    :return: mapping from backend name to its statistics
+    """
+    stats: dict[str, ConnectionStats] = {}
+    with _sessions_lock:
+        sessions = list(_sessions.items())
+    for (name, _, _), session in sessions:
+        num_requests, num_connections = stats.get(name, (0, 0))
+        adapters = {id(a): a for a in session.adapters.values()}.values()
+        for adapter in adapters:
+            if isinstance(adapter, CountingAdapter):
+                num_requests += adapter.num_requests
+                num_connections += adapter.num_connections
+        stats[name] = ConnectionStats(num_requests, num_connections)
+    return stats
@@ -3,11 +3,30 @@ from typing import Any
 # Default global context
 global_context: dict[str, Any] = {
     "eager": False,
+    "scheduler.dynamic_batching": True,
+    "optimization.cse": True,
+    "batch.max_size": None,
+    "batch.max_tokens": None,
+    "scheduler.response_cache": None,
+    "scheduler.rate_limits": None,
+    "scheduler.retry_policy": None,
+    "scheduler.stream_callback": None,
+    "scheduler.cassette": None,
+    "scheduler.checkpoint": None,
+    "scheduler.priority": "order",
+    "scheduler.cost_model": None,
+    "scheduler.concurrency": None,
+    "prompt.bytecode_cache": None,
     "multiprocessing.chunk_size": 2,
     "multiprocessing.rerun_exceptions_locally": False,
     "multiprocessing.num_workers": None,
     "multiprocessing.func_loads": None,
     "multiprocessing.func_dumps": None,
+    "multiprocessing.object_registry": True,
+    "asyncio.max_concurrency": 256,
+    "distributed.coordinator": None,
+    "pipeline.window_size": 1024,
+    "pipeline.max_windows": 2,
 }
 
 
@@ -0,0 +1,567 @@
+import argparse
+import ipaddress
+import itertools
+import os
+import pickle
+import queue
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Hashable, Iterator, Mapping, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, NamedTuple, Optional, Union
+
+import cloudpickle
+from dask.core import _execute_task
+from dask.local import nested_get
+from dask.multiprocessing import pack_exception, reraise
+from dask.optimization import cull, fuse
+from dask.utils import ensure_dict
+
+from feste import context
+from feste.concurrency import Feedback
+from feste.registry import ObjectRegistry
+from feste.scheduler import iter_async
+
+# Environment variable with the key used to authenticate the workers
+AUTHKEY_ENV = "FESTE_AUTHKEY"
+
+# Worker of the current process, used to send the partial outputs of
+# streaming tasks to the coordinator
+_worker: Optional['Worker'] = None
+
+
+def _is_loopback(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def _authkey(authkey: Union[str, bytes, None], host: str) -> Optional[bytes]:
+    """Returns the authentication key, which is required unless the
+    connections stay on the loopback interface, as the messages are
+    unpickled."""
+    if authkey is None:
+        authkey = os.environ.get(AUTHKEY_ENV)
+    if isinstance(authkey, str):
+        authkey = authkey.encode()
+    if not authkey and not _is_loopback(host):
+        raise ValueError(f"an authkey (or the {AUTHKEY_ENV} environment variable) "
+                         f"is required to connect over {host or 'all interfaces'}")
+    return authkey
+
+
+def parse_address(address: Union[str, tuple[str, int]]) -> tuple[str, int]:
+    """Parses a ``host:port`` address.
+
+    :param address: the address (or a (host, port) tuple)
+    """
+    if isinstance(address, tuple):
+        return address
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class Payload:
+    """Task and dependency data of a task fired by the scheduler. It is
+    only serialized when it is sent to a worker, so the results already
+    held by the worker are sent by reference.
+
+    :param task_data: tuple (task, data)
+    """
+    __slots__ = ("task", "data")
+
+    def __init__(self, task_data: tuple[Any, dict]) -> None:
+        self.task, self.data = task_data
+
+
+class StreamQueue:
+    """Queue of the partial outputs of streaming tasks. The coordinator
+    consumes it, and its copies in the workers send the outputs to the
+    coordinator."""
+    def __init__(self) -> None:
+        self.queue: queue.Queue = queue.Queue()
+
+    def put(self, item: Any) -> None:
+        self.queue.put(item)
+
+    def get(self) -> Any:
+        return self.queue.get()
+
+    def __reduce__(self) -> Any:
+        return (_WorkerStreamQueue, ())
+
+
+class _WorkerStreamQueue:
+    def put(self, item: Any) -> None:
+        if _worker is not None:
+            _worker.send(("stream", item))
+
+
+class WorkerStats(NamedTuple):
+    """Statistics of a worker connected to the coordinator.
+
+    :param name: name of the worker
+    :param nthreads: number of tasks it runs concurrently
+    :param tasks: number of tasks it ran
+    :param local_inputs: number of task inputs it already held
+    :param remote_inputs: number of task inputs sent to it
+    :param cached: number of results it holds
+    """
+    name: str
+    nthreads: int
+    tasks: int
+    local_inputs: int
+    remote_inputs: int
+    cached: int
+
+
+class _WorkItem:
+    """Chunk of tasks submitted by the scheduler."""
+    __slots__ = ("id", "future", "args", "inputs")
+
+    def __init__(self, item_id: int, future: Future, args: list) -> None:
+        self.id = item_id
+        self.future = future
+        self.args = args
+        self.inputs = {dep for _, payload, *_ in args for dep in payload.data}
+
+
+class _WorkerState:
+    """State of a worker in the coordinator."""
+    def __init__(self, conn: Connection, name: str, nthreads: int,
+                 cache_size: int) -> None:
+        self.conn = conn
+        self.name = name
+        self.nthreads = nthreads
+        self.cache_size = cache_size
+        self.free = nthreads
+        self.send_lock = threading.Lock()
+        # Results held by the worker, in least recently used order
+        self.keys: OrderedDict[Hashable, None] = OrderedDict()
+        self.drop: list[Hashable] = []
+        self.inflight: dict[int, _WorkItem] = {}
+        self.tasks = 0
+        self.local_inputs = 0
+        self.remote_inputs = 0
+
+    def send(self, message: Any) -> None:
+        data = cloudpickle.dumps(message)
+        with self.send_lock:
+            self.conn.send_bytes(data)
+
+
+class Coordinator:
+    """Coordinator of the distributed scheduler. Workers on other hosts
+    (started with the ``feste-worker`` command) connect to it over TCP
+    and pull the tasks fired by the scheduler, up to their number of
+    threads. The results stay in a cache in the worker that computed
+    them, and tasks are placed on the worker holding most of their
+    inputs, which are then sent by reference instead of by value.
+
+    The connections are authenticated with the key given here or in
+    the ``FESTE_AUTHKEY`` environment variable, which is required unless
+    the coordinator listens on the loopback interface. The tasks are
+    pickled, so the coordinator should only listen on trusted networks.
+
+    :param host: the host to listen on
+    :param port: the port to listen on (0 for any free port)
+    :param authkey: key used to authenticate the workers
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 authkey: Union[str, bytes, None] = None) -> None:
+        self.listener = Listener((host, port), authkey=_authkey(authkey, host))
+        self.stream_queue = StreamQueue()
+        self.workers: list[_WorkerState] = []
+        self.registry: Optional[ObjectRegistry] = None
+        self._pending: deque[_WorkItem] = deque()
+        self._ids = itertools.count()
+        self._lock = threading.Condition()
+        self._session_lock = threading.Lock()
+        self._closed = False
+        self._accept_thread = threading.Thread(target=self._accept, daemon=True)
+        self._accept_thread.start()
+
+    @property
+    def address(self) -> str:
+        """The ``host:port`` address the workers connect to."""
+        host, port = self.listener.address
+        return f"{host}:{port}"
+
+    @property
+    def num_slots(self) -> int:
+        """Number of tasks that can run concurrently in the workers."""
+        with self._lock:
+            return sum(worker.nthreads for worker in self.workers)
+
+    def wait_for_workers(self, num_workers: int = 1,
+                         timeout: Optional[float] = None) -> None:
+        """Waits until a number of workers are connected.
+
+        :param num_workers: the number of workers
+        :param timeout: maximum time to wait in seconds
+        """
+        with self._lock:
+            if not self._lock.wait_for(lambda: len(self.workers) >= num_workers,
+                                       timeout):
+                raise TimeoutError(f"{len(self.workers)} of {num_workers} "
+                                   f"workers connected to {self.address}")
+
+    def stats(self) -> list[WorkerStats]:
+        """Returns the statistics of the connected workers."""
+        with self._lock:
+            return [WorkerStats(w.name, w.nthreads, w.tasks, w.local_inputs,
+                                w.remote_inputs, len(w.keys))
+                    for w in self.workers]
+
+    def _accept(self) -> None:
+        while not self._closed:
+            conn = None
+            try:
+                conn = self.listener.accept()
+                _, name, nthreads, cache_size = pickle.loads(conn.recv_bytes())
+            except Exception:
+                # Connections failing the authentication (AuthenticationError)
+                # or the handshake are dropped, the other workers can still join
+                if conn is not None:
+                    conn.close()
+                continue
+            worker = _WorkerState(conn, name, nthreads, cache_size)
+            with self._lock:
+                if self.registry is not None:
+                    worker.send(("registry", cloudpickle.dumps(self.registry)))
+                self.workers.append(worker)
+                self._lock.notify_all()
+            threading.Thread(target=self._receive, args=(worker,),
+                             daemon=True).start()
+            self._dispatch()
+
+    def _receive(self, worker: _WorkerState) -> None:
+        while True:
+            try:
+                message = pickle.loads(worker.conn.recv_bytes())
+            except (OSError, EOFError):
+                self._disconnect(worker)
+                return
+            if message[0] == "done":
+                _, item_id, results = message
+                with self._lock:
+                    item = worker.inflight.pop(item_id)
+                    worker.free += 1
+                    worker.tasks += len(results)
+                    for key, _, failed in results:
+                        if not failed:
+                            worker.keys[key] = None
+                    self._evict(worker)
+                item.future.set_result(results)
+                self._dispatch()
+            elif message[0] == "stream":
+                self.stream_queue.put(message[1])
+
+    def _evict(self, worker: _WorkerState) -> None:
+        """Drops the least recently used results of a worker exceeding
+        its cache size, keeping the inputs of its running tasks."""
+        excess = len(worker.keys) - worker.cache_size
+        if excess <= 0:
+            return
+        inputs = set().union(*(item.inputs for item in worker.inflight.values()))
+        for key in list(worker.keys):
+            if excess <= 0:
+                break
+            if key not in inputs:
+                del worker.keys[key]
+                worker.drop.append(key)
+                excess -= 1
+
+    def _disconnect(self, worker: _WorkerState) -> None:
+        with self._lock:
+            if worker not in self.workers:
+                return
+            self.workers.remove(worker)
+            self._pending.extendleft(reversed(list(worker.inflight.values())))
+            worker.inflight.clear()
+            if not self.workers:
+                error = ConnectionError("All workers disconnected from the coordinator.")
+                while self._pending:
+                    self._pending.popleft().future.set_exception(error)
+        self._dispatch()
+
+    def submit(self, fn: Any, args: list) -> Future:
+        """Submits a chunk of tasks fired by the scheduler (the arguments
+        of :func:`dask.local.batch_execute_tasks`), which is pulled by
+        the workers.
+
+        :param fn: ignored, the workers execute the tasks
+        :param args: the arguments of the tasks
+        :return: future of the results of the tasks
+        """
+        future: Future = Future()
+        with self._lock:
+            if not self.workers:
+                raise ConnectionError("No workers connected to the coordinator.")
+            self._pending.append(_WorkItem(next(self._ids), future, args))
+        self._dispatch()
+        return future
+
+    def _dispatch(self) -> None:
+        """Places the pending chunks on the workers with free threads,
+        preferring the worker with most of their inputs."""
+        assignments = []
+        with self._lock:
+            while self._pending:
+                available = [w for w in self.workers if w.free > 0]
+                if not available:
+                    break
+                item = self._pending.popleft()
+                worker = max(available, key=lambda w: (
+                    sum(1 for key in item.inputs if key in w.keys), w.free))
+                worker.free -= 1
+                worker.inflight[item.id] = item
+                local = {key for key in item.inputs if key in worker.keys}
+                for key in local:
+                    worker.keys.move_to_end(key)
+                worker.local_inputs += len(local)
+                worker.remote_inputs += len(item.inputs) - len(local)
+                drop, worker.drop = worker.drop, []
+                assignments.append((worker, item, local, drop))
+        for worker, item, local, drop in assignments:
+            self._send_item(worker, item, local, drop)
+
+    def _send_item(self, worker: _WorkerState, item: _WorkItem,
+                   local: set, drop: list) -> None:
+        registry = self.registry or ObjectRegistry()
+        tasks = []
+        for key, payload, *_ in item.args:
+            data = {k: v for k, v in payload.data.items() if k not in local}
+            refs = [k for k in payload.data if k in local]
+            tasks.append((key, registry.dumps((payload.task, data, refs))))
+        try:
+            worker.send(("tasks", item.id, tasks, drop))
+        except OSError:
+            self._disconnect(worker)
+
+    def start_session(self, registry: ObjectRegistry) -> None:
+        """Starts the computation of a graph, sending the registry of its
+        backends to the workers and clearing their results.
+
+        :param registry: the object registry of the graph
+        """
+        self._session_lock.acquire()
+        with self._lock:
+            self.registry = registry
+            data = cloudpickle.dumps(registry)
+            for worker in self.workers:
+                worker.keys.clear()
+                worker.drop.clear()
+                worker.send(("registry", data))
+
+    def end_session(self) -> None:
+        """Ends the computation of a graph."""
+        with self._lock:
+            self.registry = None
+        self._session_lock.release()
+
+    def close(self) -> None:
+        """Disconnects the workers and stops listening."""
+        self._closed = True
+        with self._lock:
+            workers = list(self.workers)
+        for worker in workers:
+            try:
+                worker.send(("close",))
+                worker.conn.close()
+            except OSError:
+                pass
+        self.listener.close()
+
+    def __enter__(self) -> 'Coordinator':
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:  # type: ignore
+        self.close()
+
+
+class Worker:
+    """Worker of the distributed scheduler, it connects to a coordinator
+    and runs the tasks it pulls in a thread pool, keeping their results
+    so the tasks depending on them can be placed on it.
+
+    :param address: the ``host:port`` address of the coordinator
+    :param nthreads: number of tasks run concurrently
+    :param name: name of the worker, defaults to ``hostname-pid``
+    :param authkey: key to authenticate with the coordinator (required
+                    unless it is on the loopback interface)
+    :param cache_size: maximum number of results kept
+    """
+    def __init__(self, address: Union[str, tuple[str, int]], nthreads: int = 8,
+                 name: Optional[str] = None, authkey: Union[str, bytes, None] = None,
+                 cache_size: int = 1024) -> None:
+        self.address = parse_address(address)
+        self.nthreads = nthreads
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.authkey = _authkey(authkey, self.address[0])
+        self.cache_size = cache_size
+        self.registry = ObjectRegistry()
+        self.cache: dict[Hashable, Any] = {}
+        self.conn: Optional[Connection] = None
+        self._send_lock = threading.Lock()
+
+    def send(self, message: Any) -> None:
+        data = cloudpickle.dumps(message)
+        with self._send_lock:
+            self.conn.send_bytes(data)  # type: ignore
+
+    def connect(self, timeout: float = 30.0) -> None:
+        """Connects to the coordinator, retrying until it is listening.
+
+        :param timeout: maximum time to retry in seconds
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.conn = Client(self.address, authkey=self.authkey)
+                break
+            except ConnectionRefusedError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+        self.send(("hello", self.name, self.nthreads, self.cache_size))
+
+    def execute(self, item_id: int, tasks: list[tuple[Hashable, bytes]]) -> None:
+        """Executes a chunk of tasks and sends the results."""
+        results = []
+        for key, payload in tasks:
+            try:
+                task, data, refs = self.registry.loads(payload)
+                data.update((ref, self.cache[ref]) for ref in refs)
+                result = _execute_task(task, data)
+                # The dependents read the result without its feedback
+                self.cache[key] = result.result if isinstance(result, Feedback) \
+                    else result
+                results.append((key, cloudpickle.dumps((result, self.name)), False))
+            except BaseException as e:
+                results.append((key, pack_exception(e, cloudpickle.dumps), True))
+        self.send(("done", item_id, results))
+
+    def run(self, timeout: float = 30.0) -> None:
+        """Connects to the coordinator and runs the tasks until the
+        coordinator disconnects.
+
+        :param timeout: maximum time to wait for the coordinator in seconds
+        """
+        global _worker
+        _worker = self
+        self.connect(timeout)
+        with ThreadPoolExecutor(self.nthreads) as executor:
+            while True:
+                try:
+                    message = pickle.loads(self.conn.recv_bytes())  # type: ignore
+                except (OSError, EOFError):
+                    break
+                if message[0] == "tasks":
+                    _, item_id, tasks, drop = message
+                    for key in drop:
+                        self.cache.pop(key, None)
+                    executor.submit(self.execute, item_id, tasks)
+                elif message[0] == "registry":
+                    self.registry = pickle.loads(message[1])
+                    self.cache.clear()
+                elif message[0] == "close":
+                    break
+        self.conn.close()  # type: ignore
+
+
+def iter_distributed(dsk: Mapping, keys: Sequence[Hashable] | Hashable,  # type: ignore
+                     coordinator: Optional[Coordinator] = None,
+                     optimize_graph: bool = True, chunksize: Optional[int] = None,
+                     timeout: Optional[float] = None,
+                     **kwargs) -> Iterator[tuple[Hashable, Any]]:
+    """Distributed scheduler that runs the :func:`feste.scheduler.iter_async`
+    state machine in this process and the tasks in the workers connected
+    to the coordinator, yielding the ``(key, result)`` of the requested
+    keys as soon as each one finishes. The backends and prompts of the
+    graph are sent once to each worker.
+
+    :param dsk: the graph to execute
+    :param keys: the keys to compute
+    :param coordinator: the coordinator, defaults to the one in the
+                        ``distributed.coordinator`` context
+    :param optimize_graph: if graph should be optimized
+    :param chunksize: number of tasks sent together to a worker
+    :param timeout: maximum time to wait for a worker in seconds
+    :return: iterator of (key, result)
+    """
+    # TODO: Avoid circular imports from task
+    from feste.task import FesteBase
+    coordinator = coordinator or context.get("distributed.coordinator")
+    if coordinator is None:
+        raise ValueError("The distributed scheduler requires a coordinator.")
+    coordinator.wait_for_workers(1, timeout)
+    chunksize = chunksize or context.get("multiprocessing.chunk_size")
+    dsk = ensure_dict(dsk)
+    registry = ObjectRegistry()
+    registry.register_graph(dsk, (FesteBase,))
+
+    if not optimize_graph:
+        kwargs.setdefault("batch_optimizations", [])
+    dsk2, dependencies = cull(dsk, keys)
+    if optimize_graph:
+        dsk3, dependencies = fuse(dsk2, keys, dependencies)
+    else:
+        dsk3 = dsk2
+
+    stream_callback = kwargs.pop("stream_callback", None) or \
+        context.get("scheduler.stream_callback")
+    if stream_callback is not None:
+        kwargs["stream_queue"] = coordinator.stream_queue
+
+    coordinator.start_session(registry)
+    try:
+        yield from iter_async(
+            coordinator.submit,
+            coordinator.num_slots,
+            dsk3,
+            keys,
+            dumps=Payload,
+            loads=pickle.loads,
+            pack_exception=pack_exception,
+            raise_exception=reraise,
+            chunksize=chunksize,
+            stream_callback=stream_callback,
+            **kwargs,
+        )
+    finally:
+        coordinator.end_session()
+
+
+def get_distributed(dsk: Mapping, keys: Sequence[Hashable] | Hashable,  # type: ignore
+                    **kwargs):
+    """Distributed scheduler, it runs :func:`iter_distributed` to
+    completion and returns the results of the requested keys."""
+    finished = dict(iter_distributed(dsk, keys, **kwargs))
+    return nested_get(keys, finished)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Entry point of the ``feste-worker`` command."""
+    parser = argparse.ArgumentParser(
+        description="Feste worker, it runs the tasks of a coordinator.")
+    parser.add_argument("address", help="host:port of the coordinator")
+    parser.add_argument("--nthreads", type=int, default=8,
+                        help="number of tasks run concurrently")
+    parser.add_argument("--name", default=None, help="name of the worker")
+    parser.add_argument("--cache-size", type=int, default=1024,
+                        help="maximum number of results kept")
+    parser.add_argument("--timeout", type=float, default=30.0,
+                        help="seconds to wait for the coordinator")
+    args = parser.parse_args(argv)
+    worker = Worker(args.address, nthreads=args.nthreads, name=args.name,
+                    cache_size=args.cache_size)
+    worker.run(timeout=args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,33 @@
 from graphlib import TopologicalSorter
-from typing import Any, Iterator, Mapping, TextIO
+from typing import Any, Callable, Iterator, Mapping, Optional, TextIO
 
-import dagviz
-import networkx as nx
-from dask.base import collections_to_dsk
 from dask.base import unpack_collections as base_unpack_collections
 from dask.core import get_dependencies
-from dask.dot import dot_graph
+from dask.delayed import Delayed
 from dask.order import order
-from rich.pretty import pprint
+
+
+def _unpack_delayed(args: tuple) -> Optional[tuple[list, Callable]]:
+    """Fast path of Dask's ``unpack_collections`` when the arguments are
+    delayed objects or lists/tuples of them, it returns None otherwise.
+
+    :param args: the arguments
+    :return: tuple (collections, repack function) or None
+    """
+    collections: dict[Any, Delayed] = {}
+    for arg in args:
+        items = arg if type(arg) in (list, tuple) else (arg,)
+        for item in items:
+            if not isinstance(item, Delayed):
+                return None
+            collections.setdefault(item.key, item)
+
+    def repack(results: list) -> tuple:
+        by_key = dict(zip(collections, results))
+        return tuple(type(arg)(by_key[item.key] for item in arg)
+                     if type(arg) in (list, tuple) else by_key[arg.key]
+                     for arg in args)
+    return list(collections.values()), repack
 
 
 class FesteGraph(Mapping):
@@ -27,9 +46,13 @@ class FesteGraph(Mapping):
         :param args: collection of objects.
         :return: Tuple (Graph, collections, repack function)
         """
-        collections, repack = base_unpack_collections(*args)
-        dsk = collections_to_dsk(collections, optimize_graph=False)
-        return cls(dict(dsk)), collections, repack
+        # TODO: Avoid circular imports from task
+        from feste.task import collect_graph
+        unpacked = _unpack_delayed(args)
+        if unpacked is None:
+            unpacked = base_unpack_collections(*args)
+        collections, repack = unpacked
+        return cls(collect_graph(collections)), collections, repack
 
     def get_all_dependencies(self) -> dict[str, str]:
         """Returns a dict with all dependencies."""
@@ -48,6 +71,8 @@ class FesteGraph(Mapping):
 
     def print(self) -> None:
         """Print the internal graph representation."""
+        # The visualization dependencies are imported on first use
+        from rich.pretty import pprint
         pprint(self.graph)
 
     def order(self) -> dict[str, int]:
@@ -88,6 +113,7 @@ class FesteGraph(Mapping):
 
         :param filename: filename to export the graph (e.g. .pdf, .png)
         """
+        from dask.dot import dot_graph
         dot_graph(dict(self), filename=filename,
                   verbose=True, collapse_outputs=False)
 
@@ -97,6 +123,8 @@ class FesteGraph(Mapping):
         :param svg_handle: the svg file type object
         :return: svg content
         """
+        import dagviz
+        import networkx as nx
         deps = self.get_all_dependencies()
         G = nx.DiGraph(deps)
         r = dagviz.render_svg(G)
@@ -0,0 +1,270 @@
+import bisect
+import threading
+import time
+from collections.abc import Hashable
+from typing import Any, NamedTuple, Optional
+
+from dask.callbacks import Callback
+
+from feste.optimization import bind_task
+
+# Default histogram buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Histogram buckets of the batch sizes
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class DispatchInfo(NamedTuple):
+    """Information recorded by the schedulers in ``state["dispatch"]``
+    when a task is sent to the workers.
+
+    :param fired_key: key of the task fired (the batch key for
+                      dynamically batched tasks)
+    :param batch_size: number of tasks in the fired task
+    :param payload_bytes: size of the serialized payload (None when
+                          tasks are not serialized)
+    :param serialize_time: time in seconds spent serializing the payload
+    """
+    fired_key: Hashable
+    batch_size: int = 1
+    payload_bytes: Optional[int] = None
+    serialize_time: float = 0.0
+
+
+class TaskRecord(NamedTuple):
+    """Timings and information of an executed task.
+
+    :param key: the task key
+    :param backend: name of the backend class (None for other tasks)
+    :param worker_id: id of the worker that ran the task
+    :param batch_size: number of tasks in its batch
+    :param payload_bytes: size of the serialized payload of its batch
+    :param queue_wait: time in seconds from ready to dispatched
+    :param serialize_time: time in seconds serializing the payload of
+                           its batch
+    :param duration: time in seconds from dispatched to finished
+    :param start: dispatch time (``time.time()``)
+    :param end: finish time (``time.time()``)
+    :param fired_key: key of the task fired (the batch key for
+                      dynamically batched tasks)
+    """
+    key: Hashable
+    backend: Optional[str]
+    worker_id: Any
+    batch_size: int
+    payload_bytes: Optional[int]
+    queue_wait: float
+    serialize_time: float
+    duration: float
+    start: float
+    end: float
+    fired_key: Optional[Hashable] = None
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets, as in Prometheus.
+
+    :param buckets: upper bounds of the buckets
+    """
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """Returns the cumulative counts by upper bound (``le``)."""
+        total = 0
+        cumulative = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            le = "+Inf" if bound == float("inf") else repr(float(bound))
+            cumulative.append((le, total))
+        return cumulative
+
+
+def backend_name(task: Any) -> Optional[str]:
+    """Returns the backend class name of a task calling a backend method.
+
+    :param task: the task
+    """
+    # TODO: Avoid circular imports from task
+    from feste.task import FesteBase
+    call = bind_task(task)
+    if call is None or not isinstance(call.obj, FesteBase):
+        return None
+    return type(call.obj).__name__
+
+
+class Instrumentation(Callback):
+    """Scheduler callbacks that record the timings of each task and
+    aggregate them in counters and histograms by backend, with gauges of
+    the current limits of the adaptive concurrency controller (see
+    :mod:`feste.concurrency`) when it is enabled. It can be used as a
+    context manager around ``compute()`` calls, accumulating
+    the metrics of all of them::
+
+        with Instrumentation() as instrumentation:
+            feste.compute(...)
+        print(instrumentation.to_prometheus())
+
+    :param keep_records: if the :class:`TaskRecord` of each task should
+                         be kept (in ``records``)
+    """
+    def __init__(self, keep_records: bool = True) -> None:
+        super().__init__()
+        self.keep_records = keep_records
+        self.records: list[TaskRecord] = []
+        self.counters: dict[tuple[str, str], float] = {}
+        self.histograms: dict[tuple[str, str], Histogram] = {}
+        self.gauges: dict[tuple[str, str], float] = {}
+        self.lock = threading.Lock()
+        self._ready: dict[Hashable, float] = {}
+        self._started: dict[Hashable, tuple[float, float]] = {}
+
+    def _mark_ready(self, state: dict) -> None:
+        now = time.perf_counter()
+        for key in state["ready"]:
+            self._ready.setdefault(key, now)
+
+    def _start(self, dsk: dict) -> None:
+        self._ready.clear()
+        self._started.clear()
+
+    def _start_state(self, dsk: dict, state: dict) -> None:
+        self._mark_ready(state)
+
+    def _pretask(self, key: Hashable, dsk: dict, state: dict) -> None:
+        self._started[key] = (time.perf_counter(), time.time())
+
+    def _posttask(self, key: Hashable, result: Any, dsk: dict, state: dict,
+                  worker_id: Any) -> None:
+        end = time.perf_counter()
+        started = self._started.pop(key, None)
+        ready = self._ready.pop(key, None)
+        # Tasks served from the response cache are not dispatched
+        if started is not None:
+            dispatch = state.get("dispatch", {}).get(key) or DispatchInfo(key)
+            record = TaskRecord(
+                key=key,
+                backend=backend_name(dsk.get(key)),
+                worker_id=worker_id,
+                batch_size=dispatch.batch_size,
+                payload_bytes=dispatch.payload_bytes,
+                queue_wait=started[0] - ready if ready is not None else 0.0,
+                serialize_time=dispatch.serialize_time,
+                duration=end - started[0],
+                start=started[1],
+                end=started[1] + end - started[0],
+                fired_key=dispatch.fired_key,
+            )
+            self.observe(record)
+        concurrency = state.get("concurrency")
+        if concurrency is not None:
+            self.observe_concurrency(concurrency.stats())
+        self._mark_ready(state)
+
+    def observe(self, record: TaskRecord) -> None:
+        """Aggregates a task record in the counters and histograms.
+
+        :param record: the task record
+        """
+        backend = record.backend or ""
+        with self.lock:
+            if self.keep_records:
+                self.records.append(record)
+            self._inc("tasks_total", backend, 1)
+            # The payload of a batch is shared by its tasks
+            self._inc("serialize_seconds_total", backend,
+                      record.serialize_time / record.batch_size)
+            if record.payload_bytes is not None:
+                self._inc("payload_bytes_total", backend,
+                          record.payload_bytes / record.batch_size)
+            self._observe("task_duration_seconds", backend, record.duration)
+            self._observe("queue_wait_seconds", backend, record.queue_wait)
+            self._observe("batch_size", backend, record.batch_size,
+                          BATCH_SIZE_BUCKETS)
+
+    def observe_concurrency(self, stats: dict[str, dict[str, float]]) -> None:
+        """Sets the gauges of the adaptive concurrency limits.
+
+        :param stats: the stats of the limits by backend (see
+                      :meth:`feste.concurrency.ConcurrencyController.stats`)
+        """
+        with self.lock:
+            for backend, limit_stats in stats.items():
+                self.gauges["concurrency_limit", backend] = limit_stats["limit"]
+                self.gauges["concurrency_in_flight", backend] = limit_stats["in_flight"]
+                self.gauges["throttled_requests", backend] = limit_stats["throttled"]
+
+    def _inc(self, name: str, backend: str, value: float) -> None:
+        self.counters[name, backend] = self.counters.get((name, backend), 0) + value
+
+    def _observe(self, name: str, backend: str, value: float,
+                 buckets: tuple = DEFAULT_BUCKETS) -> None:
+        if (name, backend) not in self.histograms:
+            self.histograms[name, backend] = Histogram(buckets)
+        self.histograms[name, backend].observe(value)
+
+    def reset(self) -> None:
+        """Removes all the recorded metrics."""
+        with self.lock:
+            self.records.clear()
+            self.counters.clear()
+            self.histograms.clear()
+            self.gauges.clear()
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Returns a summary of the metrics by backend (an empty string for
+        tasks that are not backend calls), with the counters, the gauges and
+        the count, sum and mean of the histograms."""
+        summary: dict[str, dict[str, float]] = {}
+        with self.lock:
+            for (name, backend), value in self.counters.items():
+                summary.setdefault(backend, {})[name] = value
+            for (name, backend), value in self.gauges.items():
+                summary.setdefault(backend, {})[name] = value
+            for (name, backend), histogram in self.histograms.items():
+                metrics = summary.setdefault(backend, {})
+                metrics[f"{name}_count"] = histogram.count
+                metrics[f"{name}_sum"] = histogram.sum
+                metrics[f"{name}_mean"] = histogram.sum / max(histogram.count, 1)
+        return summary
+
+    def to_prometheus(self, prefix: str = "feste_") -> str:
+        """Exports the metrics in the Prometheus text exposition format.
+
+        :param prefix: prefix of the metric names
+        :return: the metrics text
+        """
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted(self.histograms.items())
+        for kind, metrics in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({name for (name, _), _ in metrics}):
+                lines.append(f"# TYPE {prefix}{name} {kind}")
+                for (metric, backend), value in metrics:
+                    if metric == name:
+                        lines.append(f'{prefix}{name}{{backend="{backend}"}} {value}')
+        for name in sorted({name for (name, _), _ in histograms}):
+            lines.append(f"# TYPE {prefix}{name} histogram")
+            for (metric, backend), histogram in histograms:
+                if metric != name:
+                    continue
+                for le, count in histogram.cumulative():
+                    lines.append(f'{prefix}{name}_bucket{{backend="{backend}",'
+                                 f'le="{le}"}} {count}')
+                lines.append(f'{prefix}{name}_sum{{backend="{backend}"}} '
+                             f'{histogram.sum}')
+                lines.append(f'{prefix}{name}_count{{backend="{backend}"}} '
+                             f'{histogram.count}')
+        return "\n".join(lines) + "\n"
@@ -1,12 +1,17 @@
+import inspect
 import operator
 from abc import ABC, abstractmethod
-from typing import Any, Callable
+from collections.abc import Hashable, Mapping
+from typing import Any, Callable, NamedTuple, Optional
 
-from dask.core import istask
+from dask.core import _execute_task, istask, keys_in_tasks, subs
 from dask.delayed import tokenize
+from dask.utils import apply
 from tlz import groupby
 
+from feste import context
 from feste.graph import FesteGraph
+from feste.streaming import task_function
 
 
 def make_getitem_task(object: Any, index: int) -> Any:
@@ -20,6 +25,22 @@ def make_getitem_task(object: Any, index: int) -> Any:
     return (operator.getitem, object, index)
 
 
+def dependency_levels(graph: FesteGraph) -> dict[Hashable, int]:
+    """Computes the dependency level of each key in the graph, which
+    is the length of the longest path from a key without dependencies.
+    Tasks in the same level can't depend on each other.
+
+    :param graph: Feste graph
+    :return: mapping from key to its level
+    """
+    dependencies = graph.get_all_dependencies()
+    levels: dict[Hashable, int] = {}
+    for key in graph.topological_sorter().static_order():
+        levels[key] = max((levels[dep] + 1 for dep in dependencies[key]),
+                          default=0)
+    return levels
+
+
 class Optimization(ABC):
     """Optimization abstract class. This class represents an
     optimization that can be applied on the Feste graph."""
@@ -56,10 +77,14 @@ class Optimizer:
     @classmethod
     def from_backends(cls) -> 'Optimizer':
         """Create the optimizer using all optimizations from classes
-        that are inheriting from the backend FesteBase class."""
+        that are inheriting from the backend FesteBase class. The common
+        subexpression elimination is applied first if it is enabled in
+        the ``optimization.cse`` context."""
         # TODO: Avoid circular imports from task
         from feste.task import FesteBase
-        optimizations = []
+        optimizations: list[Optimization] = []
+        if context.get("optimization.cse"):
+            optimizations.append(CommonSubexpressionElimination())
         subclasses = FesteBase.__subclasses__()
         for subclass in subclasses:
             optimizations.extend(subclass.optimizations())
@@ -67,68 +92,377 @@ class Optimizer:
         return optimizer
 
 
+def estimate_tokens(text: str) -> int:
+    """Rough estimation of the number of tokens of a text, using
+    the rule of thumb of ~4 characters per token for English.
+
+    :param text: the text
+    :return: estimated number of tokens
+    """
+    return len(text) // 4 + 1
+
+
+class BoundCall(NamedTuple):
+    """A backend method call from a task, with its arguments bound to
+    the method signature (including defaults).
+
+    :param function: the method called
+    :param obj: the backend object
+    :param batch_arg: the value of the batched argument (the first
+                      argument after the object)
+    :param other_args: the remaining arguments by name
+    """
+    function: Callable
+    obj: Any
+    batch_arg: Any
+    other_args: dict[str, Any]
+
+    def group_key(self) -> tuple:
+        """Key of the calls that can be batched together: same function,
+        backends with the same batching key (see
+        :meth:`feste.task.FesteBase.batching_key`) and equal parameters."""
+        batching_key = getattr(self.obj, "batching_key", None)
+        obj_key = batching_key() if callable(batching_key) else id(self.obj)
+        return (self.function, obj_key,
+                tokenize(sorted(self.other_args.items()), pure=True))
+
+    def batch_task(self, function: Callable, batch_args: list[Any]) -> tuple:
+        """Build the task calling the batched function with the list of
+        the batched arguments (as the first argument after the object)
+        and the remaining arguments of this call by name.
+
+        :param function: the batched function
+        :param batch_args: list of batched arguments
+        :return: the batched task
+        """
+        if not self.other_args:
+            return (function, self.obj, batch_args)
+        kwargs = [[name, value] for name, value in self.other_args.items()]
+        return (apply, function, [self.obj, batch_args], (dict, kwargs))
+
+
+def bind_task(task: Any) -> Optional[BoundCall]:
+    """Bind a task calling a method to the method signature, supporting
+    tasks with multiple positional and keyword arguments.
+
+    :param task: the task
+    :return: the bound call or None if it is not a method call
+    """
+    if not istask(task):
+        return None
+
+    function, args = task[0], task[1:]
+    kwargs: Any = {}
+    if function is apply:
+        function, args = task[1], task[2]
+        kwargs = task[3] if len(task) > 3 else {}
+        # Keyword arguments are represented as (dict, [[key, value], ...])
+        if istask(kwargs) and kwargs[0] is dict:
+            kwargs = dict(kwargs[1])
+        if not isinstance(args, list) or not isinstance(kwargs, dict):
+            return None
+
+    try:
+        signature = inspect.signature(function)
+        bound = signature.bind(*args, **kwargs)
+    except (TypeError, ValueError):
+        return None
+    bound.apply_defaults()
+
+    parameters = list(signature.parameters.values())
+    if len(parameters) < 2 or \
+            any(p.kind == p.VAR_POSITIONAL for p in parameters):
+        return None
+
+    obj_name, batch_name = parameters[0].name, parameters[1].name
+    if batch_name not in bound.arguments:
+        return None
+    other_args = {}
+    for parameter in parameters[2:]:
+        value = bound.arguments[parameter.name]
+        if parameter.kind == parameter.VAR_KEYWORD:
+            other_args.update(value)
+        else:
+            other_args[parameter.name] = value
+    return BoundCall(function, bound.arguments[obj_name],
+                     bound.arguments[batch_name], other_args)
+
+
 class BatchOptimization(Optimization):
     """This is a static optimization to do batching of calls
     statically. Another optimization is done during scheduling
-    as tasks might get ready before/after.
+    as tasks might get ready before/after (see :meth:`batch_tasks`).
+
+    Batches are split to respect the maximum number of calls and the
+    maximum number of estimated prompt tokens per batch. The limits
+    from the ``batch.max_size`` and ``batch.max_tokens`` context are
+    also applied (the smallest limit is used).
+
+    Calls to the same method are batched together when the backend
+    objects have the same :meth:`feste.task.FesteBase.batching_key`
+    and all the arguments other than the batched one (the first after
+    the object) are equal. These arguments are passed by name to the
+    batched method.
 
     :param rewrite_rules: rule that describes how to change a
                           single call to a batched call for
                           APIs that support it.
+    :param max_batch_size: maximum number of calls in a batch
+    :param max_batch_tokens: maximum number of estimated prompt tokens
+                             in a batch
     """
-    def __init__(self, rewrite_rules: dict[Callable, Callable]) -> None:
+    def __init__(self, rewrite_rules: dict[Callable, Callable],
+                 max_batch_size: Optional[int] = None,
+                 max_batch_tokens: Optional[int] = None) -> None:
         self.rewrite_rules = rewrite_rules
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
 
-    def apply(self, graph: FesteGraph) -> FesteGraph:
-        # Get all tasks from the graph
-        tasks = []
-        for key, task in dict(graph).items():
-            if not istask(task):
-                continue
+    @staticmethod
+    def _limit(value: Optional[int], context_key: str) -> Optional[int]:
+        limits = [v for v in (value, context.get(context_key)) if v is not None]
+        return min(limits, default=None)
 
-            # Add the key as suffix of the task arguments
-            # as we need to keep track of which keys
-            # the task belong to.
-            suffix_task = task + (key,)
-            tasks.append(suffix_task)
-
-        # Group by <function / object>, so we don't call
-        # the batch for different objects (different parameters)
-        # Note: we use here identity instead of equality
-        #       across objects to group them.
-        task_groups = groupby(lambda x: (x[0], x[1]), tasks)
-        new_tasks = {}
+    def split(self, args: list[Any], data: Optional[Mapping] = None) \
+            -> list[list[int]]:
+        """Split a group of calls into batches respecting the size and
+        token limits. Batches are balanced in size so they can be spread
+        evenly across workers. Tokens can only be estimated for arguments that
+        are strings or whose values are already known (in ``data``).
 
-        # Group key = (function, object)
-        # Group task = [(function, object, parameter, key), ...]
-        for group_key, group_tasks in task_groups.items():
-            # Check if batching is possible
-            if len(group_tasks) <= 1:
-                continue
+        :param args: the batched argument of each call
+        :param data: known values of the graph keys
+        :return: list of batches with the indexes of the calls
+        """
+        max_size = self._limit(self.max_batch_size, "batch.max_size")
+        max_tokens = self._limit(self.max_batch_tokens, "batch.max_tokens")
 
-            # Check if the key is in the rewrite rules
-            rewrite_rule_keys = self.rewrite_rules.keys()
-            if group_key[0] not in rewrite_rule_keys:
-                continue
+        num_batches = 1
+        if max_size is not None:
+            num_batches = -(len(args) // -max_size)
+
+        def batch_size(start: int, done: int) -> int:
+            # Size of the next batch so the remaining ones are balanced
+            remaining = len(args) - start
+            return -(remaining // -max(num_batches - done, 1))
+
+        batches: list[list[int]] = [[]]
+        size = batch_size(0, 0)
+        batch_tokens = 0
+        for index, arg in enumerate(args):
+            if data is not None and isinstance(arg, Hashable) and arg in data:
+                arg = data[arg]
+            tokens = estimate_tokens(arg) if isinstance(arg, str) else 0
+            current = batches[-1]
+            full = max_size is not None and len(current) >= size
+            too_long = max_tokens is not None and batch_tokens + tokens > max_tokens
+            if current and (full or too_long):
+                size = batch_size(index, len(batches))
+                batches.append([])
+                batch_tokens = 0
+            batches[-1].append(index)
+            batch_tokens += tokens
+        return batches
+
+    def batch_tasks(self, tasks: Mapping[Any, Any],
+                    data: Optional[Mapping] = None) \
+            -> dict[str, tuple[Any, list[Any]]]:
+        """Group the tasks that can be batched together and build the
+        batched tasks. This is used both statically on the graph and
+        dynamically by the scheduler on the tasks that are ready.
+
+        :param tasks: mapping from key to task
+        :param data: known values of the graph keys, used to estimate
+                     the number of tokens of the batches
+        :return: mapping from the new batch key to a tuple with the
+                 batched task and the list of keys it replaces (in the
+                 same order as the batched results).
+        """
+        # Get all tasks that have a rewrite rule
+        calls = []
+        for key, task in tasks.items():
+            call = self.bind_call(task)
+            if call is not None:
+                calls.append((call, key))
+
+        # Group by <function / backend / parameters>, so we only batch
+        # calls with equal parameters on backends sharing credentials.
+        task_groups = groupby(lambda x: x[0].group_key(), calls)
+        batches = {}
+        for group_calls in task_groups.values():
+            batches.update(self.batch_group(group_calls, data))
+        return batches
+
+    def bind_call(self, task: Any) -> Optional[BoundCall]:
+        """Returns the bound call of a task if it has a rewrite rule.
+
+        :param task: the task
+        :return: the bound call or None if it can't be batched
+        """
+        # Skip binding (the signature inspection) of other functions
+        if task_function(task) not in self.rewrite_rules:
+            return None
+        call = bind_task(task)
+        if call is None or call.function not in self.rewrite_rules:
+            return None
+        return call
 
-            # Build argument list for the task
-            # TODO: need to support more than one arg
-            arg_key_list = [(task[2], task[3]) for task
-                            in group_tasks]
-            unzipped_arg_key_list = zip(*arg_key_list)
-            arg_list, key_order = unzipped_arg_key_list
+    def batch_group(self, group_calls: list[tuple[BoundCall, Any]],
+                    data: Optional[Mapping] = None) \
+            -> dict[str, tuple[Any, list[Any]]]:
+        """Build the batched tasks of a group of calls with the same
+        :meth:`BoundCall.group_key` (see :meth:`batch_tasks`).
+
+        :param group_calls: list of (bound call, key)
+        :param data: known values of the graph keys
+        :return: mapping from the new batch key to a tuple with the
+                 batched task and the list of keys it replaces
+        """
+        # Check if batching is possible
+        if len(group_calls) <= 1:
+            return {}
+
+        # Build argument list for the task
+        first_call = group_calls[0][0]
+        group_args = [call.batch_arg for call, _ in group_calls]
+        group_keys = [key for _, key in group_calls]
+
+        batches = {}
+        for indexes in self.split(group_args, data):
+            if len(indexes) <= 1:
+                continue
+            arg_list = [group_args[i] for i in indexes]
+            key_order = [group_keys[i] for i in indexes]
 
             # New task using rewriting rule
-            new_function = self.rewrite_rules[group_key[0]]
-            new_task = (new_function, group_key[1]) + (list(arg_list),)
+            new_function = self.rewrite_rules[first_call.function]
+            new_task = first_call.batch_task(new_function, arg_list)
             key_name = "fuse-batch-" + tokenize(new_task)
-            new_tasks[key_name] = new_task
+            batches[key_name] = (new_task, key_order)
 
-            # Replace each call to get from the batched
-            # responde call.
-            for index, task in enumerate(group_tasks):
-                new_task = make_getitem_task(key_name, index)
-                graph.update({key_order[index]: new_task})
+        return batches
+
+    def apply(self, graph: FesteGraph) -> FesteGraph:
+        # Tasks are only batched with tasks from the same dependency
+        # level, otherwise a batch could depend on its own results
+        # (e.g. chained completions) or wait on unrelated long chains.
+        # Tasks getting ready at different times are batched
+        # dynamically by the scheduler.
+        levels = dependency_levels(graph)
+        graph_dict = dict(graph)
+        tasks_by_level = groupby(lambda item: levels[item[0]],
+                                 graph_dict.items())
+
+        new_tasks = {}
+        for level_tasks in tasks_by_level.values():
+            # Keys of the graph are resolved to be able to tell apart
+            # prompts (estimated) from keys of pending tasks (unknown).
+            batches = self.batch_tasks(dict(level_tasks), graph_dict)
+            for key_name, (new_task, key_order) in batches.items():
+                new_tasks[key_name] = new_task
+
+                # Replace each call to get from the batched
+                # responde call.
+                for index, key in enumerate(key_order):
+                    getitem_task = make_getitem_task(key_name, index)
+                    graph.update({key: getitem_task})
 
         graph.update(new_tasks)
         return graph
+
+
+def task_structure(expr: Any) -> Hashable:
+    """Returns a hashable representation of the structure of a task,
+    where functions are compared by identity, literals by value and
+    objects by their token (e.g. parameters), or by identity if they
+    can't be tokenized deterministically (e.g. backends).
+
+    :param expr: the task (or task argument)
+    :return: the task structure
+    """
+    if istask(expr):
+        return ("task", id(expr[0])) + tuple(task_structure(e) for e in expr[1:])
+    if isinstance(expr, list):
+        return ("list",) + tuple(task_structure(e) for e in expr)
+    if isinstance(expr, (str, bytes, int, float, bool, type(None))):
+        return (type(expr).__name__, expr)
+    # Objects that can't be tokenized get a random token
+    token = tokenize(expr, pure=True)
+    if token == tokenize(expr, pure=True):
+        return ("token", token)
+    return ("object", id(expr))
+
+
+class CommonSubexpressionElimination(Optimization):
+    """This optimization merges duplicated deterministic calls in the
+    graph, so they are only executed once. Calls are deterministic if
+    their function was marked as pure (``feste_task(pure=True)``) or if
+    the backend declares them as deterministic (see
+    :meth:`feste.task.FesteBase.deterministic_tasks`), e.g. prompt
+    rendering or completions with temperature zero. Dependents are
+    rewired to the remaining call and the duplicated keys become
+    aliases to it.
+    """
+    def __init__(self) -> None:
+        # TODO: Avoid circular imports from task
+        from feste.task import FesteBase
+        self.deterministic: dict[Callable, Optional[Callable]] = {}
+        for subclass in FesteBase.__subclasses__():
+            self.deterministic.update(subclass.deterministic_tasks())
+
+    def is_deterministic(self, task: Any, graph_keys: set) -> bool:
+        """Checks if a task is deterministic.
+
+        :param task: the task
+        :param graph_keys: keys of the graph
+        :return: True if the task is deterministic
+        """
+        from feste.task import is_pure
+        function = task[1] if task[0] is apply else task[0]
+        if is_pure(function):
+            return True
+        if function not in self.deterministic:
+            return False
+        predicate = self.deterministic[function]
+        if predicate is None:
+            return True
+        call = bind_task(task)
+        if call is None:
+            return False
+        # Parameters are only known if they don't depend on other tasks
+        other_args = {}
+        for name, value in call.other_args.items():
+            if keys_in_tasks(graph_keys, [value]):
+                return False
+            other_args[name] = _execute_task(value, {})
+        return bool(predicate(call._replace(other_args=other_args)))
+
+    def apply(self, graph: FesteGraph) -> FesteGraph:
+        graph_keys = set(graph)
+        dependencies = graph.get_all_dependencies()
+        # Duplicated key -> key of the call that remains
+        replaced: dict[Hashable, Hashable] = {}
+        # Task structure -> key of the first call
+        seen: dict[Hashable, Hashable] = {}
+
+        for key in graph.topological_sorter().static_order():
+            task = graph[key]
+            if not istask(task):
+                continue
+
+            # Rewire dependencies to the remaining calls
+            for dep in dependencies[key]:
+                if dep in replaced:
+                    task = subs(task, dep, replaced[dep])
+            graph[key] = task
+
+            if not self.is_deterministic(task, graph_keys):
+                continue
+            structure = task_structure(task)
+            if structure in seen:
+                replaced[key] = seen[structure]
+                graph[key] = seen[structure]
+            else:
+                seen[structure] = key
+
+        return graph
@@ -0,0 +1,161 @@
+import itertools
+import json
+from collections import deque
+from collections.abc import Iterable, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional, TextIO, Union
+
+from feste import context
+from feste.compute import compute
+from feste.scheduler import get_asyncio
+
+
+def read_jsonl(filename: Union[Path, str]) -> Iterator[Any]:
+    """Lazily reads the rows of a JSON Lines file, blank lines are skipped.
+
+    :param filename: the JSON Lines file
+    :return: iterator of the decoded rows
+    """
+    with Path(filename).open("r") as fhandle:
+        for line in fhandle:
+            if line.strip():
+                yield json.loads(line)
+
+
+class JsonlSink:
+    """Writes records incrementally to a JSON Lines file, so the outputs
+    of a pipeline don't need to be kept in memory::
+
+        with JsonlSink("outputs.jsonl") as sink:
+            for row, result in stream_compute(read_jsonl("inputs.jsonl"), build):
+                sink.write({"id": row["id"], "completion": result})
+
+    :param filename: the JSON Lines file
+    :param append: if records should be appended to an existing file
+    :param flush_every: number of records between flushes to disk,
+                        defaults to flushing on close
+    """
+    def __init__(self, filename: Union[Path, str], append: bool = False,
+                 flush_every: Optional[int] = None) -> None:
+        self.filename = str(filename)
+        self.flush_every = flush_every
+        self.count = 0
+        self._fhandle: TextIO = Path(filename).open("a" if append else "w")
+
+    def write(self, record: Any) -> None:
+        """Writes a record as a JSON line.
+
+        :param record: a JSON serializable record
+        """
+        self._fhandle.write(json.dumps(record) + "\n")
+        self.count += 1
+        if self.flush_every and self.count % self.flush_every == 0:
+            self._fhandle.flush()
+
+    def close(self) -> None:
+        """Flushes and closes the file."""
+        self._fhandle.close()
+
+    def __enter__(self) -> 'JsonlSink':
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:  # type: ignore
+        self.close()
+
+
+def iter_windows(rows: Iterable, window_size: int) -> Iterator[list]:
+    """Lazily splits the rows in windows of at most ``window_size`` rows.
+
+    :param rows: the rows
+    :param window_size: maximum number of rows per window
+    :return: iterator of the windows
+    """
+    if window_size < 1:
+        raise ValueError("window_size must be a positive integer")
+    rows = iter(rows)
+    while True:
+        window = list(itertools.islice(rows, window_size))
+        if not window:
+            return
+        yield window
+
+
+def compute_window(collection: Any, num_rows: int, **kwargs: Any) -> list:
+    """Computes the object built for a window and checks that it has one
+    result per row.
+
+    :param collection: the object built for the window
+    :param num_rows: number of rows of the window
+    :return: list with the result of each row
+    """
+    (results,) = compute(collection, **kwargs)
+    results = list(results)
+    if len(results) != num_rows:
+        raise ValueError(f"the pipeline built {len(results)} results "
+                         f"for a window of {num_rows} rows")
+    return results
+
+
+def stream_compute(rows: Iterable, build: Callable[[list], Any],
+                   window_size: Optional[int] = None,
+                   max_windows: Optional[int] = None,
+                   scheduler_fn: Callable = get_asyncio,
+                   **kwargs: Any) -> Iterator[tuple[Any, Any]]:
+    """Computes a pipeline over a large (or unbounded) iterable of rows
+    with bounded memory, yielding the ``(row, result)`` pairs in the
+    order of the rows. The rows are read lazily in windows, and the
+    graph of each window is built with ``build`` (e.g. with
+    :func:`feste.map`) and computed on its own::
+
+        def build(rows):
+            prompts = feste.map(prompt, question=[r["question"] for r in rows])
+            return feste.map(api.complete, prompts)
+
+        for row, completion in stream_compute(read_jsonl("inputs.jsonl"), build):
+            ...
+
+    Up to ``max_windows`` windows are computed concurrently, so a window
+    starts while the slowest calls of the previous one finish. The next
+    window is only read and built when the consumer takes the results of
+    the oldest one, which bounds the memory to ``max_windows`` windows of
+    rows, graphs and results regardless of the number of rows.
+
+    .. note:: The windows are computed in threads, so the multiprocessing
+              scheduler should be given a ``pool`` shared by the windows
+              instead of starting one per window.
+
+    :param rows: the input rows (e.g. :func:`read_jsonl`)
+    :param build: function called with the rows of a window, which
+                  returns an object computed to the list with the result
+                  of each row
+    :param window_size: maximum number of rows per window, defaults to
+                        the ``pipeline.window_size`` context
+    :param max_windows: maximum number of windows being computed, defaults
+                        to the ``pipeline.max_windows`` context
+    :param scheduler_fn: the scheduler (defaults to asyncio scheduler)
+    :param kwargs: extra arguments passed to :func:`feste.compute`
+    :return: iterator of (row, result)
+    """
+    window_size = window_size or context.get("pipeline.window_size")
+    max_windows = max_windows or context.get("pipeline.max_windows")
+    windows = iter_windows(rows, window_size)
+    pending: deque[tuple[Sequence, Future]] = deque()
+    with ThreadPoolExecutor(max_windows) as executor:
+        try:
+            while True:
+                while len(pending) < max_windows:
+                    window = next(windows, None)
+                    if window is None:
+                        break
+                    future = executor.submit(compute_window, build(window),
+                                             len(window), scheduler_fn=scheduler_fn,
+                                             **kwargs)
+                    pending.append((window, future))
+                if not pending:
+                    return
+                oldest, future = pending.popleft()
+                yield from zip(oldest, future.result())
+        finally:
+            for _, future in pending:
+                future.cancel()
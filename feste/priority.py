@@ -0,0 +1,232 @@
+import threading
+import time
+from collections.abc import Hashable, Mapping
+from typing import Any, Callable, Optional
+
+from dask.core import get_dependencies, istask, reverse_dict, toposort
+
+from feste import context
+from feste.optimization import bind_task
+from feste.streaming import task_function
+
+# Scheduling policies
+ORDER = "order"
+CRITICAL_PATH = "critical_path"
+
+
+def remote_tasks_from_backends() -> set[Callable]:
+    """Collect the functions of the tasks calling remote APIs from all
+    classes inheriting from the backend FesteBase class."""
+    # TODO: Avoid circular imports from task
+    from feste.task import FesteBase
+    functions: set[Callable] = set()
+    for subclass in FesteBase.__subclasses__():
+        functions.update(subclass.remote_tasks())
+    return functions
+
+
+def function_name(function: Any) -> str:
+    """Returns the qualified name of a task function."""
+    return f"{getattr(function, '__module__', None)}." \
+           f"{getattr(function, '__qualname__', type(function).__qualname__)}"
+
+
+def _literal_max_tokens(name: str, value: Any) -> Optional[int]:
+    """Returns the ``max_tokens`` given literally by an argument of a
+    call: the argument itself or a field of the parameters (e.g. OpenAI's
+    CompleteParams), None otherwise. Tasks are never executed, only the
+    literal fields of the NamedTuples built by the graph are read."""
+    if name != "max_tokens":
+        fields = getattr(value[0], "_fields", ()) if istask(value) else ()
+        if "max_tokens" in fields and len(value) == len(fields) + 1:
+            value = value[1 + fields.index("max_tokens")]
+        elif istask(value):
+            return None
+        else:
+            value = getattr(value, "max_tokens", None)
+    return value if type(value) is int else None
+
+
+class CostModel:
+    """Estimates the cost in seconds of the tasks of a graph. Backend
+    calls (see :meth:`feste.task.FesteBase.remote_tasks`) start from a
+    prior of a base latency plus a latency per requested token (the literal
+    ``max_tokens`` argument or parameter), other tasks (e.g. prompt rendering) from a
+    small constant. The estimates of each task function are then scaled
+    by the ratio of the observed durations to the priors, as an
+    exponential moving average, so the model learns the latencies of the
+    backends across computations.
+
+    :param backend_latency: prior base latency of a backend call
+    :param token_latency: prior latency per requested token
+    :param default_max_tokens: requested tokens of calls without ``max_tokens``
+    :param task_latency: prior latency of the other tasks
+    :param smoothing: weight of a new observation in the moving average
+    """
+    def __init__(self, backend_latency: float = 1.0, token_latency: float = 0.02,
+                 default_max_tokens: int = 256, task_latency: float = 0.001,
+                 smoothing: float = 0.2) -> None:
+        self.backend_latency = backend_latency
+        self.token_latency = token_latency
+        self.default_max_tokens = default_max_tokens
+        self.task_latency = task_latency
+        self.smoothing = smoothing
+        # Function name -> observed / prior latency ratio
+        self.ratios: dict[str, float] = {}
+        self._backend_functions: Optional[set[Callable]] = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_backend_functions"] = None
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def backend_functions(self) -> set[Callable]:
+        """The task functions calling the remote APIs of the backends."""
+        if self._backend_functions is None:
+            self._backend_functions = remote_tasks_from_backends()
+        return self._backend_functions
+
+    def prior(self, task: Any) -> float:
+        """Returns the prior cost of a task, before any observation.
+
+        :param task: the task
+        """
+        if task_function(task) not in self.backend_functions():
+            return self.task_latency
+        call = bind_task(task)
+        max_tokens = None
+        if call is not None:
+            for name, value in call.other_args.items():
+                max_tokens = _literal_max_tokens(name, value)
+                if max_tokens is not None:
+                    break
+        if max_tokens is None:
+            max_tokens = self.default_max_tokens
+        return self.backend_latency + self.token_latency * max_tokens
+
+    def estimate(self, task: Any, prior: Optional[float] = None) -> float:
+        """Returns the estimated cost in seconds of a task.
+
+        :param task: the task
+        :param prior: the prior cost of the task, if already known
+        """
+        function = task_function(task)
+        if function is None:
+            return 0.0
+        if prior is None:
+            prior = self.prior(task)
+        return prior * self.ratios.get(function_name(function), 1.0)
+
+    def observe(self, task: Any, seconds: float, prior: Optional[float] = None) -> None:
+        """Updates the estimates of the task function with the observed
+        duration of a task.
+
+        :param task: the task
+        :param seconds: the observed duration
+        :param prior: the prior cost of the task, if already known
+        """
+        function = task_function(task)
+        if function is None:
+            return
+        if prior is None:
+            prior = self.prior(task)
+        ratio = seconds / prior
+        name = function_name(function)
+        with self._lock:
+            previous = self.ratios.get(name)
+            self.ratios[name] = ratio if previous is None else \
+                previous + self.smoothing * (ratio - previous)
+
+
+# Cost model shared by the computations of this process
+default_cost_model = CostModel()
+
+
+class CriticalPathPriority:
+    """Latency-aware priority of the tasks of a graph: tasks on the
+    longest remaining path (the sum of the estimated costs of the task
+    and its most expensive chain of dependents) are fired first, and
+    among tasks with the same remaining path, the ones expected to take
+    longer. This minimizes the makespan of deep prompt chains, while
+    :func:`dask.order.order` (the tiebreaker) favours low memory use.
+    Batched tasks get the highest priority of their tasks.
+
+    The duration of the tasks, from firing to finishing, are observed by
+    the cost model to refine the estimates.
+
+    :param dsk: the graph being executed
+    :param keyorder: the Dask order of the keys
+    :param batches: mapping from batch key to the keys it replaces
+    :param cost_model: the cost model, defaults to the one in the
+                       ``scheduler.cost_model`` context
+    """
+    def __init__(self, dsk: Mapping, keyorder: Mapping[Hashable, int],
+                 batches: Optional[Mapping[Hashable, list]] = None,
+                 cost_model: Optional[CostModel] = None) -> None:
+        self.dsk = dsk
+        self.keyorder = keyorder
+        self.batches = batches if batches is not None else {}
+        self.cost_model = cost_model or context.get("scheduler.cost_model") \
+            or default_cost_model
+        self.priors = {key: self.cost_model.prior(task) for key, task in dsk.items()
+                       if task_function(task) is not None}
+        self.costs = {key: self.cost_model.estimate(task, self.priors.get(key))
+                      for key, task in dsk.items()}
+        dependencies = {key: get_dependencies(dsk, key) for key in dsk}
+        dependents = reverse_dict(dependencies)
+        # Longest remaining path of each task, from the last tasks
+        self.ranks: dict[Hashable, float] = {}
+        for key in reversed(toposort(dsk, dependencies=dependencies)):
+            self.ranks[key] = self.costs[key] + max(
+                (self.ranks[dep] for dep in dependents[key]), default=0.0)
+        self._fired: dict[Hashable, float] = {}
+
+    def sortkey(self, key: Hashable) -> tuple:
+        """Sort key of a task, lower keys are fired first."""
+        members = self.batches.get(key)
+        if members is not None:
+            return min(self.sortkey(member) for member in members)
+        return (-self.ranks.get(key, 0.0), -self.costs.get(key, 0.0),
+                self.keyorder.get(key, 0))
+
+    def sort_ready(self, state: dict) -> None:
+        """Sorts the ready list of the scheduler state, which is consumed
+        from the end."""
+        state["ready"].sort(key=self.sortkey, reverse=True)
+
+    def fired(self, key: Hashable) -> None:
+        """Records that a task (or batch) was fired."""
+        self._fired[key] = time.monotonic()
+
+    def finished(self, key: Hashable) -> None:
+        """Observes the duration of a finished task (or batch)."""
+        start = self._fired.pop(key, None)
+        if start is not None:
+            self.cost_model.observe(self.dsk[key], time.monotonic() - start,
+                                    self.priors.get(key))
+
+
+def priority_from_context(dsk: Mapping, keyorder: Mapping[Hashable, int],
+                          batches: Mapping[Hashable, list],
+                          policy: Optional[str] = None) -> Optional[CriticalPathPriority]:
+    """Returns the task priority of the scheduling policy (defaults to
+    the one in the ``scheduler.priority`` context), or None for the
+    Dask order.
+
+    :param dsk: the graph being executed
+    :param keyorder: the Dask order of the keys
+    :param batches: mapping from batch key to the keys it replaces
+    :param policy: ``order`` or ``critical_path``
+    """
+    policy = policy or context.get("scheduler.priority")
+    if policy == ORDER:
+        return None
+    if policy == CRITICAL_PATH:
+        return CriticalPathPriority(dsk, keyorder, batches)
+    raise ValueError(f"unknown scheduling policy: {policy}")
@@ -1,12 +1,17 @@
 import copyreg
+import uuid
 import warnings
 from pathlib import Path
-from typing import Any, Optional, Union
+from typing import Any, Callable, Optional, Union
 
 import iso639
 from cloudpickle import dumps, loads
-from jinja2 import Environment, meta
+from jinja2 import (BytecodeCache, Environment, FileSystemBytecodeCache,
+                    Template, meta)
+from jinja2.utils import LRUCache
 
+from feste import context
+from feste.optimization import BoundCall
 from feste.task import FesteBase, feste_task
 
 
@@ -32,6 +37,59 @@ FESTE_TEMPLATE_GLOBALS: dict[str, Any] = {
 }
 
 
+# Per-process caches of compiled templates and template variables, keyed
+# by (environment token, template). They survive the pickling of prompts
+# to the worker processes as the environment token is pickled with it.
+_compiled_templates = LRUCache(1024)
+_template_variables = LRUCache(1024)
+
+
+def _environment_token(environment: Environment) -> str:
+    """Returns the token that identifies the environment (and its copies)
+    in the template caches."""
+    token = getattr(environment, "_feste_token", None)
+    if token is None:
+        token = uuid.uuid4().hex
+        environment._feste_token = token  # type: ignore[attr-defined]
+    return str(token)
+
+
+def compile_template(environment: Environment, template: str,
+                     name: Optional[str] = None) -> Template:
+    """Compiles a template using the per-process cache of compiled
+    templates. When the environment has a bytecode cache, it is used
+    to avoid compiling the template source as well.
+
+    :param environment: the Jinja2 environment
+    :param template: the template source
+    :param name: optional template name (e.g. the filename)
+    :return: the compiled template
+    """
+    cache_key = (_environment_token(environment), template)
+    compiled = _compiled_templates.get(cache_key)
+    if compiled is not None:
+        return compiled  # type: ignore[no-any-return]
+
+    bytecode_cache = environment.bytecode_cache
+    if bytecode_cache is None:
+        compiled = environment.from_string(template)
+    else:
+        # Same as jinja2.BaseLoader.load, but for a template source
+        name = name or "<prompt>"
+        bucket = bytecode_cache.get_bucket(environment, name, name, template)
+        code = bucket.code
+        if code is None:
+            code = environment.compile(template, name, name)
+            bucket.code = code
+            bytecode_cache.set_bucket(bucket)
+        compiled = environment.template_class.from_code(
+            environment, code, environment.make_globals(None)
+        )
+
+    _compiled_templates[cache_key] = compiled
+    return compiled
+
+
 class LanguageMismatch(UserWarning):
     """Exception when languages are mixed across prompts."""
     pass
@@ -39,9 +97,11 @@ class LanguageMismatch(UserWarning):
 
 class FesteEnvironment(Environment):
     """This is the default Feste environment, it adds Feste's global
-    utilities into the Jinja2 environment.
+    utilities into the Jinja2 environment. The bytecode cache defaults
+    to the one in the ``prompt.bytecode_cache`` context.
     """
     def __init__(self, **kwargs) -> None:  # type: ignore[no-untyped-def]
+        kwargs.setdefault("bytecode_cache", context.get("prompt.bytecode_cache"))
         super().__init__(**kwargs)
         self.add_feste_globals()
 
@@ -66,6 +126,10 @@ class Prompt(FesteBase):
         else:
             self.language_code = language
         self.template = template
+        self.filename: Optional[str] = None
+        # Assign the environment token before the prompt is pickled,
+        # so the copies in the workers share the compiled templates.
+        _environment_token(self.environment)
 
     def __add__(self, other: "Prompt") -> "Prompt":
         """Concatenate two different prompts and check if languages
@@ -83,36 +147,69 @@ class Prompt(FesteBase):
         new_prompt = Prompt(concat_template, self.language, self.environment)
         return new_prompt
 
+    def checkpoint_token(self) -> Any:
+        """Prompts are identified by their template and language."""
+        return (type(self).__qualname__, self.template, str(self.language_code))
+
     @property
     def language(self) -> iso639.Language:
         """Returns the ISO639 language code of the prompt."""
         return self.language_code
 
     @classmethod
-    def from_file(cls, filename: Union[Path, str], **kwargs):  # type: ignore
+    def from_file(cls, filename: Union[Path, str],  # type: ignore
+                  bytecode_cache: Union[BytecodeCache, Path, str, None] = None,
+                  **kwargs):
         """Loads the prompt from a text file.
 
         :param filename: the filename or Python's native Path object.
+        :param bytecode_cache: optional Jinja2 bytecode cache (or a directory
+                               for a file system bytecode cache) to avoid
+                               compiling the template in every process.
+                               Ignored if an environment is provided.
         :param kwargs: extra arguments being passed to the Prompt constructor.
         """
         filename = Path(filename)
         with filename.open("r") as fhandle:
             template = fhandle.read()
-        return cls(template, **kwargs)
+        if bytecode_cache is not None and "environment" not in kwargs:
+            if not isinstance(bytecode_cache, BytecodeCache):
+                bytecode_cache = FileSystemBytecodeCache(str(bytecode_cache))
+            kwargs["environment"] = FesteEnvironment(bytecode_cache=bytecode_cache)
+        prompt = cls(template, **kwargs)
+        prompt.filename = str(filename)
+        return prompt
+
+    def compiled(self) -> Template:
+        """Returns the compiled template (cached per process).
+
+        :returns: the compiled Jinja2 template.
+        """
+        return compile_template(self.environment, self.template, self.filename)
 
     def variables(self) -> set[str]:
         """Return a list of variables present in the template.
 
         :returns: set of variables.
         """
-        parsed_content = self.environment.parse(self.template)
-        tokens = meta.find_undeclared_variables(parsed_content)
-        return tokens
+        cache_key = (_environment_token(self.environment), self.template)
+        tokens = _template_variables.get(cache_key)
+        if tokens is None:
+            parsed_content = self.environment.parse(self.template)
+            tokens = meta.find_undeclared_variables(parsed_content)
+            _template_variables[cache_key] = tokens
+        return set(tokens)
+
+    @classmethod
+    def deterministic_tasks(cls) -> dict[Callable, Optional[Callable[[BoundCall], bool]]]:
+        """Prompt rendering is deterministic."""
+        return {
+            cls.__call__._obj: None,
+        }
 
     @feste_task
     def __call__(self, **kwargs) -> str:  # type: ignore
-        compiled_template = self.environment.from_string(self.template)
-        return compiled_template.render(**kwargs)
+        return self.compiled().render(**kwargs)
 
     def __len__(self) -> int:
         return len(self.template)
@@ -0,0 +1,242 @@
+import threading
+import time
+from collections.abc import Mapping
+from typing import Any, NamedTuple, Optional
+
+from dask.core import _execute_task
+
+from feste.concurrency import AIMDLimit, ConcurrencyController
+from feste.optimization import bind_task, estimate_tokens
+
+
+class TokenBucket:
+    """Token bucket that refills continuously at a rate per minute.
+
+    A request larger than the bucket capacity is allowed when the bucket
+    is full, leaving it in debt, so large requests are never starved.
+
+    :param rate_per_minute: refill rate per minute
+    :param burst_seconds: capacity of the bucket in seconds of refill
+    """
+    def __init__(self, rate_per_minute: float, burst_seconds: float = 10.0) -> None:
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(self.rate * burst_seconds, 1.0)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Time in seconds until the amount can be consumed.
+
+        :param amount: the amount to consume
+        :param now: the current monotonic time
+        """
+        self.refill(now)
+        needed = min(amount, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= amount
+
+
+class RateLimit:
+    """Rate limit of a backend with requests per minute and tokens per
+    minute buckets (e.g. the provider limits of an account).
+
+    :param requests_per_minute: maximum requests per minute
+    :param tokens_per_minute: maximum tokens (prompt and completion) per
+                              minute, estimated from the prompts and the
+                              ``max_tokens`` parameter
+    :param burst_seconds: maximum burst in seconds of the rates
+    """
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 burst_seconds: float = 10.0) -> None:
+        self.requests = None
+        self.tokens = None
+        if requests_per_minute is not None:
+            self.requests = TokenBucket(requests_per_minute, burst_seconds)
+        if tokens_per_minute is not None:
+            self.tokens = TokenBucket(tokens_per_minute, burst_seconds)
+        self.lock = threading.Lock()
+
+    def acquire(self, requests: int = 1, tokens: int = 0) -> float:
+        """Acquires the requests and tokens if they are available.
+
+        :param requests: number of requests
+        :param tokens: number of tokens
+        :return: 0.0 if acquired, otherwise the time in seconds to wait
+        """
+        with self.lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self.requests is not None:
+                wait = max(wait, self.requests.wait_time(requests, now))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.wait_time(tokens, now))
+            if wait > 0.0:
+                return wait
+            if self.requests is not None:
+                self.requests.consume(requests)
+            if self.tokens is not None:
+                self.tokens.consume(tokens)
+            return 0.0
+
+
+def estimate_usage(call_arg: Any, other_args: Mapping[str, Any]) -> int:
+    """Estimates the number of tokens used by a call, from the prompt
+    (or list of prompts) and the ``max_tokens`` parameter.
+
+    :param call_arg: the prompt or list of prompts
+    :param other_args: the other call arguments (e.g. parameters)
+    :return: the estimated number of tokens
+    """
+    prompts = call_arg if isinstance(call_arg, list) else [call_arg]
+    max_tokens = 0
+    for value in other_args.values():
+        value_max_tokens = getattr(value, "max_tokens", None)
+        if isinstance(value_max_tokens, int):
+            max_tokens = value_max_tokens
+    return sum(estimate_tokens(p) + max_tokens
+               for p in prompts if isinstance(p, str))
+
+
+class RateLimiter:
+    """Rate limiter consulted by the schedulers before firing backend
+    tasks. As all tasks are fired by the scheduler process, the limits
+    are shared by all the worker processes.
+
+    .. note:: The retries of a :class:`feste.resilience.RetryPolicy` are
+              made by the workers without acquiring the limits again, so
+              the limits should leave some headroom for them under the
+              provider limits.
+
+    :param limits: mapping from backend class to its rate limit
+    """
+    def __init__(self, limits: Mapping[type, RateLimit]) -> None:
+        self.limits = dict(limits)
+
+    def limit_for(self, obj: Any) -> Optional[RateLimit]:
+        """Returns the rate limit of a backend object (or None).
+
+        :param obj: the backend object
+        """
+        for cls in type(obj).__mro__:
+            if cls in self.limits:
+                return self.limits[cls]
+        return None
+
+    def acquire(self, task: Any, data: Mapping) -> float:
+        """Acquires the rate limit of a task before firing it.
+
+        :param task: the task
+        :param data: results of the task dependencies
+        :return: 0.0 if it can be fired, otherwise the time in seconds
+                 to wait before trying again
+        """
+        limit, tokens = self.task_cost(task, data)
+        if limit is None:
+            return 0.0
+        return limit.acquire(1, tokens)
+
+    def task_cost(self, task: Any, data: Mapping) -> tuple[Optional[RateLimit], int]:
+        """Returns the rate limit of a task and its estimated tokens.
+
+        :param task: the task
+        :param data: results of the task dependencies
+        :return: tuple (rate limit or None if it isn't limited, tokens)
+        """
+        call = bind_task(task)
+        if call is None:
+            return None, 0
+        limit = self.limit_for(call.obj)
+        if limit is None:
+            return None, 0
+        tokens = 0
+        if limit.tokens is not None:
+            call_arg = _execute_task(call.batch_arg, data)
+            other_args = {name: _execute_task(value, data)
+                          for name, value in call.other_args.items()}
+            tokens = estimate_usage(call_arg, other_args)
+        return limit, tokens
+
+
+class TaskCost(NamedTuple):
+    """Limits of a ready task and its estimated tokens, computed once per
+    key by :func:`select_tasks`.
+
+    :param rate_limit: the rate limit of its backend (or None)
+    :param tokens: the estimated tokens
+    :param concurrency_limit: the concurrency limit of its backend (or None)
+    """
+    rate_limit: Optional[RateLimit]
+    tokens: int
+    concurrency_limit: Optional[AIMDLimit]
+
+
+def select_tasks(dsk: Mapping, state: dict, ntasks: int,
+                 rate_limiter: Optional[RateLimiter],
+                 concurrency: Optional[ConcurrencyController] = None,
+                 ) -> tuple[list, float]:
+    """Pops up to ``ntasks`` keys from the ready list that can be fired
+    within the rate limits and the concurrency limits. Keys of throttled
+    tasks (and of backends at their concurrency limit) are kept in the
+    ready list. The limits of each key are only resolved once (kept in
+    the ``task_costs`` of the state), and once a limit is throttled the
+    other keys of the limit are skipped without acquiring it.
+
+    :param dsk: the graph being executed
+    :param state: the scheduler state
+    :param ntasks: maximum number of keys
+    :param rate_limiter: the rate limiter (or None)
+    :param concurrency: the concurrency controller (or None)
+    :return: tuple (keys, time in seconds until a throttled task can
+             be fired or 0.0 if none was throttled)
+    """
+    ready = state["ready"]
+    if rate_limiter is None and concurrency is None:
+        selected = ready[len(ready) - min(ntasks, len(ready)):][::-1]
+        del ready[len(ready) - len(selected):]
+        return selected, 0.0
+    costs = state.setdefault("task_costs", {})
+    # Limits found throttled (with the time to wait for rate limits)
+    throttled: dict[int, float] = {}
+    selected = []
+    wait = 0.0
+    index = len(ready) - 1
+    while index >= 0 and len(selected) < ntasks:
+        key = ready[index]
+        index -= 1
+        cost = costs.get(key)
+        if cost is None:
+            rate_limit, tokens = rate_limiter.task_cost(dsk[key], state["cache"]) \
+                if rate_limiter is not None else (None, 0)
+            concurrency_limit = concurrency.task_limit(dsk[key]) \
+                if concurrency is not None else None
+            cost = costs[key] = TaskCost(rate_limit, tokens, concurrency_limit)
+        if id(cost.rate_limit) in throttled or id(cost.concurrency_limit) in throttled:
+            continue
+        if concurrency is not None and \
+                not concurrency.acquire_limit(key, cost.concurrency_limit):
+            # Fired when a request of the backend finishes
+            throttled[id(cost.concurrency_limit)] = 0.0
+            continue
+        task_wait = 0.0
+        if cost.rate_limit is not None:
+            task_wait = cost.rate_limit.acquire(1, cost.tokens)
+        if task_wait > 0.0:
+            if concurrency is not None:
+                concurrency.cancel(key)
+            throttled[id(cost.rate_limit)] = task_wait
+            wait = min(wait, task_wait) if wait else task_wait
+            continue
+        del ready[index + 1]
+        del costs[key]
+        selected.append(key)
+    return selected, wait
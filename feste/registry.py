@@ -0,0 +1,128 @@
+import io
+import pickle
+from typing import Any, Optional
+
+import cloudpickle
+from dask.core import istask
+
+
+class RegistryPickler(cloudpickle.Pickler):
+    """Cloudpickle pickler that replaces the registered objects by
+    their tokens."""
+    def __init__(self, file: io.BytesIO, registry: 'ObjectRegistry') -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.registry = registry
+
+    def persistent_id(self, obj: Any) -> Optional[str]:
+        return self.registry._tokens.get(id(obj))
+
+
+class RegistryUnpickler(pickle.Unpickler):
+    """Unpickler that resolves the tokens to the registered objects."""
+    def __init__(self, file: io.BytesIO, registry: 'ObjectRegistry') -> None:
+        super().__init__(file)
+        self.registry = registry
+
+    def persistent_load(self, token: str) -> Any:
+        return self.registry.objects[token]
+
+
+class ObjectRegistry:
+    """Registry of long-lived objects referenced by the graph (e.g. the
+    backend clients and prompts). The registry is shipped once to each
+    worker process when the pool starts, and the task payloads then
+    reference the registered objects by token instead of pickling them
+    for every task.
+    """
+    def __init__(self) -> None:
+        self.objects: dict[str, Any] = {}
+        self._tokens: dict[int, str] = {}
+
+    def register(self, obj: Any) -> str:
+        """Registers an object, returning its token.
+
+        :param obj: the object
+        """
+        token = self._tokens.get(id(obj))
+        if token is None:
+            token = f"{type(obj).__name__}-{len(self.objects)}"
+            self._tokens[id(obj)] = token
+            self.objects[token] = obj
+        return token
+
+    def register_graph(self, dsk: dict, types: tuple[type, ...]) -> int:
+        """Registers the objects of the given types found in the tasks
+        of a graph.
+
+        :param dsk: the graph
+        :param types: types of the objects to register
+        :return: number of objects registered
+        """
+        stack = list(dsk.values())
+        while stack:
+            value = stack.pop()
+            if isinstance(value, types):
+                self.register(value)
+            elif istask(value) or isinstance(value, (list, tuple)):
+                stack.extend(value)
+            elif isinstance(value, dict):
+                stack.extend(value.values())
+        return len(self.objects)
+
+    def __len__(self) -> int:
+        return len(self.objects)
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {"objects": self.objects}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.objects = state["objects"]
+        self._tokens = {id(obj): token for token, obj in self.objects.items()}
+
+    def dumps(self, obj: Any) -> bytes:
+        """Serializes an object with cloudpickle, with the registered
+        objects replaced by their tokens."""
+        buffer = io.BytesIO()
+        RegistryPickler(buffer, self).dump(obj)
+        return buffer.getvalue()
+
+    def loads(self, data: bytes) -> Any:
+        """Deserializes an object serialized by :meth:`dumps`, resolving
+        the tokens to the registered objects."""
+        return RegistryUnpickler(io.BytesIO(data), self).load()
+
+
+# Registry of the current process, installed in the parent process for
+# the duration of a computation and in the workers when they start
+_registry = ObjectRegistry()
+
+
+def initialize_worker(data: bytes, user_initializer: Optional[Any] = None) -> None:
+    """Worker process initializer that installs the registry.
+
+    :param data: the registry pickled with cloudpickle
+    :param user_initializer: optional initializer to run afterwards
+    """
+    global _registry
+    _registry = pickle.loads(data)
+    if user_initializer is not None:
+        user_initializer()
+
+
+def set_registry(registry: ObjectRegistry) -> ObjectRegistry:
+    """Sets the registry of the current process, returning the previous
+    one."""
+    global _registry
+    previous = _registry
+    _registry = registry
+    return previous
+
+
+def registry_dumps(obj: Any) -> bytes:
+    """Serializes an object using the registry of the current process."""
+    return _registry.dumps(obj)
+
+
+def registry_loads(data: bytes) -> Any:
+    """Deserializes an object using the registry of the current process."""
+    return _registry.loads(data)
@@ -0,0 +1,264 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import random
+import time
+from collections import deque
+from functools import partial
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+
+from dask.utils import apply
+
+from feste.optimization import bind_task
+
+# Exceptions that are always considered transient
+TRANSIENT_ERRORS: tuple[type[BaseException], ...] = (TimeoutError,)
+
+
+class RetryPolicy(NamedTuple):
+    """Resilience policy for backend tasks, set in the
+    ``scheduler.retry_policy`` context.
+
+    :param max_retries: maximum number of retries of transient errors
+    :param base_delay: base delay in seconds of the exponential backoff
+    :param max_delay: maximum delay in seconds between retries
+    :param timeout: timeout in seconds of each call (None to disable)
+    :param hedge: if a duplicate request should be fired when a call
+                  takes longer than the ``hedge_quantile`` of the
+                  latencies observed for the task, taking the first answer
+    :param hedge_quantile: quantile of the latencies used for hedging
+    :param hedge_min_samples: minimum number of latencies observed
+                              before hedging
+    """
+    max_retries: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    timeout: Optional[float] = None
+    hedge: bool = False
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+
+    def backoff(self, attempt: int) -> float:
+        """Jittered exponential backoff delay (full jitter) of a retry.
+
+        :param attempt: the number of the attempt that failed, from 0
+        :return: the delay in seconds
+        """
+        return random.uniform(0.0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class LatencyTracker:
+    """Tracks the latencies of the successful calls of each task function
+    in the current process, used to decide when to hedge.
+
+    :param max_samples: number of most recent latencies kept per function
+    """
+    def __init__(self, max_samples: int = 1000) -> None:
+        self.max_samples = max_samples
+        self.latencies: dict[str, deque] = {}
+
+    def observe(self, name: str, latency: float) -> None:
+        if name not in self.latencies:
+            self.latencies[name] = deque(maxlen=self.max_samples)
+        self.latencies[name].append(latency)
+
+    def quantile(self, name: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """Returns the latency quantile of a function, or None if there
+        are not enough samples.
+
+        :param name: the function name
+        :param q: the quantile (e.g. 0.95)
+        :param min_samples: minimum number of samples
+        """
+        samples = self.latencies.get(name)
+        if not samples or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        return float(ordered[min(int(q * len(ordered)), len(ordered) - 1)])
+
+
+latency_tracker = LatencyTracker()
+
+# Errors retried by the calls of the current context, when recorded (see
+# :func:`feste.concurrency.call_with_feedback`)
+retried_errors: contextvars.ContextVar[Optional[list[BaseException]]] = \
+    contextvars.ContextVar("retried_errors", default=None)
+
+
+def _record_retry(exc: BaseException) -> None:
+    errors = retried_errors.get()
+    if errors is not None:
+        errors.append(exc)
+
+
+def _function_name(func: Callable) -> str:
+    return f"{getattr(func, '__module__', '')}.{getattr(func, '__qualname__', func)}"
+
+
+def _hedge_delay(policy: RetryPolicy, name: str) -> Optional[float]:
+    if not policy.hedge:
+        return None
+    return latency_tracker.quantile(name, policy.hedge_quantile,
+                                    policy.hedge_min_samples)
+
+
+# Threads used to run the calls with timeouts or hedging
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+
+def _get_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(
+            thread_name_prefix="feste-resilience")
+    return _executor
+
+
+def _call_once(policy: RetryPolicy, name: str, func: Callable,
+               args: tuple, kwargs: dict) -> Any:
+    """Runs a single attempt of a call with timeout and hedging. Calls
+    that time out are abandoned in their thread."""
+    hedge_delay = _hedge_delay(policy, name)
+    if policy.timeout is None and hedge_delay is None:
+        return func(*args, **kwargs)
+
+    def submit() -> concurrent.futures.Future:
+        # The calls run in the context of the caller (e.g. stream sink)
+        context = contextvars.copy_context()
+        return _get_executor().submit(context.run, func, *args, **kwargs)
+
+    deadline = None if policy.timeout is None else time.monotonic() + policy.timeout
+    futures = [submit()]
+    if hedge_delay is not None:
+        wait = hedge_delay
+        if policy.timeout is not None:
+            wait = min(hedge_delay, policy.timeout)
+        done, _ = concurrent.futures.wait(futures, timeout=wait)
+        if not done:
+            futures.append(submit())
+    remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+    done, _ = concurrent.futures.wait(futures, timeout=remaining,
+                                      return_when=concurrent.futures.FIRST_COMPLETED)
+    if not done:
+        raise TimeoutError(f"Call to {name} timed out after {policy.timeout}s.")
+    return done.pop().result()
+
+
+def call_with_retries(policy: RetryPolicy,
+                      transient_errors: tuple[type[BaseException], ...],
+                      func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """Calls a function with retries of transient errors, timeouts and
+    hedging as configured in the policy.
+
+    :param policy: the retry policy
+    :param transient_errors: exceptions that should be retried
+    :param func: the function to call
+    :return: the function result
+    """
+    name = _function_name(func)
+    errors = TRANSIENT_ERRORS + transient_errors
+    attempt = 0
+    while True:
+        start = time.monotonic()
+        try:
+            result = _call_once(policy, name, func, args, kwargs)
+        except errors as exc:
+            if attempt >= policy.max_retries:
+                raise
+            _record_retry(exc)
+            time.sleep(policy.backoff(attempt))
+            attempt += 1
+            continue
+        latency_tracker.observe(name, time.monotonic() - start)
+        return result
+
+
+async def _acall_once(policy: RetryPolicy, name: str,
+                      coroutine_fn: Callable[..., Awaitable],
+                      args: tuple, kwargs: dict) -> Any:
+    hedge_delay = _hedge_delay(policy, name)
+    tasks = [asyncio.ensure_future(coroutine_fn(*args, **kwargs))]
+    deadline = None if policy.timeout is None else time.monotonic() + policy.timeout
+    try:
+        if hedge_delay is not None:
+            wait = hedge_delay
+            if policy.timeout is not None:
+                wait = min(hedge_delay, policy.timeout)
+            done, _ = await asyncio.wait(tasks, timeout=wait)
+            if not done:
+                tasks.append(asyncio.ensure_future(coroutine_fn(*args, **kwargs)))
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+        done, _ = await asyncio.wait(tasks, timeout=remaining,
+                                     return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            raise TimeoutError(f"Call to {name} timed out after {policy.timeout}s.")
+        return done.pop().result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def acall_with_retries(policy: RetryPolicy,
+                             transient_errors: tuple[type[BaseException], ...],
+                             coroutine_fn: Callable[..., Awaitable],
+                             *args: Any, **kwargs: Any) -> Any:
+    """Coroutine variant of :func:`call_with_retries`, timed out and
+    hedged calls are cancelled.
+
+    :param policy: the retry policy
+    :param transient_errors: exceptions that should be retried
+    :param coroutine_fn: the coroutine function to call
+    :return: the coroutine result
+    """
+    name = _function_name(coroutine_fn)
+    errors = TRANSIENT_ERRORS + transient_errors
+    attempt = 0
+    while True:
+        start = time.monotonic()
+        try:
+            result = await _acall_once(policy, name, coroutine_fn, args, kwargs)
+        except errors as exc:
+            if attempt >= policy.max_retries:
+                raise
+            _record_retry(exc)
+            await asyncio.sleep(policy.backoff(attempt))
+            attempt += 1
+            continue
+        latency_tracker.observe(name, time.monotonic() - start)
+        return result
+
+
+def transient_errors_of(obj: Any) -> tuple[type[BaseException], ...]:
+    """Returns the transient errors of a backend object, or an empty
+    tuple if it isn't a backend with transient errors.
+
+    :param obj: the object bound to the task call
+    """
+    # TODO: Avoid circular imports from task
+    from feste.task import FesteBase
+    if not isinstance(obj, FesteBase):
+        return ()
+    return tuple(obj.transient_errors())
+
+
+def resilient_task(task: Any, policy: Optional[RetryPolicy]) -> Any:
+    """Wraps the call of a backend task with :func:`call_with_retries`,
+    keeping the task arguments so they are still resolved by Dask.
+    Tasks of backends without transient errors are returned unchanged.
+
+    :param task: the task
+    :param policy: the retry policy (None to disable)
+    :return: the wrapped task
+    """
+    if policy is None:
+        return task
+    call = bind_task(task)
+    if call is None:
+        return task
+    transient_errors = transient_errors_of(call.obj)
+    if not transient_errors:
+        return task
+    wrapper = partial(call_with_retries, policy, transient_errors, call.function)
+    if task[0] is apply:
+        return (apply, wrapper) + task[2:]
+    return (wrapper,) + task[1:]
@@ -4,18 +4,25 @@
 
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import inspect
 import multiprocessing
 import multiprocessing.pool
 import os
-from collections.abc import Hashable, Mapping, Sequence
-from concurrent.futures import ProcessPoolExecutor
+import sys
+import time
+from collections import deque
+from collections.abc import Awaitable, Hashable, Iterator, Mapping, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor
 from functools import partial
-from queue import Queue
+from queue import Empty, Queue
+from typing import Any, Callable
 from warnings import warn
 
 from dask import config
 from dask.callbacks import local_callbacks, unpack_callbacks
-from dask.core import _execute_task, flatten, get_dependencies
+from dask.core import _execute_task, flatten, get_dependencies, istask
 from dask.local import (MultiprocessingPoolExecutor, batch_execute_tasks,
                         default_get_id, default_pack_exception, finish_task,
                         identity, nested_get, queue_get, start_state_from_dask)
@@ -25,59 +32,436 @@ from dask.multiprocessing import (_dumps, _loads, _process_get_id, get_context,
 from dask.optimization import cull, fuse
 from dask.order import order
 from dask.system import CPU_COUNT
-from dask.utils import ensure_dict
+from dask.utils import apply, ensure_dict
 
 from feste import context
+from feste.cache import (ResponseCache, cacheable_tasks_from_backends,
+                         lookup_responses, store_response)
+from feste.cassette import Cassette, cassette_task
+from feste.checkpoint import save_result
+from feste.concurrency import feedback_awaitable, feedback_task
+from feste.instrumentation import DispatchInfo
+from feste.optimization import BatchOptimization, Optimizer
+from feste.priority import CriticalPathPriority, priority_from_context
+from feste.ratelimit import RateLimiter, select_tasks
+from feste.registry import (ObjectRegistry, initialize_worker, registry_dumps,
+                            registry_loads, set_registry)
+from feste.resilience import (RetryPolicy, acall_with_retries,
+                              call_with_retries, resilient_task,
+                              transient_errors_of)
+from feste.streaming import (StreamConsumer, queue_sink, stream_to,
+                             streaming_task, streaming_tasks_from_backends,
+                             task_function)
 
 
-def get_async(submit, num_workers, dsk, result, cache=None,  # type: ignore
-              get_id=default_get_id, rerun_exceptions_locally=None,
-              pack_exception=default_pack_exception, raise_exception=reraise,
-              callbacks=None, dumps=identity, loads=identity, chunksize=None,
-              **kwargs):
-    """This is mostly Dask's get_async with changes to introduce optimization
-    during execution, with batching being an example."""
-    chunksize = chunksize or context.get("multiprocessing.chunk_size")
+def batch_optimizations_from_backends() -> list[BatchOptimization]:
+    """Returns the batch optimizations from all backends to be used for
+    dynamic batching, or an empty list if dynamic batching is disabled
+    in the ``scheduler.dynamic_batching`` context."""
+    if not context.get("scheduler.dynamic_batching"):
+        return []
+    optimizer = Optimizer.from_backends()
+    return [optim for optim in optimizer.optimizations
+            if isinstance(optim, BatchOptimization)]
 
-    queue: Queue = Queue()
 
-    if isinstance(result, list):
-        result_flat = set(flatten(result))
-    else:
-        result_flat = {result}
-    results = set(result_flat)
+def batch_ready(dsk: dict, state: dict, batches: dict[Hashable, list[Hashable]],
+                batch_optimizations: Sequence[BatchOptimization]) -> None:
+    """Dynamic batching of the tasks that are ready. Tasks that can be
+    batched together are replaced in the ready list by a single batched
+    task (at the position of its highest priority task), which is also
+    added to the graph.
 
-    dsk = dict(dsk)
-    with local_callbacks(callbacks) as callbacks:
-        _, _, pretask_cbs, posttask_cbs, _ = unpack_callbacks(callbacks)
-        started_cbs = []
-        succeeded = False
+    The tasks are only bound once, as they become ready (the ``new_ready``
+    keys of the state), and kept in the ``batch_groups`` of the state
+    by group of calls that can be batched together. Only the groups with
+    new tasks are batched again.
+
+    :param dsk: the graph being executed
+    :param state: the scheduler state
+    :param batches: mapping from batch key to the keys it replaces,
+                    updated with the new batches
+    :param batch_optimizations: batch optimizations to use
+    """
+    new_ready = state.get("new_ready", [])
+    state["new_ready"] = []
+    if not batch_optimizations or not new_ready:
+        return
+
+    def pending(key: Hashable) -> bool:
+        # Fired, or finished from the response cache, since it was ready
+        return key not in state["running"] and key not in state["finished"]
+
+    # (optimization index, group key) -> ready calls of the group by key
+    groups = state.setdefault("batch_groups", {})
+    changed: dict[tuple, None] = {}
+    for key in new_ready:
+        if not pending(key):
+            continue
+        for index, optim in enumerate(batch_optimizations):
+            call = optim.bind_call(dsk[key])
+            if call is not None:
+                group = (index, call.group_key())
+                groups.setdefault(group, {})[key] = call
+                changed[group] = None
+                break
+
+    batched: dict[Hashable, Hashable] = {}
+    for group in changed:
+        calls = groups[group]
+        for key in [key for key in calls if not pending(key)]:
+            del calls[key]
+        optim = batch_optimizations[group[0]]
+        new_batches = optim.batch_group([(call, key) for key, call in calls.items()],
+                                        state["cache"])
+        for name, (batch_task, keys) in new_batches.items():
+            dsk[name] = batch_task
+            batches[name] = keys
+            for key in keys:
+                batched[key] = name
+                del calls[key]
+        if not calls:
+            del groups[group]
+
+    if not batched:
+        return
+
+    # The ready list is consumed from the end (highest priority first)
+    ready: list[Hashable] = []
+    added: set[Hashable] = set()
+    for key in reversed(state["ready"]):
+        batch_key = batched.get(key)
+        if batch_key is None:
+            ready.append(key)
+        elif batch_key not in added:
+            ready.append(batch_key)
+            added.add(batch_key)
+    state["ready"] = ready[::-1]
+
+
+def rate_limiter_from_context() -> RateLimiter | None:
+    """Returns the rate limiter for the backend rate limits in the
+    ``scheduler.rate_limits`` context, or None if there are no limits."""
+    rate_limits = context.get("scheduler.rate_limits")
+    if not rate_limits:
+        return None
+    return RateLimiter(rate_limits)
+
+
+def serve_cached_responses(dsk: dict, state: dict, response_cache: ResponseCache,
+                           cacheable: set[Callable],
+                           cache_keys: dict[Hashable, str | None],
+                           finish: Callable[[Hashable, Any, Any], None]) -> None:
+    """Finish the ready tasks whose responses are in the response cache,
+    repeating while finishing them makes new cached tasks ready.
+
+    :param dsk: the graph being executed
+    :param state: the scheduler state
+    :param response_cache: the response cache
+    :param cacheable: functions that can be cached
+    :param cache_keys: mapping from key to cache key, updated in place
+    :param finish: function to finish a task with its result
+    """
+    while True:
+        found = lookup_responses(dsk, state, response_cache, cacheable, cache_keys)
+        if not found:
+            break
+        for key, response in found:
+            finish(key, response, None)
+
+
+def unbatch(key: Hashable, result: Any, state: dict,
+            batches: dict[Hashable, list[Hashable]]) -> list[tuple[Hashable, Any]]:
+    """Returns the list of (key, result) of a finished task. Results
+    of a dynamically batched task are fanned out to the keys it replaced,
+    which are then marked as running so they can be finished.
+
+    :param key: the finished key
+    :param result: the result of the task
+    :param state: the scheduler state
+    :param batches: mapping from batch key to the keys it replaces
+    :return: list of (key, result)
+    """
+    if key not in batches:
+        return [(key, result)]
+    keys = batches.pop(key)
+    if len(keys) != len(result):
+        raise ValueError(f"Batched task {key} returned {len(result)} "
+                         f"results for {len(keys)} tasks.")
+    state["running"].remove(key)
+    state["running"].update(keys)
+    return list(zip(keys, result))
+
+
+class Execution:
+    """The ready/running/finished state machine of the execution of a
+    graph, shared by :func:`iter_async` and :func:`aget`, which only
+    differ in how the fired tasks are executed. The ready tasks are
+    served from the response cache, sorted by priority and batched
+    dynamically, then fired within the rate and concurrency limits.
+
+    The options default to the ``scheduler.*`` context (see
+    :func:`iter_async`).
+
+    :param dsk: the graph to execute
+    :param result: the keys to compute
+    :param callbacks: the Dask callbacks
+    """
+    def __init__(self, dsk: Mapping, result: Any, callbacks: Any,  # type: ignore
+                 batch_optimizations=None, response_cache=None, rate_limiter=None,
+                 retry_policy=None, stream_callback=None, cassette=None,
+                 checkpoint=None, policy=None, concurrency=None) -> None:
+        if batch_optimizations is None:
+            batch_optimizations = batch_optimizations_from_backends()
+        self.batch_optimizations = batch_optimizations
+        self.response_cache = response_cache or context.get("scheduler.response_cache")
+        self.rate_limiter = rate_limiter or rate_limiter_from_context()
+        self.retry_policy = retry_policy or context.get("scheduler.retry_policy")
+        self.stream_callback = stream_callback or context.get("scheduler.stream_callback")
+        self.cassette = cassette or context.get("scheduler.cassette")
+        if self.cassette is not None:
+            self.cassette.load_backends()
+        if checkpoint is None:
+            checkpoint = context.get("scheduler.checkpoint")
+        self.checkpoint = checkpoint
+        if concurrency is None:
+            concurrency = context.get("scheduler.concurrency")
+        self.concurrency = concurrency
+        self.policy = policy
+        self.cacheable = cacheable_tasks_from_backends()
+        self.streaming = streaming_tasks_from_backends()
+
+        if isinstance(result, list):
+            self.result_flat = set(flatten(result))
+        else:
+            self.result_flat = {result}
+        self.results = set(self.result_flat)
+
+        self.dsk = dict(dsk)
+        self.checkpoint_names: dict[Hashable, str] = {}
+        if checkpoint is not None:
+            self.dsk, self.checkpoint_names = checkpoint.restore(self.dsk,
+                                                                 self.result_flat)
+
+        self.callbacks = callbacks
+        _, _, self.pretask_cbs, self.posttask_cbs, _ = unpack_callbacks(callbacks)
+        self.started_cbs: list = []
         # if start_state_from_dask fails, we will have something
         # to pass to the final block.
-        state = {}
-        try:
-            for cb in callbacks:
-                if cb[0]:
-                    cb[0](dsk)
-                started_cbs.append(cb)
+        self.state: dict = {}
+        # Batch key -> keys replaced by the batch
+        self.batches: dict[Hashable, list[Hashable]] = {}
+        # Key -> response cache key
+        self.cache_keys: dict[Hashable, str | None] = {}
+        # Requested keys (and results) finished but not yielded yet
+        self.finished: deque[tuple[Hashable, Any]] = deque()
+        self.priority: CriticalPathPriority | None = None
+        self.sortkey: Callable[[Hashable], Any] | None = None
+
+    def start(self, cache: dict | None = None) -> None:
+        """Calls the start callbacks and builds the scheduler state.
+
+        :param cache: optional initial cache of results
+        """
+        for cb in self.callbacks:
+            if cb[0]:
+                cb[0](self.dsk)
+            self.started_cbs.append(cb)
+
+        keyorder = order(self.dsk)
+        self.priority = priority_from_context(self.dsk, keyorder, self.batches,
+                                              self.policy)
+        self.sortkey = self.priority.sortkey if self.priority is not None \
+            else keyorder.get
+
+        state = self.state = start_state_from_dask(self.dsk, cache=cache,
+                                                   sortkey=self.sortkey)
+        # Key -> DispatchInfo of the task when it was fired
+        state["dispatch"] = {}
+        state["concurrency"] = self.concurrency
+        # Keys that became ready since the last dynamic batching
+        state["new_ready"] = list(state["ready"])
+
+        for _, start_state, _, _, _ in self.callbacks:
+            if start_state:
+                start_state(self.dsk, state)
+
+        if state["waiting"] and not state["ready"]:
+            raise ValueError("Found no accessible jobs in dask")
+
+        self.finished.extend((key, state["cache"][key]) for key in self.result_flat
+                             if key in state["cache"])
+
+    def pending(self) -> bool:
+        """Returns True while there are tasks left to execute."""
+        return bool(self.state["waiting"] or self.state["ready"]
+                    or self.state["running"])
+
+    def prepare_ready(self) -> None:
+        """Finishes the ready tasks found in the response cache, then sorts
+        and batches the remaining ones."""
+        if self.response_cache is not None:
+            serve_cached_responses(self.dsk, self.state, self.response_cache,
+                                   self.cacheable, self.cache_keys, self.finish_key)
+        if self.priority is not None:
+            self.priority.sort_ready(self.state)
+        batch_ready(self.dsk, self.state, self.batches, self.batch_optimizations)
+
+    def fire(self, ntasks: int) -> tuple[list[Hashable], float]:
+        """Marks up to ``ntasks`` ready tasks (most recently added) that are
+        within the limits as running, calling the pretask callbacks.
+
+        :param ntasks: maximum number of tasks
+        :return: tuple (keys, time in seconds until a throttled task can
+                 be fired or 0.0 if none was throttled)
+        """
+        keys, throttle_wait = select_tasks(self.dsk, self.state, ntasks,
+                                           self.rate_limiter, self.concurrency)
+        for key in keys:
+            if self.priority is not None:
+                self.priority.fired(key)
+            self.state["running"].add(key)
+            for task_key in self.batches.get(key, [key]):
+                for f in self.pretask_cbs:
+                    f(task_key, self.dsk, self.state)
+        return keys, throttle_wait
 
-            keyorder = order(dsk)
+    def task_data(self, key: Hashable) -> dict[Hashable, Any]:
+        """Returns the results of the dependencies of a task."""
+        return {dep: self.state["cache"][dep] for dep in get_dependencies(self.dsk, key)}
 
-            state = start_state_from_dask(dsk, cache=cache, sortkey=keyorder.get)
+    def is_streaming(self, key: Hashable) -> bool:
+        """Returns True if the partial outputs of a task are streamed."""
+        return self.stream_callback is not None and \
+            task_function(self.dsk[key]) in self.streaming
 
-            for _, start_state, _, _, _ in callbacks:
-                if start_state:
-                    start_state(dsk, state)
+    def record_dispatch(self, key: Hashable, payload: Any = None,
+                        serialize_time: float = 0.0) -> None:
+        """Records the dispatch of a task for the callbacks.
+
+        :param key: the fired key
+        :param payload: the serialized payload (if serialized)
+        :param serialize_time: time in seconds spent serializing it
+        """
+        members = self.batches.get(key, [key])
+        payload_bytes = None
+        if isinstance(payload, (bytes, bytearray)):
+            payload_bytes = len(payload)
+        info = DispatchInfo(key, len(members), payload_bytes, serialize_time)
+        for task_key in members:
+            self.state["dispatch"][task_key] = info
+
+    def finish_key(self, key: Hashable, res: Any, worker_id: Any) -> None:
+        """Finishes a task (or the tasks of a batch) with its result.
+
+        :param key: the finished key
+        :param res: the result of the task
+        :param worker_id: the id of the worker that computed it
+        """
+        state = self.state
+        if self.concurrency is not None:
+            res = self.concurrency.release(key, res)
+        if self.priority is not None:
+            self.priority.finished(key)
+        for task_key, task_res in unbatch(key, res, state, self.batches):
+            store_response(task_key, task_res, self.response_cache, self.cache_keys)
+            save_result(task_key, task_res, self.checkpoint, self.checkpoint_names)
+            state["cache"][task_key] = task_res
+            nready = len(state["ready"])
+            finish_task(self.dsk, task_key, state, self.results, self.sortkey)
+            state["new_ready"].extend(state["ready"][nready:])
+            for f in self.posttask_cbs:
+                f(task_key, task_res, self.dsk, state, worker_id)
+            if task_key in self.result_flat:
+                self.finished.append((task_key, task_res))
+
+    def fail(self, key: Hashable, error: BaseException) -> None:
+        """Releases the limits of a failed task.
+
+        :param key: the failed key
+        :param error: the error raised by the task
+        """
+        if self.concurrency is not None:
+            self.concurrency.fail(key, error)
+
+    def close(self, succeeded: bool) -> None:
+        """Releases the limits of the tasks still running and calls the
+        finish callbacks.
+
+        :param succeeded: if all the tasks were executed
+        """
+        if self.concurrency is not None:
+            for key in self.state.get("running", ()):
+                self.concurrency.cancel(key)
+        for _, _, _, _, finish in self.started_cbs:
+            if finish:
+                finish(self.dsk, self.state, not succeeded)
+
+
+def iter_async(submit, num_workers, dsk, result, cache=None,  # type: ignore
+               get_id=default_get_id, rerun_exceptions_locally=None,
+               pack_exception=default_pack_exception, raise_exception=reraise,
+               callbacks=None, dumps=identity, loads=identity, chunksize=None,
+               batch_optimizations=None, response_cache=None, rate_limiter=None,
+               retry_policy=None, stream_callback=None, stream_queue=None,
+               cassette=None, checkpoint=None, policy=None, concurrency=None,
+               **kwargs):
+    """This is mostly Dask's get_async with changes to introduce optimization
+    during execution, with batching being an example. It is a generator that
+    yields the ``(key, result)`` of the requested keys as each one finishes.
+
+    :param batch_optimizations: dynamic batching, defaults to the backends ones
+    :param response_cache: defaults to ``scheduler.response_cache``
+    :param rate_limiter: defaults to ``scheduler.rate_limits``
+    :param retry_policy: defaults to ``scheduler.retry_policy``
+    :param stream_callback: defaults to ``scheduler.stream_callback``
+    :param stream_queue: queue of the partial outputs of other processes
+    :param cassette: defaults to ``scheduler.cassette``
+    :param checkpoint: defaults to ``scheduler.checkpoint``
+    :param policy: defaults to ``scheduler.priority`` (see :mod:`feste.priority`)
+    :param concurrency: defaults to ``scheduler.concurrency``
+                        (see :mod:`feste.concurrency`)
+    """
+    chunksize = chunksize or context.get("multiprocessing.chunk_size")
+
+    queue: Queue = Queue()
+
+    with local_callbacks(callbacks) as callbacks:
+        run = Execution(dsk, result, callbacks, batch_optimizations, response_cache,
+                        rate_limiter, retry_policy, stream_callback, cassette,
+                        checkpoint, policy, concurrency)
+        succeeded = False
+        stream_consumer = None
+        stream_sink = run.stream_callback
+        if run.stream_callback is not None and stream_queue is not None:
+            stream_consumer = StreamConsumer(stream_queue, run.stream_callback).start()
+            stream_sink = partial(queue_sink, stream_queue)
+        try:
+            run.start(cache)
+            dsk, state = run.dsk, run.state
 
             if rerun_exceptions_locally is None:
                 rerun_exceptions_locally = \
                     context.get("multiprocessing.rerun_exceptions_locally")
 
-            if state["waiting"] and not state["ready"]:
-                raise ValueError("Found no accessible jobs in dask")
+            # Keys of the chunks submitted to the workers
+            chunk_keys: dict[Any, list[Hashable]] = {}
+
+            def worker_task(key: Hashable) -> Any:
+                """The task sent to the workers, with the retry policy,
+                the cassette and the stream sink"""
+                task = resilient_task(dsk[key], run.retry_policy)
+                task = cassette_task(task, task_function(dsk[key]), run.cassette)
+                if stream_sink is not None and run.is_streaming(key):
+                    task = streaming_task(key, task, stream_sink)
+                return feedback_task(task, dsk[key], run.concurrency)
+
+            def fire_tasks(chunksize: int) -> float:
+                """Fire off a task to the thread pool, returns the time in
+                seconds until a task throttled by the rate limits can be
+                fired (or 0.0 if none was throttled)"""
+                run.prepare_ready()
 
-            def fire_tasks(chunksize: int) -> None:
-                """Fire off a task to the thread pool"""
                 # Determine chunksize and/or number of tasks to submit
                 nready = len(state["ready"])
                 if chunksize == -1:
@@ -88,24 +472,22 @@ def get_async(submit, num_workers, dsk, result, cache=None,  # type: ignore
                     avail_workers = max(num_workers - used_workers, 0)
                     ntasks = min(nready, chunksize * avail_workers)
 
+                # Get the next tasks to compute (most recently added)
+                # that are within the rate limits
+                keys, throttle_wait = run.fire(ntasks)
+
                 # Prep all ready tasks for submission
                 args = []
-                for _ in range(ntasks):
-                    # Get the next task to compute (most recently added)
-                    key = state["ready"].pop()
-                    # Notify task is running
-                    state["running"].add(key)
-                    for f in pretask_cbs:
-                        f(key, dsk, state)
-
+                for key in keys:
                     # Prep args to send
-                    data = {
-                        dep: state["cache"][dep] for dep in get_dependencies(dsk, key)
-                    }
+                    data = run.task_data(key)
+                    start = time.perf_counter()
+                    payload = dumps((worker_task(key), data))
+                    run.record_dispatch(key, payload, time.perf_counter() - start)
                     args.append(
                         (
                             key,
-                            dumps((dsk[key], data)),
+                            payload,
                             dumps,
                             loads,
                             get_id,
@@ -119,47 +501,96 @@ def get_async(submit, num_workers, dsk, result, cache=None,  # type: ignore
                     if not each_args:
                         break
                     fut = submit(batch_execute_tasks, each_args)
+                    chunk_keys[fut] = [arg[0] for arg in each_args]
                     fut.add_done_callback(queue.put)
+                return throttle_wait
 
             # Main loop, wait on tasks to finish, insert new ones
-            while state["waiting"] or state["ready"] or state["running"]:
-                fire_tasks(chunksize)
-                for key, res_info, failed in queue_get(queue).result():
+            while run.pending():
+                while run.finished:
+                    yield run.finished.popleft()
+                throttle_wait = fire_tasks(chunksize)
+                if not state["running"]:
+                    # All tasks fired were served from the response cache
+                    # or the ready ones are throttled by the rate limits
+                    time.sleep(throttle_wait)
+                    continue
+                if throttle_wait:
+                    # Wake up when a throttled task can be fired
+                    try:
+                        chunk = queue.get(timeout=throttle_wait)
+                    except Empty:
+                        continue
+                else:
+                    chunk = queue_get(queue)
+                keys = chunk_keys.pop(chunk)
+                try:
+                    chunk_results = chunk.result()
+                except BaseException as error:
+                    # Errors raised instead of packed (e.g. thread pools)
+                    for key in keys:
+                        run.fail(key, error)
+                    raise
+                for key, res_info, failed in chunk_results:
                     if failed:
                         exc, tb = loads(res_info)
+                        run.fail(key, exc)
                         if rerun_exceptions_locally:
-                            data = {
-                                dep: state["cache"][dep]
-                                for dep in get_dependencies(dsk, key)
-                            }
+                            data = run.task_data(key)
                             task = dsk[key]
                             _execute_task(task, data)  # Re-execute locally
                         else:
                             raise_exception(exc, tb)
                     res, worker_id = loads(res_info)
-                    state["cache"][key] = res
-                    finish_task(dsk, key, state, results, keyorder.get)
-                    for f in posttask_cbs:
-                        f(key, res, dsk, state, worker_id)
+                    run.finish_key(key, res, worker_id)
 
+            while run.finished:
+                yield run.finished.popleft()
             succeeded = True
 
         finally:
-            for _, _, _, _, finish in started_cbs:
-                if finish:
-                    finish(dsk, state, not succeeded)
+            if stream_consumer is not None:
+                stream_consumer.stop()
+            run.close(succeeded)
 
-    return nested_get(result, state["cache"])
 
+def get_async(submit, num_workers, dsk, result, **kwargs):  # type: ignore
+    """Runs :func:`iter_async` to completion and returns the results
+    of the requested keys."""
+    finished = dict(iter_async(submit, num_workers, dsk, result, **kwargs))
+    return nested_get(result, finished)
 
-def get_multiprocessing(dsk: Mapping, keys: Sequence[Hashable] | Hashable,  # type: ignore
-                        num_workers=None, func_loads=None, func_dumps=None,
-                        optimize_graph=True, pool=None, initializer=None,
-                        chunksize=None, **kwargs):
+
+def iter_multiprocessing(dsk: Mapping,  # type: ignore
+                         keys: Sequence[Hashable] | Hashable,
+                         num_workers=None, func_loads=None, func_dumps=None,
+                         optimize_graph=True, pool=None, initializer=None,
+                         chunksize=None, stream_callback=None,
+                         **kwargs) -> Iterator[tuple[Hashable, Any]]:
+    """Multiprocessing scheduler that yields the ``(key, result)`` of
+    the requested keys as soon as each one finishes (see
+    :func:`iter_async`). The partial outputs of streaming tasks are sent
+    from the workers to the stream callback through a manager queue.
+
+    When the pool is created here and the ``multiprocessing.object_registry``
+    context is enabled, the backends and prompts of the graph are shipped
+    once to each worker when it starts, and the task payloads reference
+    them by token (see :class:`feste.registry.ObjectRegistry`)."""
     chunksize = chunksize or context.get("multiprocessing.chunk_size")
     pool = pool or config.get("pool", None)
     initializer = initializer or config.get("multiprocessing.initializer", None)
     num_workers = num_workers or context.get("multiprocessing.num_workers") or CPU_COUNT
+    dsk = ensure_dict(dsk)
+    registry = None
+    if pool is None and func_loads is None and func_dumps is None and \
+            context.get("multiprocessing.object_registry"):
+        # TODO: Avoid circular imports from task
+        from feste.task import FesteBase
+        registry = ObjectRegistry()
+        if registry.register_graph(dsk, (FesteBase,)):
+            initializer = partial(initialize_worker, _dumps(registry), initializer)
+        else:
+            registry = None
     if pool is None:
         # In order to get consistent hashing in subprocesses, we need to set a
         # consistent seed for the Python hash algorithm. Unfortunately, there
@@ -185,8 +616,10 @@ def get_multiprocessing(dsk: Mapping, keys: Sequence[Hashable] | Hashable,  # ty
             pool = MultiprocessingPoolExecutor(pool)
         cleanup = False
 
+    if not optimize_graph:
+        kwargs.setdefault("batch_optimizations", [])
+
     # Optimize Dask
-    dsk = ensure_dict(dsk)
     dsk2, dependencies = cull(dsk, keys)
     if optimize_graph:
         dsk3, dependencies = fuse(dsk2, keys, dependencies)
@@ -197,13 +630,23 @@ def get_multiprocessing(dsk: Mapping, keys: Sequence[Hashable] | Hashable,  # ty
     # errors and report them to the user.
     loads = func_loads or context.get("multiprocessing.func_loads") or _loads
     dumps = func_dumps or context.get("multiprocessing.func_dumps") or _dumps
+    previous_registry = None
+    if registry is not None:
+        loads, dumps = registry_loads, registry_dumps
+        previous_registry = set_registry(registry)
 
     # Note former versions used a multiprocessing Manager to share
     # a Queue between parent and workers, but this is fragile on Windows
     # (issue #1652).
+    stream_callback = stream_callback or context.get("scheduler.stream_callback")
+    manager = None
+    if stream_callback is not None:
+        manager = get_context().Manager()
+        kwargs["stream_queue"] = manager.Queue()
+
     try:
         # Run
-        result = get_async(
+        yield from iter_async(
             pool.submit,
             pool._max_workers,
             dsk3,
@@ -214,10 +657,208 @@ def get_multiprocessing(dsk: Mapping, keys: Sequence[Hashable] | Hashable,  # ty
             pack_exception=pack_exception,
             raise_exception=reraise,
             chunksize=chunksize,
+            stream_callback=stream_callback,
             # rerun_exceptions_locally=False,
             **kwargs,
         )
     finally:
         if cleanup:
             pool.shutdown()
-    return result
+        if manager is not None:
+            manager.shutdown()
+        if previous_registry is not None:
+            set_registry(previous_registry)
+
+
+def get_multiprocessing(dsk: Mapping, keys: Sequence[Hashable] | Hashable,  # type: ignore
+                        **kwargs):
+    """Multiprocessing scheduler, it runs :func:`iter_multiprocessing`
+    to completion and returns the results of the requested keys."""
+    finished = dict(iter_multiprocessing(dsk, keys, **kwargs))
+    return nested_get(keys, finished)
+
+
+def async_variants_from_backends() -> dict[Callable, Callable]:
+    """Collect the coroutine variants of tasks from all classes
+    inheriting from the backend FesteBase class."""
+    # TODO: Avoid circular imports from task
+    from feste.task import FesteBase
+    variants: dict[Callable, Callable] = {}
+    for subclass in FesteBase.__subclasses__():
+        variants.update(subclass.async_variants())
+    return variants
+
+
+async def _execute_task_asyncio(task: Any, data: dict,
+                                variants: dict[Callable, Callable],
+                                executor: Executor | None = None,
+                                retry_policy: RetryPolicy | None = None,
+                                stream_sink: Callable[[str], None] | None = None,
+                                cassette: Cassette | None = None) -> Any:
+    """Execute a task on the event loop. The outermost call of the task
+    is awaited if it has a coroutine variant (or is a coroutine function),
+    otherwise it runs in the executor so it doesn't block the loop.
+
+    :param task: the task to execute
+    :param data: the results of the task dependencies
+    :param variants: mapping from task functions to coroutine variants
+    :param executor: executor for the synchronous calls
+    :param retry_policy: retry policy for the backend calls
+    :param stream_sink: sink of the partial outputs of the task
+    :param cassette: cassette recording or replaying the backend calls
+    :return: the task result
+    """
+    if not istask(task):
+        return _execute_task(task, data)
+
+    func, args, kwargs = task[0], task[1:], None
+    if func is apply:
+        func, args = task[1], task[2]
+        kwargs = task[3] if len(task) > 3 else None
+
+    args = [_execute_task(arg, data) for arg in args]
+    kwargs = _execute_task(kwargs, data) or {}
+
+    transient_errors: tuple[type[BaseException], ...] = ()
+    if retry_policy is not None and args:
+        transient_errors = transient_errors_of(args[0])
+
+    recorded = cassette.bind(func, args, kwargs) if cassette is not None else None
+
+    coroutine_fn = variants.get(func)
+    if coroutine_fn is None and inspect.iscoroutinefunction(func):
+        coroutine_fn = func
+    with stream_to(stream_sink):
+        if coroutine_fn is not None:
+            if retry_policy is not None and transient_errors:
+                coroutine_fn = partial(acall_with_retries, retry_policy,
+                                       transient_errors, coroutine_fn)
+            if recorded is not None:
+                return await cassette.acall(  # type: ignore
+                    recorded, cassette.batched.get(func),  # type: ignore
+                    coroutine_fn, *args, **kwargs)
+            return await coroutine_fn(*args, **kwargs)
+
+        call = partial(func, *args, **kwargs)
+        if retry_policy is not None and transient_errors:
+            call = partial(call_with_retries, retry_policy, transient_errors,
+                           func, *args, **kwargs)
+        if recorded is not None:
+            call = partial(cassette.call, recorded,  # type: ignore
+                           cassette.batched.get(func), call)  # type: ignore
+        # The call runs in the context of the task (e.g. stream sink)
+        call = partial(contextvars.copy_context().run, call)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, call)
+
+
+async def aget(dsk: Mapping, result: Any,  # type: ignore
+               max_concurrency: int | None = None, cache=None, callbacks=None,
+               executor: Executor | None = None, batch_optimizations=None,
+               response_cache=None, rate_limiter=None, retry_policy=None,
+               stream_callback=None, cassette=None, checkpoint=None,
+               policy=None, concurrency=None, **kwargs) -> Any:
+    """Coroutine that runs the same state machine (see :class:`Execution`) as
+    :func:`get_async`, but on an asyncio event loop in the current process.
+    Tasks are awaited concurrently up to ``max_concurrency`` tasks in flight.
+
+    :param dsk: the graph to execute
+    :param result: the keys to compute
+    :param max_concurrency: maximum number of tasks in flight
+    :param cache: optional initial cache of results
+    :param callbacks: Dask-style callbacks
+    :param executor: executor for tasks without coroutine variants
+    :param batch_optimizations: dynamic batching, defaults to the backends ones
+    :param response_cache: defaults to ``scheduler.response_cache``
+    :param rate_limiter: defaults to ``scheduler.rate_limits``
+    :param retry_policy: defaults to ``scheduler.retry_policy``
+    :param stream_callback: defaults to ``scheduler.stream_callback``
+    :param cassette: defaults to ``scheduler.cassette``
+    :param checkpoint: defaults to ``scheduler.checkpoint``
+    :param policy: defaults to ``scheduler.priority`` (see :mod:`feste.priority`)
+    :param concurrency: defaults to ``scheduler.concurrency``
+                        (see :mod:`feste.concurrency`)
+    :return: computed results
+    """
+    max_concurrency = max_concurrency or context.get("asyncio.max_concurrency")
+    variants = async_variants_from_backends()
+
+    with local_callbacks(callbacks) as callbacks:
+        run = Execution(dsk, result, callbacks, batch_optimizations, response_cache,
+                        rate_limiter, retry_policy, stream_callback, cassette,
+                        checkpoint, policy, concurrency)
+        succeeded = False
+        inflight: dict[asyncio.Future, Hashable] = {}
+        try:
+            run.start(cache)
+            worker_id = os.getpid()
+
+            while run.pending():
+                run.prepare_ready()
+                # Fire ready tasks until we reach the concurrency limit
+                ntasks = max(max_concurrency - len(run.state["running"]), 0)
+                keys, throttle_wait = run.fire(ntasks)
+                for key in keys:
+                    run.record_dispatch(key)
+                    stream_sink = None
+                    if run.is_streaming(key):
+                        stream_sink = partial(run.stream_callback, key)
+                    coro: Awaitable = _execute_task_asyncio(
+                        run.dsk[key], run.task_data(key), variants, executor,
+                        run.retry_policy, stream_sink, run.cassette)
+                    coro = feedback_awaitable(coro, run.dsk[key], run.concurrency)
+                    inflight[asyncio.ensure_future(coro)] = key
+
+                if not inflight:
+                    # All tasks were served from the response cache or
+                    # the ready ones are throttled by the rate limits
+                    await asyncio.sleep(throttle_wait)
+                    continue
+                # Wake up when a throttled task can be fired
+                done, _ = await asyncio.wait(inflight, timeout=throttle_wait or None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    key = inflight.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        run.fail(key, error)
+                    run.finish_key(key, future.result(), worker_id)
+
+            succeeded = True
+
+        finally:
+            for future in inflight:
+                future.cancel()
+            # Close the HTTP clients shared by the tasks of the loop, the
+            # module is only imported (with requests) by the backends
+            connection = sys.modules.get("feste.connection")
+            if connection is not None:
+                await connection.aclose_clients()
+            run.close(succeeded)
+
+    return nested_get(result, run.state["cache"])
+
+
+def get_asyncio(dsk: Mapping, keys: Sequence[Hashable] | Hashable,  # type: ignore
+                max_concurrency=None, optimize_graph=True, executor=None,
+                **kwargs):
+    """Asyncio scheduler, it executes the graph in a single process using
+    an event loop, which is well suited for graphs dominated by I/O-bound
+    calls such as LLM API requests. Backend tasks that implement coroutine
+    variants (see :meth:`feste.task.FesteBase.async_variants`) are awaited
+    on the loop, all other tasks run in a thread pool executor.
+
+    :param dsk: the graph to execute
+    :param keys: the keys to compute
+    :param max_concurrency: maximum number of tasks in flight, defaults
+                            to the ``asyncio.max_concurrency`` context
+    :param optimize_graph: if graph should be optimized
+    :param executor: executor for tasks without coroutine variants
+    :return: computed results
+    """
+    if not optimize_graph:
+        kwargs.setdefault("batch_optimizations", [])
+    dsk = ensure_dict(dsk)
+    dsk2, _ = cull(dsk, keys)
+    return asyncio.run(aget(dsk2, keys, max_concurrency=max_concurrency,
+                            executor=executor, **kwargs))
@@ -0,0 +1,141 @@
+import threading
+from collections.abc import Hashable
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from typing import Any, Callable, Iterator, Optional
+
+from dask.core import istask
+from dask.utils import apply
+
+# Sink of the partial outputs of the running task (per thread and per
+# asyncio task)
+_sink: ContextVar[Optional[Callable[[str], None]]] = ContextVar("sink", default=None)
+
+# Sentinel sent to stop the stream queue consumer
+_STOP = None
+
+
+class StreamedText(str):
+    """Text generated by a streaming task, with the streaming timings.
+
+    :param time_to_first_token: seconds until the first chunk arrived
+    :param elapsed: seconds until the last chunk arrived
+    """
+    time_to_first_token: Optional[float]
+    elapsed: Optional[float]
+
+    def __new__(cls, text: str, time_to_first_token: Optional[float] = None,
+                elapsed: Optional[float] = None) -> 'StreamedText':
+        obj = super().__new__(cls, text)
+        obj.time_to_first_token = time_to_first_token
+        obj.elapsed = elapsed
+        return obj
+
+    def __reduce__(self) -> Any:
+        return (StreamedText, (str(self), self.time_to_first_token, self.elapsed))
+
+
+def streaming_tasks_from_backends() -> set[Callable]:
+    """Collect the functions of the streaming tasks from all classes
+    inheriting from the backend FesteBase class."""
+    # TODO: Avoid circular imports from task
+    from feste.task import FesteBase
+    functions: set[Callable] = set()
+    for subclass in FesteBase.__subclasses__():
+        functions.update(subclass.streaming_tasks())
+    return functions
+
+
+def emit(delta: str) -> None:
+    """Emits a partial output (e.g. new tokens) of the running task to
+    the subscriber, it is a no-op when nobody is subscribed.
+
+    :param delta: the partial output
+    """
+    sink = _sink.get()
+    if sink is not None:
+        sink(delta)
+
+
+@contextmanager
+def stream_to(sink: Optional[Callable[[str], None]]) -> Iterator[None]:
+    """Context where the partial outputs emitted by the current thread
+    (or asyncio task) are sent to the sink.
+
+    :param sink: callable receiving the partial outputs
+    """
+    token = _sink.set(sink)
+    try:
+        yield
+    finally:
+        _sink.reset(token)
+
+
+def call_streaming(sink: Callable[[Hashable, str], None], key: Hashable,
+                   func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """Calls a function sending its partial outputs to the sink along
+    with the task key."""
+    with stream_to(partial(sink, key)):
+        return func(*args, **kwargs)
+
+
+def task_function(task: Any) -> Any:
+    """Returns the function called by a task (or None).
+
+    :param task: the task
+    """
+    if not istask(task):
+        return None
+    return task[1] if task[0] is apply else task[0]
+
+
+def streaming_task(key: Hashable, task: Any,
+                   sink: Callable[[Hashable, str], None]) -> Any:
+    """Wraps the call of a task with :func:`call_streaming`, keeping the
+    task arguments so they are still resolved by Dask.
+
+    :param key: the task key, sent to the sink with the partial outputs
+    :param task: the task
+    :param sink: callable receiving (key, partial output)
+    :return: the wrapped task
+    """
+    wrapper = partial(call_streaming, sink, key, task_function(task))
+    if task[0] is apply:
+        return (apply, wrapper) + task[2:]
+    return (wrapper,) + task[1:]
+
+
+def queue_sink(queue: Any, key: Hashable, delta: str) -> None:
+    """Sink that sends the partial outputs to a queue (e.g. from the
+    worker processes to the :class:`StreamConsumer`)."""
+    queue.put((key, delta))
+
+
+class StreamConsumer:
+    """Thread that consumes the partial outputs sent by the worker
+    processes to a queue and calls the subscriber with them.
+
+    :param queue: queue with the (key, partial output) items
+    :param callback: the subscriber, called with (key, partial output)
+    """
+    def __init__(self, queue: Any, callback: Callable[[Hashable, str], None]) -> None:
+        self.queue = queue
+        self.callback = callback
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+            self.callback(*item)
+
+    def start(self) -> 'StreamConsumer':
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stops the consumer after all queued outputs were consumed."""
+        self.queue.put(_STOP)
+        self.thread.join()
@@ -3,20 +3,53 @@
 # Copyright (c) 2014, Anaconda, Inc. and contributors.
 
 import inspect
+import itertools
 import operator
 import types
-from typing import Any, Optional
+import uuid
+import weakref
+from collections.abc import Iterable, Iterator
+from dataclasses import is_dataclass
+from typing import Any, Callable, Optional
 
+import dask
 from dask.base import is_dask_collection, replace_name_in_key
 from dask.core import quote
-from dask.delayed import Delayed, right, tokenize, unpack_collections, unzip
-from dask.highlevelgraph import HighLevelGraph
-from dask.utils import apply, funcname
-from tlz import concat, curry
+from dask.delayed import Delayed, right, tokenize, unpack_collections
+from dask.highlevelgraph import HighLevelGraph, MaterializedLayer
+from dask.utils import apply, ensure_dict, funcname
+from tlz import curry
 
 from feste import context
 from feste.compute import compute
-from feste.optimization import Optimization
+from feste.optimization import BoundCall, Optimization
+
+# Functions decorated as pure tasks (see is_pure)
+_pure_functions: weakref.WeakSet = weakref.WeakSet()
+
+# Keys of the impure calls are made unique with a counter instead of
+# a random token per call, the session token keeps them unique across
+# processes
+_key_session = uuid.uuid4().hex[:16]
+_key_counter = itertools.count()
+
+# Types of the arguments that are used as they are in the tasks (the
+# other types are added when first seen, see _is_opaque_type)
+_opaque_types: dict[type, bool] = dict.fromkeys(
+    (str, bytes, int, float, complex, bool, type(None)), True)
+
+
+def is_pure(func: Any) -> bool:
+    """Returns if the function was marked as a pure task, i.e. with
+    ``feste_task(pure=True)``, and can have duplicate calls merged.
+
+    :param func: the task function
+    :return: True if the function is pure
+    """
+    try:
+        return func in _pure_functions
+    except TypeError:
+        return False
 
 
 class FesteDelayed(Delayed):
@@ -53,6 +86,78 @@ class FesteDelayed(Delayed):
     _get_unary_operator = _get_binary_operator
 
 
+class FesteDelayedCall(FesteDelayed):
+    """Lazy-evaluation node of a task call. Instead of a graph merging
+    the graphs of all its dependencies, which is built for every call,
+    it only keeps its task and its dependencies, and the graph is built
+    by :func:`collect_graph` when it is needed."""
+    __slots__ = ("_task", "_dependencies")
+
+    def __init__(self, key: Any, task: Any, dependencies: tuple,
+                 length: Optional[int] = None) -> None:
+        super().__init__(key, None, length=length)
+        self._task = task
+        self._dependencies = dependencies
+
+    @property
+    def dask(self) -> Any:
+        return HighLevelGraph({self._key: MaterializedLayer(collect_graph([self]))},
+                              {self._key: set()})
+
+
+def collect_graph(collections: Iterable) -> dict:
+    """Builds the graph of the collections, walking once through the
+    task calls and merging the graphs of the other Dask collections. The
+    tasks are added after their dependencies, in the order of the calls.
+
+    :param collections: the collections
+    :return: the graph
+    """
+    graph: dict = {}
+    merged: set[int] = set()
+    expanded: set = set()
+    # Stack of (collection, if its dependencies were already visited)
+    stack = [(collection, False) for collection in reversed(list(collections))]
+    while stack:
+        collection, visited = stack.pop()
+        if not isinstance(collection, FesteDelayedCall):
+            if id(collection) not in merged:
+                merged.add(id(collection))
+                graph.update(ensure_dict(collection.__dask_graph__()))
+        elif visited:
+            graph[collection._key] = collection._task
+        elif collection._key not in expanded:
+            expanded.add(collection._key)
+            stack.append((collection, True))
+            stack.extend((dependency, False) for dependency
+                         in reversed(collection._dependencies))
+    return graph
+
+
+def _is_opaque_type(typ: type) -> bool:
+    """Returns if the objects of a type are used as they are in the tasks,
+    i.e. they are not collections, containers or dataclasses.
+
+    :param typ: the type
+    """
+    opaque = _opaque_types.get(typ)
+    if opaque is None:
+        opaque = not (hasattr(typ, "__dask_graph__") or is_dataclass(typ)
+                      or issubclass(typ, (list, tuple, set, dict, slice, Iterator)))
+        _opaque_types[typ] = opaque
+    return opaque
+
+
+def _unpack_arg(arg: Any) -> tuple[Any, tuple]:
+    """Fast path of ``unpack_collections`` for the most common arguments
+    (literals, backends and delayed objects)."""
+    if _is_opaque_type(type(arg)):
+        return arg, ()
+    if isinstance(arg, Delayed):
+        return arg._key, (arg,)
+    return unpack_collections(arg)  # type: ignore
+
+
 class FesteDelayedLeaf(FesteDelayed):
     """This is very similar to the DelayedLeaf in Dask, with the
     differences that we adjust the call to include eager mode execution."""
@@ -118,44 +223,62 @@ def feste_task(obj: Any, name: Optional[Any] = None,
                 prefix = type(obj).__name__
             token = tokenize(obj, nout, pure=pure)
             name = f"{prefix}-{token}"
+        if pure and obj is not apply:
+            try:
+                _pure_functions.add(obj)
+            except TypeError:
+                pass
         return FesteDelayedLeaf(obj, name, pure=pure, nout=nout)
     else:
         if not name:
             name = f"{type(obj).__name__}-{tokenize(task, pure=pure)}"
-        layer = {name: task}
-        graph = HighLevelGraph.from_collections(name, layer,
-                                                dependencies=collections)
-        return FesteDelayed(name, graph, nout)
+        return FesteDelayedCall(name, task, tuple(collections), nout)
+
+
+def unique_name(prefix: str) -> str:
+    """Returns a unique key name for an impure call (or map), names
+    with the same prefix sort in the order they were created.
+
+    :param prefix: the name prefix (e.g. the function name)
+    """
+    return f"{prefix}-{_key_session}{next(_key_counter):08x}"
 
 
 def call_function(func, func_token, args,  # type:ignore
                   kwargs, pure=None, nout=None) -> Any:
     dask_key_name = kwargs.pop("dask_key_name", None)
     pure = kwargs.pop("pure", pure)
+    if pure is None:
+        pure = dask.config.config.get("delayed_pure", False)
 
-    if dask_key_name is None:
+    if dask_key_name is not None:
+        name = dask_key_name
+    elif pure:
         name = "{}-{}".format(
             funcname(func),
             tokenize(func_token, *args, pure=pure, **kwargs),
         )
     else:
-        name = dask_key_name
+        name = unique_name(funcname(func))
 
-    args2, collections = unzip(map(unpack_collections, args), 2)
-    collections = list(concat(collections))
+    args2 = []
+    collections: list = []
+    for arg in args:
+        arg2, arg_collections = _unpack_arg(arg)
+        args2.append(arg2)
+        collections.extend(arg_collections)
 
     if kwargs:
-        dask_kwargs, collections2 = unpack_collections(kwargs)
-        collections.extend(collections2)
-        task = (apply, func, list(args2), dask_kwargs)
+        dask_kwargs = []
+        for key, value in kwargs.items():
+            value2, value_collections = _unpack_arg(value)
+            dask_kwargs.append([key, value2])
+            collections.extend(value_collections)
+        task = (apply, func, args2, (dict, dask_kwargs))
     else:
-        task = (func,) + args2
+        task = (func, *args2)
 
-    graph = HighLevelGraph.from_collections(
-        name, {name: task}, dependencies=collections
-    )
-    nout = nout if nout is not None else None
-    return FesteDelayed(name, graph, length=nout)
+    return FesteDelayedCall(name, task, tuple(collections), length=nout)
 
 
 class FesteBase:
@@ -171,6 +294,74 @@ class FesteBase:
     def optimizations(cls) -> list[Optimization]:
         return []
 
+    def batching_key(self) -> Any:
+        """Returns the key used to group calls for batching. Calls from
+        objects with the same key can be batched together, defaults to
+        the object identity."""
+        return id(self)
+
+    def checkpoint_token(self) -> Any:
+        """Returns a token identifying the object across processes, used
+        to key the checkpointed results of its tasks (see
+        :class:`feste.checkpoint.Checkpoint`). Defaults to the type and
+        the public attributes of basic types."""
+        return (type(self).__qualname__,
+                sorted((name, value) for name, value in vars(self).items()
+                       if not name.startswith("_")
+                       and isinstance(value, (str, bytes, int, float, bool,
+                                              type(None), tuple))))
+
+    @classmethod
+    def deterministic_tasks(cls) -> dict[Callable, Optional[Callable[[BoundCall], bool]]]:
+        """Returns a mapping from the task functions of the backend that can
+        be deterministic to a predicate that checks if a call is deterministic
+        (or None if all calls are). Duplicated deterministic calls are merged
+        by the :class:`feste.optimization.CommonSubexpressionElimination`."""
+        return {}
+
+    @classmethod
+    def cacheable_tasks(cls) -> list[Callable]:
+        """Returns the task functions of the backend whose responses can
+        be stored in the response cache (see :mod:`feste.cache`)."""
+        return []
+
+    @classmethod
+    def remote_tasks(cls) -> list[Callable]:
+        """Returns the task functions of the backend that call a remote
+        API (e.g. the completion requests). Their calls in flight are limited
+        by the :class:`feste.concurrency.ConcurrencyController` and their
+        cost is estimated by the :class:`feste.priority.CostModel` with the
+        latency of a request."""
+        return []
+
+    @classmethod
+    def async_variants(cls) -> dict[Callable, Callable]:
+        """Returns a mapping from the task functions of the backend to
+        their coroutine variants, used by the asyncio scheduler to avoid
+        blocking the event loop on I/O-bound calls."""
+        return {}
+
+    @classmethod
+    def streaming_tasks(cls) -> list[Callable]:
+        """Returns the task functions of the backend that emit partial
+        outputs while running (see :func:`feste.streaming.emit`), which
+        are sent to the ``scheduler.stream_callback`` subscriber."""
+        return []
+
+    @classmethod
+    def transient_errors(cls) -> tuple[type[BaseException], ...]:
+        """Returns the exceptions raised by the backend tasks that are
+        transient (e.g. rate limits or connection errors) and are retried
+        when a :class:`feste.resilience.RetryPolicy` is set."""
+        return ()
+
+    @classmethod
+    def throttling_errors(cls) -> tuple[type[BaseException], ...]:
+        """Returns the exceptions raised by the backend tasks when the
+        provider is throttling the requests (e.g. HTTP 429), which make
+        the :class:`feste.concurrency.ConcurrencyController` back off."""
+        return ()
+
     def _replace_delayed(self) -> None:
         members = inspect.getmembers(self)
         for name, obj in members:
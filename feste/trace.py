@@ -0,0 +1,162 @@
+import json
+from collections.abc import Hashable
+from pathlib import Path
+from typing import Any, NamedTuple, Union
+
+from dask.core import get_dependencies
+from dask.utils import key_split
+
+from feste.instrumentation import Instrumentation, TaskRecord
+
+
+class CriticalPath(NamedTuple):
+    """The chain of tasks that bounded the execution time, from the
+    first task to the last task finished.
+
+    :param keys: keys of the tasks in the path
+    :param busy_time: sum of the durations of the tasks in the path
+    :param wall_time: time from the first task started to the last
+                      task finished
+    """
+    keys: list[Hashable]
+    busy_time: float
+    wall_time: float
+
+    @property
+    def share(self) -> float:
+        """Share of the wall time spent running the path tasks (the rest
+        is spent waiting to be dispatched)."""
+        return self.busy_time / self.wall_time if self.wall_time > 0 else 0.0
+
+    def report(self, records: dict[Hashable, TaskRecord]) -> str:
+        """Returns a text report of the critical path.
+
+        :param records: task records by key
+        """
+        lines = [f"Critical path: {len(self.keys)} tasks, "
+                 f"{self.busy_time:.3f}s of {self.wall_time:.3f}s wall time "
+                 f"({self.share:.1%})"]
+        for key in self.keys:
+            record = records[key]
+            lines.append(f"  {record.duration:9.3f}s  wait {record.queue_wait:7.3f}s  "
+                         f"{record.backend or '-':>12}  {key}")
+        return "\n".join(lines)
+
+
+class Tracer(Instrumentation):
+    """Instrumentation that also keeps the dependencies of the executed
+    graph, to export the execution timeline as a Chrome trace (which can
+    be opened in ``chrome://tracing`` or Perfetto) and to find the
+    critical path of the execution.
+    """
+    def __init__(self) -> None:
+        super().__init__(keep_records=True)
+        self.dependencies: dict[Hashable, set] = {}
+
+    def _start(self, dsk: dict) -> None:
+        super()._start(dsk)
+        self.dependencies.update({key: get_dependencies(dsk, key) for key in dsk})
+
+    def reset(self) -> None:
+        super().reset()
+        self.dependencies.clear()
+
+    def records_by_key(self) -> dict[Hashable, TaskRecord]:
+        """Returns the task records by key."""
+        return {record.key: record for record in self.records}
+
+    def critical_path(self) -> CriticalPath:
+        """Finds the critical path, walking back from the last task
+        finished through the dependency that finished last."""
+        records = self.records_by_key()
+        if not records:
+            return CriticalPath([], 0.0, 0.0)
+        key: Any = max(records, key=lambda k: records[k].end)
+        path = [key]
+        while True:
+            dependencies = [dep for dep in self.dependencies.get(key, ())
+                            if dep in records]
+            if not dependencies:
+                break
+            key = max(dependencies, key=lambda k: records[k].end)
+            path.append(key)
+        path.reverse()
+        busy_time = sum(records[k].duration for k in path)
+        wall_time = max(r.end for r in records.values()) - \
+            min(r.start for r in records.values())
+        return CriticalPath(path, busy_time, wall_time)
+
+    def chrome_trace(self) -> dict[str, Any]:
+        """Returns the execution timeline in the Chrome trace format, with
+        one span per task or batch. Spans of each worker are placed in
+        lanes so concurrent spans (e.g. asyncio) don't overlap.
+        """
+        spans: dict[Hashable, list[TaskRecord]] = {}
+        for record in self.records:
+            spans.setdefault(record.fired_key or record.key, []).append(record)
+        if not spans:
+            return {"traceEvents": [], "displayTimeUnit": "ms"}
+        critical = self.critical_path()
+        critical_keys = set(critical.keys)
+        origin = min(r.start for r in self.records)
+
+        events: list[dict[str, Any]] = []
+        # Worker -> end time of each of its lanes
+        lanes: dict[Any, list[float]] = {}
+        lane_ids: dict[tuple[Any, int], int] = {}
+        ordered = sorted(spans.items(), key=lambda item: item[1][0].start)
+        for fired_key, records in ordered:
+            first = records[0]
+            worker_lanes = lanes.setdefault(first.worker_id, [])
+            for lane, lane_end in enumerate(worker_lanes):
+                if lane_end <= first.start:
+                    break
+            else:
+                lane = len(worker_lanes)
+                worker_lanes.append(0.0)
+            worker_lanes[lane] = first.end
+            if (first.worker_id, lane) not in lane_ids:
+                tid = len(lane_ids)
+                lane_ids[first.worker_id, lane] = tid
+                events.append({"name": "thread_name", "ph": "M", "pid": 0,
+                               "tid": tid, "args": {
+                                   "name": f"worker {first.worker_id} ({lane})"}})
+            keys = [r.key for r in records]
+            events.append({
+                "name": key_split(fired_key),
+                "cat": first.backend or "task",
+                "ph": "X",
+                "pid": 0,
+                "tid": lane_ids[first.worker_id, lane],
+                "ts": (first.start - origin) * 1e6,
+                "dur": first.duration * 1e6,
+                "args": {
+                    "keys": [str(k) for k in keys],
+                    "batch_size": first.batch_size,
+                    "payload_bytes": first.payload_bytes,
+                    "queue_wait": first.queue_wait,
+                    "critical": any(k in critical_keys for k in keys),
+                },
+            })
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "critical_path": [str(k) for k in critical.keys],
+                "critical_path_busy_time": critical.busy_time,
+                "wall_time": critical.wall_time,
+                "critical_path_share": critical.share,
+            },
+        }
+
+    def write_chrome_trace(self, path: Union[Path, str]) -> None:
+        """Writes the Chrome trace JSON file.
+
+        :param path: the trace file path
+        """
+        with open(path, "w") as fhandle:
+            json.dump(self.chrome_trace(), fhandle)
+
+    def report(self) -> str:
+        """Returns a text report of the critical path."""
+        return self.critical_path().report(self.records_by_key())
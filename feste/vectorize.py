@@ -0,0 +1,277 @@
+import operator
+import types
+from collections.abc import Hashable, Mapping
+from typing import Any, Callable, Optional
+
+from dask.utils import apply, funcname
+
+from feste import context
+from feste.optimization import BatchOptimization, bind_task
+from feste.task import (FesteBase, FesteDelayedCall, FesteDelayedLeaf,
+                        _unpack_arg, unique_name)
+
+# Default number of rows per chunk when no limit is set for the batches
+# (``batch.max_size`` context or backend limits)
+DEFAULT_BATCH_SIZE = 32
+
+
+def concat_chunks(chunks: list[list]) -> list:
+    """Concatenates the results of the chunks of a map."""
+    return [value for chunk in chunks for value in chunk]
+
+
+def map_rows(function: Callable, args: list, kwargs: dict,
+             columns: list) -> list:
+    """Calls a function once per row of the column arguments, the other
+    arguments are passed unchanged to all calls.
+
+    :param function: the function
+    :param args: the positional arguments
+    :param kwargs: the keyword arguments
+    :param columns: positions (for positional arguments) and names (for
+                    keyword arguments) of the column arguments
+    :return: list with the result of each row
+    """
+    num_rows = min(len(args[c] if isinstance(c, int) else kwargs[c])
+                   for c in columns)
+    results = []
+    for row in range(num_rows):
+        row_args = list(args)
+        row_kwargs = dict(kwargs)
+        for column in columns:
+            if isinstance(column, int):
+                row_args[column] = args[column][row]
+            else:
+                row_kwargs[column] = kwargs[column][row]
+        results.append(function(*row_args, **row_kwargs))
+    return results
+
+
+class FesteMapped(FesteDelayedCall):
+    """Lazy-evaluation node of a :func:`map`, it is computed to the list
+    with the result of each row. The rows are computed in chunks (one
+    task per chunk), which are reused when it is mapped again.
+    """
+    __slots__ = ("_bounds",)
+
+    def __init__(self, key: Any, chunks: list[FesteDelayedCall],
+                 bounds: list[tuple[int, int]]) -> None:
+        task = (concat_chunks, [chunk.key for chunk in chunks])
+        super().__init__(key, task, tuple(chunks), length=bounds[-1][1] if bounds else 0)
+        self._bounds = bounds
+
+    def __repr__(self) -> str:
+        return f"FesteMapped({repr(self.key)}, rows={len(self)})"
+
+
+class _Column:
+    """Column argument of a map, which is a sequence of values or the
+    result of another map."""
+    def __init__(self, values: Any) -> None:
+        self.mapped = values if isinstance(values, FesteMapped) else None
+        if self.mapped is None:
+            self.values = values.tolist() if hasattr(values, "tolist") else list(values)
+
+    def __len__(self) -> int:
+        return len(self.mapped) if self.mapped is not None else len(self.values)
+
+    def chunk(self, start: int, stop: int) -> tuple[Any, list]:
+        """Returns the task expression of a chunk of rows and the
+        dependencies of the chunk.
+
+        :param start: index of the first row
+        :param stop: index after the last row
+        """
+        if self.mapped is None:
+            return self.values[start:stop], []
+        pieces, dependencies = [], []
+        for (chunk_start, chunk_stop), chunk in zip(self.mapped._bounds,
+                                                    self.mapped._dependencies):
+            if chunk_stop <= start or chunk_start >= stop:
+                continue
+            dependencies.append(chunk)
+            if chunk_start == start and chunk_stop == stop:
+                return chunk.key, dependencies
+            piece = slice(max(start, chunk_start) - chunk_start,
+                          min(stop, chunk_stop) - chunk_start)
+            pieces.append((operator.getitem, chunk.key, piece))
+        return (concat_chunks, pieces), dependencies
+
+    def is_strings(self) -> bool:
+        return self.mapped is None and all(isinstance(v, str) for v in self.values)
+
+
+def _is_column(value: Any) -> bool:
+    """Returns if a map argument is a column: lists, ranges, arrays (e.g.
+    NumPy arrays or pandas series) or the result of another map. Other
+    arguments (including tuples) are passed unchanged to every row."""
+    return isinstance(value, (list, range, FesteMapped)) or hasattr(value, "__array__")
+
+
+def _resolve_function(func: Any) -> tuple[Callable, list]:
+    """Returns the function to call for each row and the leading
+    arguments (the object for backend methods and prompts)."""
+    if isinstance(func, FesteBase):
+        # Backends called directly (e.g. prompts)
+        func = getattr(func, "__call__")
+    if isinstance(func, types.MethodType) and isinstance(func.__func__, FesteDelayedLeaf):
+        return func.__func__._obj, [func.__self__]
+    if isinstance(func, FesteDelayedLeaf):
+        return func._obj, []
+    return func, []
+
+
+def _batch_rules() -> dict[Callable, tuple[Callable, BatchOptimization]]:
+    """Collects the batched variants of the task functions from the batch
+    optimizations of the backends."""
+    rules = {}
+    for subclass in FesteBase.__subclasses__():
+        for optimization in subclass.optimizations():
+            if isinstance(optimization, BatchOptimization):
+                for function, batched in optimization.rewrite_rules.items():
+                    rules[function] = (batched, optimization)
+    return rules
+
+
+def _split(num_rows: int, batch_size: Optional[int],
+           bounds: Optional[list[tuple[int, int]]] = None) -> list[tuple[int, int]]:
+    """Splits the rows in balanced chunks of at most ``batch_size`` rows,
+    within the given bounds (e.g. the chunks of the mapped columns)."""
+    if bounds is None:
+        bounds = [(0, num_rows)] if num_rows else []
+    if batch_size is None:
+        return bounds
+    chunks = []
+    for start, stop in bounds:
+        num_chunks = -((stop - start) // -batch_size)
+        for i in range(num_chunks):
+            chunks.append((start + (stop - start) * i // num_chunks,
+                           start + (stop - start) * (i + 1) // num_chunks))
+    return chunks
+
+
+def map(func: Any, *args: Any, batch_size: Optional[int] = None,
+        **kwargs: Any) -> Any:
+    """Maps a task over the rows of columnar inputs, e.g. rendering a
+    prompt with each row of a dataset and completing it::
+
+        prompts = feste.map(prompt, question=questions)
+        completions = feste.map(api.complete, prompts)
+        results = feste.compute(completions)
+
+    The arguments that are lists, arrays (e.g. NumPy arrays or pandas
+    series) or results of other maps are columns, the other arguments
+    are passed to every row. A dict of columns (or a pandas data frame)
+    can also be given as the only positional argument of a prompt, to
+    render it with the variables of each row.
+
+    Instead of one node per row, the rows are computed in chunks, and
+    calls with a batched variant (see :class:`feste.optimization.BatchOptimization`)
+    are batched per chunk, so the graph has one task per chunk. Calls
+    without a batched variant run one after another in each chunk.
+
+    :param func: a task, backend method or prompt
+    :param batch_size: maximum number of rows per chunk, defaults to the
+                       backend batch limits or ``batch.max_size`` context
+    :return: node computed to the list with the result of each row (or
+             the list itself in eager mode)
+    """
+    if len(args) == 1 and isinstance(func, FesteBase) and not kwargs:
+        data = args[0]
+        if isinstance(data, Mapping):
+            args, kwargs = (), dict(data)
+        elif hasattr(data, "columns"):
+            args, kwargs = (), {name: data[name] for name in data.columns}
+
+    function, leading_args = _resolve_function(func)
+    args = tuple(leading_args) + args
+    columns: dict[Hashable, _Column] = {}
+    for position, value in enumerate(args):
+        if _is_column(value):
+            columns[position] = _Column(value)
+    for name, value in kwargs.items():
+        if _is_column(value):
+            columns[name] = _Column(value)
+    if not columns:
+        raise ValueError("map requires at least one column argument")
+    num_rows = len(next(iter(columns.values())))
+    if any(len(column) != num_rows for column in columns.values()):
+        raise ValueError("map columns must have the same length")
+
+    if context.get("eager"):
+        all_args = [columns[position].values if position in columns else arg
+                    for position, arg in enumerate(args)]
+        all_kwargs = {name: columns[name].values if name in columns else value
+                      for name, value in kwargs.items()}
+        return map_rows(function, all_args, all_kwargs, list(columns))
+
+    # Constant arguments are unpacked once, for all chunks
+    constant_dependencies: list = []
+    args_template: list = []
+    for position, value in enumerate(args):
+        value, dependencies = (None, ()) if position in columns else _unpack_arg(value)
+        args_template.append(value)
+        constant_dependencies.extend(dependencies)
+    kwargs_template: dict = {}
+    for name, value in kwargs.items():
+        value, dependencies = (None, ()) if name in columns else _unpack_arg(value)
+        kwargs_template[name] = value
+        constant_dependencies.extend(dependencies)
+
+    # Calls are batched when the only column is the batched argument
+    batch_call, batch_rule = None, _batch_rules().get(function)
+    # Name or position of the single column
+    batch_position = next(iter(columns)) if len(columns) == 1 else None
+    if batch_rule is not None and batch_position is not None:
+        placeholder = object()
+        template = [placeholder if p in columns else a
+                    for p, a in enumerate(args_template)]
+        kwargs_items = [[k, placeholder if k in columns else v]
+                        for k, v in kwargs_template.items()]
+        call = bind_task((apply, function, template, (dict, kwargs_items)))
+        if call is not None and call.batch_arg is placeholder:
+            batch_call = call
+
+    column = next(iter(columns.values()))
+    bounds = None
+    if batch_call is not None and batch_rule is not None:
+        optimization = batch_rule[1]
+        if batch_size is None:
+            batch_size = optimization._limit(optimization.max_batch_size,
+                                             "batch.max_size")
+        if column.is_strings() and column.values:
+            # Literal prompts are also split by the token limits
+            bounds = [(batch[0], batch[-1] + 1)
+                      for batch in optimization.split(column.values)]
+    elif batch_size is None:
+        batch_size = context.get("batch.max_size")
+    mapped = [c.mapped for c in columns.values() if c.mapped is not None]
+    if mapped:
+        bounds = mapped[0]._bounds
+    elif bounds is None:
+        batch_size = batch_size or DEFAULT_BATCH_SIZE
+    bounds = _split(num_rows, batch_size, bounds)
+
+    name = unique_name(f"{funcname(function)}-map")
+    chunks = []
+    for index, (start, stop) in enumerate(bounds):
+        chunk_dependencies = list(constant_dependencies)
+        chunk_args = list(args_template)
+        chunk_kwargs = dict(kwargs_template)
+        for column_key, column in columns.items():
+            expression, column_dependencies = column.chunk(start, stop)
+            chunk_dependencies.extend(column_dependencies)
+            if isinstance(column_key, int):
+                chunk_args[column_key] = expression
+            else:
+                chunk_kwargs[column_key] = expression
+        if batch_call is not None and batch_rule is not None:
+            batch_arg = chunk_args[batch_position] \
+                if isinstance(batch_position, int) else chunk_kwargs[batch_position]
+            task = batch_call.batch_task(batch_rule[0], batch_arg)
+        else:
+            task = (map_rows, function, chunk_args,
+                    (dict, [[k, v] for k, v in chunk_kwargs.items()]),
+                    list(columns))
+        chunks.append(FesteDelayedCall((name, index), task, tuple(chunk_dependencies)))
+    return FesteMapped(name, chunks, bounds)
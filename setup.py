@@ -42,6 +42,11 @@ setuptools.setup(
         "cloudpickle>=2.2.1",
         "dagviz>=0.3.0",
     ],
+    entry_points={
+        "console_scripts": [
+            "feste-worker=feste.distributed:main",
+        ],
+    },
     extras_require={
         'dev': development_requires,
     },
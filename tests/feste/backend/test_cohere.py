@@ -1,3 +1,4 @@
+import asyncio
 import unittest
 from unittest.mock import MagicMock, patch
 
@@ -9,6 +10,20 @@ def generate(*args, **kwargs):
     return MagicMock(generations=[MagicMock(text=prompt)])
 
 
+class AsyncClientMock:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def generate(self, *args, **kwargs):
+        return generate(*args, **kwargs)
+
+
 class TestCohere(unittest.TestCase):
     def setUp(self) -> None:
        self.api = Cohere(api_key="invalid-key", check_api_key=False)
@@ -18,3 +33,9 @@ class TestCohere(unittest.TestCase):
         prompt_test = "TEST"
         ret = self.api.generate._obj(self.api, prompt_test)
         self.assertEqual(ret, prompt_test)
+
+    @patch("cohere.AsyncClient", AsyncClientMock)
+    def test_agenerate(self) -> None:
+        prompt_test = "TEST"
+        ret = asyncio.run(self.api.agenerate(prompt_test))
+        self.assertEqual(ret, prompt_test)
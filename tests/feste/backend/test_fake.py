@@ -0,0 +1,56 @@
+import asyncio
+import pickle
+import random
+import unittest
+
+import feste
+from feste.backend.fake import FakeLLM, FakeLLMError, LatencyModel
+from feste.scheduler import get_asyncio
+
+
+class TestFakeLLM(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeLLM("test", latency=LatencyModel(0.0))
+
+    def test_complete(self):
+        ret = self.api.complete._obj(self.api, "a")
+        self.assertEqual(ret, "A [test]")
+
+    def test_complete_batch(self):
+        ret = self.api.complete_batch._obj(self.api, ["a", "b"])
+        self.assertEqual(ret, ["A [test]", "B [test]"])
+        self.assertEqual(self.api.requests, 1)
+
+    def test_acomplete(self):
+        ret = asyncio.run(self.api.acomplete("a"))
+        self.assertEqual(ret, "A [test]")
+
+    def test_compute_batched(self):
+        outputs = [self.api.complete(str(i)) for i in range(5)]
+        (ret,) = feste.compute(outputs, scheduler_fn=get_asyncio)
+        self.assertEqual(ret, [f"{i} [test]" for i in range(5)])
+
+    def test_latency_model(self):
+        rng = random.Random(0)
+        self.assertAlmostEqual(LatencyModel(0.1, 0.01).sample(rng, 3), 0.13)
+        uniform = LatencyModel(1.0, distribution="uniform", jitter=0.5)
+        self.assertTrue(0.5 <= uniform.sample(rng) <= 1.5)
+        lognormal = LatencyModel(1.0, distribution="lognormal", jitter=0.5)
+        self.assertGreater(lognormal.sample(rng), 0.0)
+        with self.assertRaises(ValueError):
+            LatencyModel(distribution="unknown").sample(rng)
+
+    def test_deterministic_latency(self):
+        api = FakeLLM(latency=LatencyModel(1.0, distribution="lognormal", jitter=1.0))
+        other = FakeLLM(latency=api.latency)
+        self.assertEqual(api._request(["a"]), other._request(["a"]))
+
+    def test_errors(self):
+        api = FakeLLM(latency=LatencyModel(0.0), error_rate=1.0)
+        with self.assertRaises(FakeLLMError):
+            api.complete._obj(api, "a")
+        self.assertEqual(FakeLLM.transient_errors(), (FakeLLMError,))
+
+    def test_pickle(self):
+        api = pickle.loads(pickle.dumps(self.api))
+        self.assertEqual(api.complete._obj(api, "a"), "A [test]")
@@ -1,3 +1,4 @@
+import asyncio
 import unittest
 from unittest.mock import MagicMock, patch
 
@@ -5,10 +6,13 @@ import openai
 
 from feste import context
 from feste.backend.openai import CompleteParams, OpenAI
+from feste.streaming import stream_to
 
 
 class OpenAIMock:
     def create(self, **kwargs):
+        if kwargs.get("stream"):
+            return self.stream(**kwargs)
         prompt = kwargs.pop("prompt")
         n = len(prompt)
         if isinstance(prompt, tuple):
@@ -17,6 +21,22 @@ class OpenAIMock:
             choices = [MagicMock(text="single "+ prompt)]
         return MagicMock(choices=choices)
 
+    def stream(self, **kwargs):
+        prompts = kwargs["prompt"]
+        prompts = prompts if isinstance(prompts, tuple) else (prompts,)
+        for token in ("streamed", " ", "text"):
+            choices = [MagicMock(text=token, index=i) for i in range(len(prompts))]
+            yield MagicMock(choices=choices)
+
+    async def acreate(self, **kwargs):
+        if kwargs.get("stream"):
+            return self.astream(**kwargs)
+        return self.create(**kwargs)
+
+    async def astream(self, **kwargs):
+        for chunk in self.stream(**kwargs):
+            yield chunk
+
 
 class TestOpenAI(unittest.TestCase):
     def setUp(self):
@@ -32,11 +52,58 @@ class TestOpenAI(unittest.TestCase):
             ret = self.api.complete_batch._obj(self.api, prompt=("a", "b"))
             self.assertListEqual(ret, ["batched a", "batched b"])
 
+    def test_acomplete(self):
+        with patch("openai.Completion", new_callable=OpenAIMock):
+            ret = asyncio.run(self.api.acomplete(prompt="a"))
+            self.assertEqual(ret, "single a")
+
+    def test_acomplete_batch(self):
+        with patch("openai.Completion", new_callable=OpenAIMock):
+            ret = asyncio.run(self.api.acomplete_batch(prompt=("a", "b")))
+            self.assertListEqual(ret, ["batched a", "batched b"])
+
+    def test_complete_stream(self):
+        deltas = []
+        with patch("openai.Completion", new_callable=OpenAIMock):
+            with stream_to(deltas.append):
+                ret = self.api.complete_stream._obj(self.api, prompt="a")
+        self.assertEqual(ret, "streamed text")
+        self.assertEqual(deltas, ["streamed", " ", "text"])
+        self.assertGreaterEqual(ret.time_to_first_token, 0.0)
+        self.assertGreaterEqual(ret.elapsed, ret.time_to_first_token)
+
+    def test_acomplete_stream(self):
+        deltas = []
+
+        async def run():
+            with stream_to(deltas.append):
+                return await self.api.acomplete_stream(prompt="a")
+        with patch("openai.Completion", new_callable=OpenAIMock):
+            ret = asyncio.run(run())
+        self.assertEqual(ret, "streamed text")
+        self.assertEqual(deltas, ["streamed", " ", "text"])
+
+    def test_complete_stream_param(self):
+        params = CompleteParams(stream=True)
+        with patch("openai.Completion", new_callable=OpenAIMock):
+            ret = self.api.complete._obj(self.api, "a", params)
+            self.assertEqual(ret, "streamed text")
+            ret = self.api.complete_batch._obj(self.api, ("a", "b"), params)
+            self.assertEqual(ret, ["streamed text"] * 2)
+            ret = asyncio.run(self.api.acomplete_batch(("a", "b"), params))
+            self.assertEqual(ret, ["streamed text"] * 2)
+
     def test_prepare_params(self):
         params = CompleteParams(user=None)
         all_params = self.api._prepare_parameters(params)
         self.assertNotIn("user", all_params)
 
+    def test_batching_key(self):
+        self.assertEqual(self.api.batching_key(),
+                         OpenAI("invalid-key").batching_key())
+        self.assertNotEqual(self.api.batching_key(),
+                            OpenAI("other-key").batching_key())
+
     def test_set_api_key(self):
         mock_key = "abc"
         self.api.set_api_key(mock_key)
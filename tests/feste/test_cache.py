@@ -0,0 +1,100 @@
+import pickle
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from dask.local import synchronous_executor
+
+from feste import context, scheduler
+from feste.cache import ResponseCache, response_cache_key
+from feste.graph import FesteGraph
+from feste.task import FesteBase, feste_task
+
+
+class CachedBackend(FesteBase):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    @feste_task
+    def generate(self, prompt, temperature=0.0):
+        self.calls += 1
+        return prompt.upper()
+
+    @classmethod
+    def cacheable_tasks(cls):
+        return [cls.generate._obj]
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmpdir.name) / "cache.db"
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_get_set(self):
+        cache = ResponseCache(self.path)
+        self.assertEqual(cache.get("a"), (False, None))
+        cache.set("a", ["response"])
+        self.assertEqual(cache.get("a"), (True, ["response"]))
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "entries": 1})
+
+    def test_persistent(self):
+        ResponseCache(self.path).set("a", "response")
+        self.assertEqual(ResponseCache(self.path).get("a"), (True, "response"))
+
+    def test_pickle(self):
+        cache = ResponseCache(self.path)
+        cache.set("a", "response")
+        cache = pickle.loads(pickle.dumps(cache))
+        self.assertEqual(cache.get("a"), (True, "response"))
+
+    def test_max_size(self):
+        cache = ResponseCache(self.path, max_size=len(pickle.dumps("x" * 10)) * 2)
+        for key in "abc":
+            cache.set(key, "x" * 10)
+            time.sleep(0.01)
+        self.assertEqual(len(cache), 2)
+        self.assertFalse(cache.get("a")[0])
+
+    def test_max_age(self):
+        cache = ResponseCache(self.path, max_age=0.05)
+        cache.set("a", "response")
+        self.assertTrue(cache.get("a")[0])
+        time.sleep(0.1)
+        self.assertFalse(cache.get("a")[0])
+        cache.evict()
+        self.assertEqual(len(cache), 0)
+
+    def test_cache_key(self):
+        backend = CachedBackend()
+        cacheable = CachedBackend.cacheable_tasks()
+        calls = [backend.generate("a"), backend.generate("a", 0.0),
+                 CachedBackend().generate("a"), backend.generate("a", 1.0)]
+        feste_graph, _, _ = FesteGraph.collect(*calls)
+        cache_keys = [response_cache_key(feste_graph[c.key], {}, cacheable)
+                      for c in calls]
+        self.assertEqual(len(set(cache_keys[:3])), 1)
+        self.assertNotEqual(cache_keys[0], cache_keys[3])
+
+    def test_scheduler(self):
+        @feste_task
+        def concat(x, y):
+            return x + y
+
+        for get in [scheduler.get_asyncio,
+                    lambda dsk, keys: scheduler.get_async(
+                        synchronous_executor.submit, 1, dsk, keys)]:
+            backend = CachedBackend()
+            cache = ResponseCache(self.path)
+            cache.clear()
+            output = backend.generate(concat("a", backend.generate("b")))
+            feste_graph, _, _ = FesteGraph.collect(output)
+            with context.set(**{"scheduler.response_cache": cache}):
+                self.assertEqual(get(dict(feste_graph), output.key), "AB")
+                self.assertEqual(get(dict(feste_graph), output.key), "AB")
+            self.assertEqual(backend.calls, 2)
+            self.assertEqual(cache.stats(), {"hits": 2, "misses": 2, "entries": 2})
@@ -0,0 +1,109 @@
+import pickle
+import tempfile
+import time
+import unittest
+from functools import partial
+from pathlib import Path
+
+import cloudpickle
+from dask.local import synchronous_executor
+
+import feste
+from feste import context, scheduler
+from feste.backend.fake import FakeLLM, FakeLLMError, LatencyModel
+from feste.cassette import Cassette, CassetteMiss
+from feste.graph import FesteGraph
+from feste.optimization import bind_task
+
+
+class TestCassette(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = Path(self.tmpdir.name) / "cassette.db"
+        self.api = FakeLLM("cassette", latency=LatencyModel(0.02))
+
+    def record(self, outputs, scheduler_fn=scheduler.get_asyncio, **kwargs):
+        cassette = Cassette(self.path, mode="record")
+        with context.set(**{"scheduler.cassette": cassette}):
+            (ret,) = feste.compute(outputs, scheduler_fn=scheduler_fn, **kwargs)
+        return cassette, ret
+
+    def replay(self, outputs, scheduler_fn=scheduler.get_asyncio, **kwargs):
+        cassette = Cassette(self.path, speed=None)
+        with context.set(**{"scheduler.cassette": cassette}):
+            (ret,) = feste.compute(outputs, scheduler_fn=scheduler_fn, **kwargs)
+        return ret
+
+    def test_record_replay(self):
+        cassette, recorded = self.record([self.api.complete("a"),
+                                          self.api.complete("b")])
+        self.assertEqual(recorded, ["A [cassette]", "B [cassette]"])
+        # One batched call
+        self.assertEqual(len(cassette), 1)
+        requests = self.api.requests
+
+        replayed = self.replay([self.api.complete("a"), self.api.complete("b")])
+        self.assertEqual(replayed, recorded)
+        self.assertEqual(self.api.requests, requests)
+
+    def test_replay_rebatched(self):
+        self.record([self.api.complete("a"), self.api.complete("b")])
+        # Single calls and batches with other prompts are served from
+        # the prompts of the recorded batch
+        replayed = self.replay([self.api.complete("b")])
+        self.assertEqual(replayed, ["B [cassette]"])
+        replayed = self.replay([self.api.complete("b"), self.api.complete("a")],
+                               optimize_graph=False)
+        self.assertEqual(replayed, ["B [cassette]", "A [cassette]"])
+
+    def test_replay_timing(self):
+        self.record([self.api.complete("a")], optimize_graph=False)
+        cassette = Cassette(self.path, speed=2.0)
+        with context.set(**{"scheduler.cassette": cassette}):
+            start = time.monotonic()
+            (ret,) = feste.compute([self.api.complete("a")],
+                                   scheduler_fn=scheduler.get_asyncio)
+            elapsed = time.monotonic() - start
+        self.assertEqual(ret, ["A [cassette]"])
+        self.assertGreaterEqual(elapsed, 0.01)
+
+    def test_record_replay_workers(self):
+        # Tasks are pickled as they are sent to the worker processes
+        scheduler_fn = partial(scheduler.get_async, synchronous_executor.submit, 1,
+                               dumps=cloudpickle.dumps, loads=cloudpickle.loads)
+        outputs = [self.api.complete("a"), self.api.complete("b")]
+        cassette, recorded = self.record(outputs, scheduler_fn=scheduler_fn)
+        self.assertEqual(len(cassette), 1)
+        replayed = self.replay([self.api.complete("b")], scheduler_fn=scheduler_fn)
+        self.assertEqual(replayed, ["B [cassette]"])
+
+    def test_replay_order_workers(self):
+        cassette = Cassette(self.path, mode="record")
+        (task,) = FesteGraph.collect([self.api.complete("a")])[0].values()
+        for response in ["first", "second", "third"]:
+            cassette.record(bind_task(task), response, 0.0)
+        outputs = [self.api.complete("a") for _ in range(3)]
+        # The recordings are replayed once each across the worker processes
+        replayed = self.replay(outputs, scheduler_fn=scheduler.get_multiprocessing,
+                               num_workers=3, optimize_graph=False)
+        self.assertCountEqual(replayed, ["first", "second", "third"])
+
+    def test_replay_errors(self):
+        api = FakeLLM("errors", latency=LatencyModel(0.0), error_rate=1.0)
+        with self.assertRaises(FakeLLMError):
+            self.record([api.complete("a")], optimize_graph=False)
+        with self.assertRaises(FakeLLMError):
+            self.replay([api.complete("a")])
+
+    def test_replay_miss(self):
+        Cassette(self.path, mode="record")
+        with self.assertRaises(CassetteMiss):
+            self.replay([self.api.complete("missing")])
+
+    def test_pickle(self):
+        cassette = pickle.loads(pickle.dumps(Cassette(self.path).load_backends()))
+        self.assertIsNone(cassette.functions)
+        self.assertEqual(len(cassette), 0)
+        with self.assertRaises(ValueError):
+            Cassette(self.path, mode="unknown")
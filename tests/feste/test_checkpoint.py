@@ -0,0 +1,134 @@
+import itertools
+import tempfile
+import unittest
+import warnings
+from pathlib import Path
+
+import feste
+from feste import context
+from feste.backend.fake import FakeLLM, LatencyModel
+from feste.checkpoint import Checkpoint, CheckpointWarning, checkpoint_keys
+from feste.graph import FesteGraph
+from feste.prompt import Prompt
+from feste.scheduler import get_asyncio
+from feste.task import feste_task
+
+# Keys of the tasks that should fail
+failing: set[str] = set()
+
+
+@feste_task
+def post_process(text: str) -> str:
+    if text in failing:
+        raise RuntimeError(text)
+    return text.lower()
+
+
+# Results of the sampling task, different on every call
+samples = itertools.count()
+
+
+@feste_task
+def sample(text: str) -> str:
+    return f"{text} {next(samples)}"
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = Path(self.tmpdir.name) / "checkpoint.db"
+        self.addCleanup(failing.clear)
+
+    def build(self):
+        api = FakeLLM("checkpoint", latency=LatencyModel(0.0))
+        prompt = Prompt("Say {{text}}")
+        outputs = [api.complete(post_process(api.complete(prompt(text=str(i)))))
+                   for i in range(3)]
+        return api, outputs
+
+    def compute(self, outputs, checkpoint):
+        (ret,) = feste.compute(outputs, scheduler_fn=get_asyncio,
+                               checkpoint=checkpoint)
+        return ret
+
+    def test_resume(self):
+        api, outputs = self.build()
+        checkpoint = Checkpoint(self.path)
+        expected = self.compute(outputs, checkpoint)
+        self.assertEqual(checkpoint.saved, len(checkpoint))
+
+        # The graph is built again, with new keys for the impure calls
+        api, outputs = self.build()
+        checkpoint = Checkpoint(self.path)
+        self.assertEqual(self.compute(outputs, checkpoint), expected)
+        self.assertEqual(api.requests, 0)
+        self.assertEqual(checkpoint.saved, 0)
+        self.assertGreater(checkpoint.restored, 0)
+
+    def test_resume_after_failure(self):
+        failing.add("SAY 1 [checkpoint]")
+        api, outputs = self.build()
+        checkpoint = Checkpoint(self.path)
+        with self.assertRaises(RuntimeError):
+            self.compute(outputs, checkpoint)
+        saved = len(checkpoint)
+        self.assertGreater(saved, 0)
+
+        failing.clear()
+        api, outputs = self.build()
+        resumed = Checkpoint(self.path)
+        with context.set(**{"scheduler.checkpoint": resumed}):
+            (ret,) = feste.compute(outputs, scheduler_fn=get_asyncio)
+        self.assertEqual(ret[1], "SAY 1 [CHECKPOINT] [checkpoint]")
+        # Only the tasks that didn't finish were executed
+        self.assertEqual(resumed.saved + saved, len(resumed))
+        self.assertEqual(api.requests, 1)
+
+    def test_no_resume(self):
+        _, outputs = self.build()
+        self.compute(outputs, Checkpoint(self.path))
+        api, outputs = self.build()
+        checkpoint = Checkpoint(self.path, resume=False)
+        self.compute(outputs, checkpoint)
+        self.assertEqual(checkpoint.restored, 0)
+        self.assertGreater(api.requests, 0)
+
+    def test_resume_mapped_rows(self):
+        def build():
+            # Identical rows (and maps) are told apart by their position
+            return [feste.map(sample, ["a"] * 12, batch_size=1) for _ in range(2)]
+
+        checkpoint = Checkpoint(self.path)
+        expected = self.compute(build(), checkpoint)
+        self.assertEqual(len(set(expected[0] + expected[1])), 24)
+        checkpoint = Checkpoint(self.path)
+        self.assertEqual(self.compute(build(), checkpoint), expected)
+        self.assertEqual(checkpoint.saved, 0)
+
+    def test_checkpoint_keys(self):
+        api = FakeLLM("keys", latency=LatencyModel(0.0))
+        dsk = dict(FesteGraph.collect([api.complete("a"), api.complete("a"),
+                                       api.complete("b")])[0])
+        names = checkpoint_keys(dsk)
+        # Repeated calls are told apart, and keys are stable across builds
+        self.assertEqual(len(set(names.values())), 3)
+        dsk2 = dict(FesteGraph.collect([api.complete("a"), api.complete("a"),
+                                        api.complete("b")])[0])
+        self.assertEqual(sorted(names.values()),
+                         sorted(checkpoint_keys(dsk2).values()))
+        other = FakeLLM("other", latency=LatencyModel(0.0))
+        dsk3 = dict(FesteGraph.collect([other.complete("b")])[0])
+        self.assertNotIn(list(checkpoint_keys(dsk3).values())[0], names.values())
+
+    def test_unpicklable(self):
+        checkpoint = Checkpoint(self.path)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            checkpoint.save("key", (i for i in range(3)))
+        self.assertTrue(issubclass(caught[0].category, CheckpointWarning))
+        self.assertEqual(len(checkpoint), 0)
+        checkpoint.save("key", [1, 2])
+        self.assertEqual(checkpoint.load(["key", "missing"]), {"key": [1, 2]})
+        checkpoint.clear()
+        self.assertEqual(checkpoint.stats()["entries"], 0)
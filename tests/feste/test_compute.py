@@ -1,6 +1,10 @@
 import unittest
+from functools import partial
+
+from dask.local import synchronous_executor
 
 import feste
+from feste import scheduler
 from feste.task import feste_task
 
 
@@ -19,3 +23,27 @@ class TestCompute(unittest.TestCase):
         ret_direct = v.compute()
         ret_indirect = feste.compute(v)
         self.assertEqual((ret_direct,), ret_indirect)
+
+    def test_as_completed(self):
+        add = self.get_dummy_graph()
+        a = add(1, 1)
+        b = add(a, 2)
+        ret = dict(feste.as_completed(a, [b]))
+        self.assertEqual(ret, {a: 2, b: 4})
+
+    def test_as_completed_early(self):
+        calls = []
+
+        @feste_task
+        def record(x):
+            calls.append(x)
+            return x
+
+        tasks = [record(i) for i in range(4)]
+        scheduler_fn = partial(scheduler.iter_async, synchronous_executor.submit, 1)
+        iterator = feste.as_completed(tasks, scheduler_fn=scheduler_fn,
+                                      batch_optimizations=[], chunksize=1)
+        task, result = next(iterator)
+        self.assertEqual(calls, [result])
+        self.assertEqual(task.compute(), result)
+        self.assertEqual(len(list(iterator)), 3)
@@ -0,0 +1,137 @@
+import pickle
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import feste
+from feste import context, scheduler
+from feste.backend.fake import FakeLLM, FakeLLMRateLimitError, LatencyModel
+from feste.concurrency import AIMDLimit, ConcurrencyController, Feedback
+from feste.graph import FesteGraph
+from feste.instrumentation import Instrumentation
+from feste.prompt import Prompt
+from feste.resilience import RetryPolicy
+
+
+class TestAIMDLimit(unittest.TestCase):
+    def test_slow_start(self):
+        limit = AIMDLimit(initial=2)
+        started = [limit.acquire(), limit.acquire()]
+        self.assertFalse(limit.available())
+        limit.release(started[0], 0.1)
+        # Only grows when the limit is in use
+        limit.release(started[1], 0.1)
+        self.assertEqual(limit.limit, 3)
+        self.assertEqual(limit.in_flight, 0)
+
+    def test_throttling(self):
+        limit = AIMDLimit(initial=8, increase=1.0)
+        started = [limit.acquire() for _ in range(8)]
+        limit.release(started[0], 0.1, throttled=1)
+        self.assertEqual(limit.limit, 4)
+        # Requests fired before the decrease don't decrease it again
+        limit.release(started[1], 0.1, throttled=2)
+        self.assertEqual(limit.limit, 4)
+        self.assertEqual(limit.throttled, 3)
+        limit.release(limit.acquire(), 0.1, throttled=1)
+        self.assertEqual(limit.limit, 2)
+        # Additive increase after the slow start
+        for _ in started[2:]:
+            limit.cancel()
+        started = [limit.acquire(), limit.acquire()]
+        limit.release(started[0], 0.1)
+        self.assertEqual(limit.limit, 2.5)
+        self.assertEqual(limit.stats()["decreases"], 2)
+
+    def test_latency_gradient(self):
+        limit = AIMDLimit(initial=10, short_smoothing=1.0, long_smoothing=0.0)
+        limit.release(limit.acquire(), 0.1)
+        limit.release(limit.acquire(), 0.15)
+        self.assertEqual(limit.limit, 10)
+        limit.release(limit.acquire(), 0.5)
+        self.assertAlmostEqual(limit.limit, 9.0)
+
+
+class TestConcurrencyController(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeLLM("adaptive", latency=LatencyModel(0.01), capacity=4)
+        self.prompts = [str(i) for i in range(60)]
+        self.controller = ConcurrencyController(
+            limit_factory=partial(AIMDLimit, initial=1))
+
+    def compute(self, scheduler_fn, controller=None, **kwargs):
+        outputs = [self.api.complete(prompt) for prompt in self.prompts]
+        with context.set(**{"scheduler.concurrency": controller,
+                            "scheduler.retry_policy": RetryPolicy(max_retries=100,
+                                                                  base_delay=0.001),
+                            "scheduler.dynamic_batching": False}):
+            (ret,) = feste.compute(outputs, scheduler_fn=scheduler_fn,
+                                   optimize_graph=False, **kwargs)
+        self.assertEqual(ret, [f"{prompt} [adaptive]" for prompt in self.prompts])
+        return controller.stats()["FakeLLM"] if controller is not None else None
+
+    def test_get_asyncio(self):
+        self.compute(scheduler.get_asyncio, max_concurrency=64)
+        baseline = self.api.throttled
+        self.api.throttled = 0
+        with Instrumentation() as instrumentation:
+            stats = self.compute(scheduler.get_asyncio, self.controller,
+                                 max_concurrency=64)
+        # Grows from the initial limit and backs off over the capacity
+        self.assertGreater(stats["decreases"], 0)
+        self.assertEqual(stats["throttled"], self.api.throttled)
+        self.assertLess(self.api.throttled, baseline / 2)
+        self.assertEqual(stats["in_flight"], 0)
+        summary = instrumentation.summary()["FakeLLM"]
+        self.assertEqual(summary["concurrency_limit"], stats["limit"])
+        self.assertIn("# TYPE feste_concurrency_limit gauge",
+                      instrumentation.to_prometheus())
+
+    def test_get_async(self):
+        with ThreadPoolExecutor(16) as executor:
+            stats = self.compute(partial(scheduler.get_async, executor.submit, 16),
+                                 self.controller, chunksize=1)
+        self.assertGreater(stats["decreases"], 0)
+        self.assertEqual(stats["throttled"], self.api.throttled)
+        self.assertEqual(stats["in_flight"], 0)
+
+    def test_throttling_without_retries(self):
+        # Throttling errors failing the computation also back off the limit
+        outputs = [self.api.complete(prompt) for prompt in self.prompts]
+        executor = ThreadPoolExecutor(16)
+        self.addCleanup(executor.shutdown)
+        for scheduler_fn in [partial(scheduler.get_asyncio, max_concurrency=64),
+                             partial(scheduler.get_async, executor.submit, 16)]:
+            controller = ConcurrencyController(
+                limit_factory=partial(AIMDLimit, initial=16))
+            with context.set(**{"scheduler.concurrency": controller,
+                                "scheduler.dynamic_batching": False}):
+                with self.assertRaises(FakeLLMRateLimitError):
+                    feste.compute(outputs, scheduler_fn=scheduler_fn,
+                                  optimize_graph=False)
+            stats = controller.stats()["FakeLLM"]
+            self.assertGreater(stats["throttled"], 0)
+            self.assertLess(stats["limit"], 16)
+            self.assertEqual(stats["in_flight"], 0)
+
+    def test_local_tasks(self):
+        # Prompts are backends but they don't call remote APIs
+        outputs = [Prompt("Say {{text}}")(text=prompt) for prompt in self.prompts]
+        with context.set(**{"scheduler.concurrency": self.controller}):
+            (ret,) = feste.compute(outputs, scheduler_fn=scheduler.get_asyncio)
+        self.assertEqual(ret, [f"Say {prompt}" for prompt in self.prompts])
+        self.assertEqual(self.controller.stats(), {})
+
+    def test_acquire(self):
+        dsk = dict(FesteGraph.collect([self.api.complete("a"),
+                                       self.api.complete("b")])[0])
+        (key_a, task_a), (key_b, task_b) = dsk.items()
+        self.assertTrue(self.controller.acquire(key_a, task_a))
+        self.assertFalse(self.controller.acquire(key_b, task_b))
+        # Tasks that aren't backend calls are never limited
+        self.assertTrue(self.controller.acquire("other", (len, "abc")))
+        self.assertEqual(self.controller.release(key_a, Feedback("A", 0.1)), "A")
+        self.assertTrue(self.controller.acquire(key_b, task_b))
+        self.controller.cancel(key_b)
+        restored = pickle.loads(pickle.dumps(self.controller))
+        self.assertEqual(restored.stats()["FakeLLM"]["limit"], 2)
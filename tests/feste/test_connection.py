@@ -0,0 +1,101 @@
+import asyncio
+import json
+import pickle
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cohere
+from requests.adapters import HTTPAdapter
+
+from feste import connection
+from feste.backend.cohere import Cohere
+from feste.connection import (PoolConfig, aclose_clients, close_sessions,
+                              connection_stats, get_async_client, get_session)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"ok": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            # Tell the client, so it doesn't reuse the closed connection
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestConnection(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(close_sessions)
+
+    def test_get_session(self):
+        session = get_session("test")
+        self.assertIs(get_session("test"), session)
+        self.assertIsNot(get_session("test", PoolConfig(pool_maxsize=1)), session)
+        # Sessions closed by the clients keep their pool
+        session.close()
+        self.assertIs(get_session("test"), session)
+
+    def test_connection_reuse(self):
+        session = get_session("reuse")
+        for _ in range(3):
+            session.post(self.url, json={}).json()
+        stats = connection_stats()["reuse"]
+        self.assertEqual(stats.requests, 3)
+        self.assertEqual(stats.connections, 1)
+        self.assertEqual(stats.reused, 2)
+        # Unpickled adapters start with a new pool and counters
+        adapter = pickle.loads(pickle.dumps(session.adapters["http://"]))
+        self.assertEqual(adapter.num_requests, 0)
+        self.assertEqual(adapter._pool_maxsize, PoolConfig().pool_maxsize)
+
+    def test_no_keep_alive(self):
+        session = get_session("close", PoolConfig(keep_alive=False))
+        self.assertEqual(session.headers["Connection"], "close")
+        for _ in range(2):
+            session.post(self.url, json={})
+        self.assertEqual(connection_stats()["close"].connections, 2)
+
+    def test_cohere_pooled_client(self):
+        api = Cohere(api_key="invalid-key", check_api_key=False)
+        api.client.api_url = self.url
+        for _ in range(2):
+            self.assertEqual(api.client._request("generate", json={}), {"ok": True})
+        self.assertEqual(connection_stats()["cohere"].reused, 1)
+        # Other clients of the SDK keep a new pool per request
+        self.assertIs(cohere.client.HTTPAdapter, HTTPAdapter)
+        client = cohere.Client(api_key="invalid-key", check_api_key=False)
+        client.api_url = self.url
+        self.assertEqual(client._request("generate", json={}), {"ok": True})
+        self.assertEqual(connection_stats()["cohere"].requests, 2)
+
+    def test_async_clients(self):
+        class Client:
+            closed = False
+
+            async def close(self):
+                self.closed = True
+
+        async def run():
+            client = get_async_client("test", Client)
+            self.assertIs(get_async_client("test", Client), client)
+            await aclose_clients()
+            self.assertNotIn(asyncio.get_running_loop(), connection._async_clients)
+            return client
+
+        client = asyncio.run(run())
+        self.assertTrue(client.closed)
@@ -0,0 +1,152 @@
+import os
+import subprocess
+import sys
+import threading
+import unittest
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+from unittest.mock import patch
+
+import feste
+from feste import context
+from feste.backend.fake import FakeLLM, LatencyModel
+from feste.concurrency import ConcurrencyController
+from feste.distributed import (Coordinator, Worker, get_distributed,
+                               parse_address)
+from feste.scheduler import get_asyncio
+from feste.task import feste_task
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@feste_task
+def post_process(text: str) -> str:
+    return text.strip().lower()
+
+
+@feste_task
+def fail(text: str) -> str:
+    raise ValueError(text)
+
+
+class TestDistributed(unittest.TestCase):
+    def setUp(self):
+        self.coordinator = Coordinator(authkey="secret")
+        self.addCleanup(self.coordinator.close)
+        self.api = FakeLLM("distributed", latency=LatencyModel(0.01))
+
+    def start_workers(self, num_workers, nthreads=2):
+        for i in range(num_workers):
+            worker = Worker(self.coordinator.address, nthreads=nthreads,
+                            name=f"worker-{i}", authkey="secret")
+            threading.Thread(target=worker.run, daemon=True).start()
+        self.coordinator.wait_for_workers(num_workers, timeout=10)
+
+    def compute(self, outputs, **kwargs):
+        (ret,) = feste.compute(outputs, scheduler_fn=get_distributed,
+                               coordinator=self.coordinator, **kwargs)
+        return ret
+
+    def test_compute(self):
+        self.start_workers(2)
+        outputs = [post_process(self.api.complete(str(i))) for i in range(6)]
+        self.assertEqual(self.compute(outputs),
+                         [f"{i} [distributed]" for i in range(6)])
+        self.assertEqual(self.coordinator.num_slots, 4)
+        self.assertEqual(sorted(s.name for s in self.coordinator.stats()),
+                         ["worker-0", "worker-1"])
+
+    def test_locality(self):
+        self.start_workers(2)
+        outputs = []
+        for i in range(2):
+            text = self.api.complete(f"chain {i}")
+            for _ in range(3):
+                text = self.api.complete(post_process(text))
+            outputs.append(text)
+        (expected,) = feste.compute(outputs, scheduler_fn=get_asyncio)
+        self.assertEqual(self.compute(outputs, optimize_graph=False), expected)
+        stats = self.coordinator.stats()
+        # Tasks are placed on the workers holding their inputs
+        self.assertGreater(sum(s.local_inputs for s in stats), 0)
+        self.assertEqual(sum(s.remote_inputs for s in stats), 0)
+
+    def test_concurrency(self):
+        self.start_workers(2)
+        outputs = [post_process(self.api.complete(str(i))) for i in range(6)]
+        controller = ConcurrencyController()
+        with context.set(**{"scheduler.concurrency": controller}):
+            # The batched results are read by their dependents in the workers
+            ret = self.compute(outputs)
+        self.assertEqual(ret, [f"{i} [distributed]" for i in range(6)])
+        self.assertEqual(controller.stats()["FakeLLM"]["in_flight"], 0)
+
+    def test_eviction(self):
+        worker = Worker(self.coordinator.address, nthreads=1, authkey="secret",
+                        cache_size=1)
+        threading.Thread(target=worker.run, daemon=True).start()
+        self.coordinator.wait_for_workers(1, timeout=10)
+        outputs = [post_process(self.api.complete(str(i))) for i in range(4)]
+        self.assertEqual(self.compute(outputs, optimize_graph=False),
+                         [f"{i} [distributed]" for i in range(4)])
+        self.assertLessEqual(self.coordinator.stats()[0].cached, 1)
+
+    def test_errors(self):
+        self.start_workers(1)
+        with self.assertRaises(ValueError):
+            self.compute([fail("error")])
+
+    def test_streaming(self):
+        self.start_workers(1)
+        outputs = [post_process(self.api.complete("a"))]
+        ret = self.compute(outputs, stream_callback=lambda key, text: None)
+        self.assertEqual(ret, ["a [distributed]"])
+
+    def test_no_workers(self):
+        with self.assertRaises(TimeoutError):
+            get_distributed({"a": 1}, "a", coordinator=self.coordinator, timeout=0.1)
+        with self.assertRaises(ValueError):
+            get_distributed({"a": 1}, "a")
+        with context.set(**{"distributed.coordinator": self.coordinator}):
+            self.start_workers(1)
+            self.assertEqual(get_distributed({"a": 1, "b": (str, "a")}, "b"), "1")
+
+    def test_worker_command(self):
+        processes = [subprocess.Popen([sys.executable, "-m", "feste.distributed",
+                                       self.coordinator.address, "--nthreads", "2",
+                                       "--name", f"process-{i}"],
+                                      env=dict(os.environ, FESTE_AUTHKEY="secret"),
+                                      cwd=ROOT)
+                     for i in range(2)]
+        for process in processes:
+            self.addCleanup(process.wait, 10)
+        self.coordinator.wait_for_workers(2, timeout=30)
+        outputs = [post_process(self.api.complete(str(i))) for i in range(4)]
+        self.assertEqual(self.compute(outputs),
+                         [f"{i} [distributed]" for i in range(4)])
+        self.coordinator.close()
+        for process in processes:
+            self.assertEqual(process.wait(10), 0)
+
+    def test_authkey(self):
+        env = {k: v for k, v in os.environ.items() if k != "FESTE_AUTHKEY"}
+        with patch.dict(os.environ, env, clear=True):
+            # Required unless the connections stay on the loopback interface
+            with self.assertRaises(ValueError):
+                Coordinator(host="0.0.0.0")
+            with self.assertRaises(ValueError):
+                Worker("192.0.2.1:8786")
+            Worker("localhost:8786")
+            Coordinator().close()
+
+    def test_wrong_authkey(self):
+        with self.assertRaises(AuthenticationError):
+            Client(("127.0.0.1", self.coordinator.listener.address[1]),
+                   authkey=b"wrong")
+        # Workers connecting afterwards are still accepted
+        self.start_workers(1)
+        self.assertEqual(self.compute([self.api.complete("a")]), ["A [distributed]"])
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address("localhost:8786"), ("localhost", 8786))
+        self.assertEqual(parse_address(":8786"), ("127.0.0.1", 8786))
@@ -65,3 +65,23 @@ class TestGraph(unittest.TestCase):
             feste_graph.dagviz_metro(sio)
             val = sio.getvalue()
         self.assertTrue(len(val) > 0)
+
+    def test_collect_order(self):
+        add = self.get_dummy_graph()
+        a = add(1, 1)
+        b = add(a, 2)
+        c = add(a, b)
+        d = add(3, 3)
+
+        feste_graph, collections, repack = FesteGraph.collect([c, d], c)
+        self.assertListEqual(list(feste_graph), [a.key, b.key, c.key, d.key])
+        self.assertListEqual(collections, [c, d])
+        self.assertEqual(repack(["c", "d"]), (["c", "d"], "c"))
+
+    def test_collect_chain(self):
+        add = self.get_dummy_graph()
+        output = add(0, 1)
+        for _ in range(10_000):
+            output = add(output, 1)
+        feste_graph, _, _ = FesteGraph.collect(output)
+        self.assertEqual(len(feste_graph), 10_001)
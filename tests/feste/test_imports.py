@@ -0,0 +1,57 @@
+import json
+import subprocess
+import sys
+import unittest
+
+# Modules that should only be imported on first use
+LAZY_MODULES = ["openai", "cohere", "requests", "aiohttp", "dagviz",
+                "networkx", "rich", "iso639", "feste.connection"]
+
+# Dependencies (top-level modules of the install requirements). Dask stays
+# eager, as feste.compute and the tasks are built on its Delayed objects
+# (and feste.compute is also a submodule, so it can't be exported lazily);
+# Dask itself imports jinja2, cloudpickle and toolz.
+DEPENDENCIES = ["dask", "jinja2", "cloudpickle", "toolz", "iso639", "openai",
+                "cohere", "rich", "dagviz"]
+
+IMPORT_SCRIPT = """
+import json
+import sys
+{statement}
+print(json.dumps({{"modules": sorted(sys.modules)}}))
+"""
+
+
+def run_import(statement: str) -> dict:
+    """Imports in a fresh interpreter, returning the imported modules."""
+    script = IMPORT_SCRIPT.format(statement=statement)
+    output = subprocess.run([sys.executable, "-c", script], check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+class TestImports(unittest.TestCase):
+    def assertLazy(self, modules):
+        loaded = [name for name in LAZY_MODULES if name in modules]
+        self.assertEqual(loaded, [])
+
+    def test_import_feste(self):
+        self.assertLazy(run_import("import feste")["modules"])
+
+    def test_import_fake_backend(self):
+        ret = run_import("from feste.backend import FakeLLM")
+        self.assertLazy(ret["modules"])
+        self.assertIn("feste.backend.fake", ret["modules"])
+
+    def test_import_backend_on_use(self):
+        ret = run_import("import feste.backend; feste.backend.OpenAI")
+        self.assertIn("openai", ret["modules"])
+        self.assertIn("feste.connection", ret["modules"])
+
+    def test_import_dependencies(self):
+        # Only the dependencies imported by Dask itself are imported
+        dask_modules = run_import("import dask")["modules"]
+        feste_modules = run_import("import feste")["modules"]
+        imported = [name for name in DEPENDENCIES if name in feste_modules]
+        self.assertEqual([name for name in imported if name not in dask_modules], [])
+        self.assertIn("dask", imported)
@@ -0,0 +1,96 @@
+import unittest
+
+import cloudpickle
+from dask.local import synchronous_executor
+
+import feste
+from feste import scheduler
+from feste.graph import FesteGraph
+from feste.instrumentation import Histogram, Instrumentation
+from feste.optimization import BatchOptimization
+from feste.task import FesteBase, feste_task
+
+
+class InstrumentedBackend(FesteBase):
+    @feste_task
+    def echo(self, text):
+        return text
+
+    @feste_task
+    def echo_batch(self, texts):
+        return texts
+
+    @classmethod
+    def optimizations(cls):
+        return [BatchOptimization({cls.echo._obj: cls.echo_batch._obj})]
+
+
+class TestHistogram(unittest.TestCase):
+    def test_cumulative(self):
+        histogram = Histogram((1, 2))
+        for value in (0.5, 1.0, 1.5, 3.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(),
+                         [("1.0", 2), ("2.0", 3), ("+Inf", 4)])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.sum, 6.0)
+
+
+class TestInstrumentation(unittest.TestCase):
+    def get_graph(self):
+        backend = InstrumentedBackend()
+
+        @feste_task
+        def join(texts):
+            return " ".join(texts)
+
+        output = join([backend.echo(t) for t in "abc"])
+        feste_graph, _, _ = FesteGraph.collect(output)
+        return dict(feste_graph), output.key
+
+    def test_get_async(self):
+        dsk, key = self.get_graph()
+        with Instrumentation() as instrumentation:
+            ret = scheduler.get_async(
+                synchronous_executor.submit, 1, dsk, key,
+                batch_optimizations=InstrumentedBackend.optimizations(),
+                dumps=cloudpickle.dumps, loads=cloudpickle.loads, chunksize=-1)
+        self.assertEqual(ret, "a b c")
+
+        records = {r.key: r for r in instrumentation.records}
+        self.assertEqual(set(records), set(dsk))
+        backend_records = [r for r in records.values()
+                           if r.backend == "InstrumentedBackend"]
+        self.assertEqual(len(backend_records), 3)
+        for record in backend_records:
+            self.assertEqual(record.batch_size, 3)
+            self.assertGreater(record.payload_bytes, 0)
+            self.assertGreaterEqual(record.duration, 0.0)
+        self.assertEqual(records[key].batch_size, 1)
+
+        summary = instrumentation.summary()
+        self.assertEqual(summary["InstrumentedBackend"]["tasks_total"], 3)
+        self.assertEqual(summary["InstrumentedBackend"]["batch_size_mean"], 3)
+        self.assertEqual(summary[""]["tasks_total"], 1)
+
+    def test_prometheus(self):
+        dsk, key = self.get_graph()
+        with Instrumentation(keep_records=False) as instrumentation:
+            scheduler.get_asyncio(dsk, key, batch_optimizations=[])
+        self.assertEqual(instrumentation.records, [])
+        text = instrumentation.to_prometheus()
+        self.assertIn("# TYPE feste_tasks_total counter", text)
+        self.assertIn('feste_tasks_total{backend="InstrumentedBackend"} 3', text)
+        self.assertIn("# TYPE feste_task_duration_seconds histogram", text)
+        self.assertIn('feste_batch_size_bucket{backend="InstrumentedBackend",'
+                      'le="+Inf"} 3', text)
+
+    def test_accumulates(self):
+        backend = InstrumentedBackend()
+        with Instrumentation() as instrumentation:
+            feste.compute(backend.echo("a"), scheduler_fn=scheduler.get_asyncio)
+            feste.compute(backend.echo("b"), scheduler_fn=scheduler.get_asyncio)
+        self.assertEqual(instrumentation.summary()["InstrumentedBackend"]
+                         ["tasks_total"], 2)
+        instrumentation.reset()
+        self.assertEqual(instrumentation.summary(), {})
@@ -0,0 +1,250 @@
+import datetime
+import unittest
+
+import feste
+from feste import context
+from feste.backend.openai import CompleteParams, OpenAI
+from feste.graph import FesteGraph
+from feste.optimization import (BatchOptimization,
+                                CommonSubexpressionElimination, bind_task,
+                                dependency_levels)
+from feste.prompt import Prompt
+from feste.scheduler import get_asyncio
+from feste.task import FesteBase, feste_task
+
+
+class DeterministicBackend(FesteBase):
+    @classmethod
+    def deterministic_tasks(cls):
+        return {cls.echo._obj: None}
+
+    @feste_task
+    def echo(self, text, options):
+        return text
+
+
+class BatchBackend(FesteBase):
+    @feste_task
+    def echo(self, text):
+        return text
+
+    @feste_task
+    def echo_batch(self, texts):
+        return ["batched " + t for t in texts]
+
+    @classmethod
+    def optimizations(cls):
+        return [BatchOptimization({cls.echo._obj: cls.echo_batch._obj})]
+
+
+class TestBatchOptimization(unittest.TestCase):
+    def setUp(self):
+        self.backend = BatchBackend()
+        self.optim = BatchBackend.optimizations()[0]
+
+    def test_batch_tasks(self):
+        a = self.backend.echo("a")
+        b = self.backend.echo("b")
+        feste_graph, _, _ = FesteGraph.collect(a, b)
+        batches = self.optim.batch_tasks(dict(feste_graph))
+        self.assertEqual(len(batches), 1)
+        (batch_task, keys), = batches.values()
+        self.assertEqual(keys, [a.key, b.key])
+        self.assertEqual(batch_task[2], ["a", "b"])
+
+    def test_batch_tasks_single(self):
+        a = self.backend.echo("a")
+        feste_graph, _, _ = FesteGraph.collect(a)
+        self.assertEqual(self.optim.batch_tasks(dict(feste_graph)), {})
+
+    def test_dependency_levels(self):
+        a = self.backend.echo("a")
+        b = self.backend.echo(a)
+        feste_graph, _, _ = FesteGraph.collect(b)
+        levels = dependency_levels(feste_graph)
+        self.assertEqual(levels[a.key], 0)
+        self.assertEqual(levels[b.key], 1)
+
+    def test_apply_chained(self):
+        a = self.backend.echo("a")
+        b = self.backend.echo("b")
+        c = self.backend.echo(a)
+        feste_graph, _, _ = FesteGraph.collect(b, c)
+        feste_graph = self.optim.apply(feste_graph)
+        # Only the calls from the same level are batched
+        batch_keys = [k for k in feste_graph if k.startswith("fuse-batch-")]
+        self.assertEqual(len(batch_keys), 1)
+        ret = c.compute()
+        self.assertEqual(ret, "a")
+
+    def test_split_max_size(self):
+        optim = BatchOptimization({}, max_batch_size=4)
+        batches = optim.split(["a"] * 10)
+        self.assertEqual([len(b) for b in batches], [4, 3, 3])
+        self.assertEqual(sum(batches, []), list(range(10)))
+
+    def test_split_max_tokens(self):
+        optim = BatchOptimization({}, max_batch_tokens=10)
+        # Each text is estimated as 5 tokens
+        batches = optim.split(["x" * 16] * 5)
+        self.assertEqual([len(b) for b in batches], [2, 2, 1])
+
+    def test_split_data(self):
+        optim = BatchOptimization({}, max_batch_tokens=10)
+        data = {"key-1": "x" * 36, "key-2": "y"}
+        batches = optim.split(["key-1", "key-2"], data)
+        self.assertEqual(batches, [[0], [1]])
+
+    def test_split_context(self):
+        optim = BatchOptimization({}, max_batch_size=4)
+        with context.set(**{"batch.max_size": 2}):
+            batches = optim.split(["a"] * 4)
+        self.assertEqual(batches, [[0, 1], [2, 3]])
+
+    def test_batch_tasks_split(self):
+        optim = BatchOptimization(self.optim.rewrite_rules, max_batch_size=2)
+        calls = [self.backend.echo(t) for t in "abcde"]
+        feste_graph, _, _ = FesteGraph.collect(*calls)
+        batches = optim.batch_tasks(dict(feste_graph))
+        # Batches of 2, 2 and a single call that is not batched
+        self.assertEqual(sorted(len(k) for _, k in batches.values()), [2, 2])
+        ret = [c.compute() for c in calls]
+        self.assertEqual(ret, list("abcde"))
+
+
+class ParamsBackend(FesteBase):
+    def __init__(self, api_key):
+        super().__init__()
+        self.api_key = api_key
+
+    def batching_key(self):
+        return self.api_key
+
+    @feste_task
+    def echo(self, text, suffix="", *, upper=False):
+        text = text + suffix
+        return text.upper() if upper else text
+
+    @feste_task
+    def echo_batch(self, texts, suffix="", *, upper=False):
+        return [self.echo._obj(self, t, suffix, upper=upper) for t in texts]
+
+    @classmethod
+    def optimizations(cls):
+        return [BatchOptimization({cls.echo._obj: cls.echo_batch._obj})]
+
+
+class TestBatchGrouping(unittest.TestCase):
+    def setUp(self):
+        self.optim = ParamsBackend.optimizations()[0]
+
+    def get_batches(self, *calls):
+        feste_graph, _, _ = FesteGraph.collect(*calls)
+        batches = self.optim.batch_tasks(dict(feste_graph))
+        return sorted(sorted(keys) for _, keys in batches.values())
+
+    def test_bind_task(self):
+        backend = ParamsBackend("key")
+        call = backend.echo("a", "!", upper=True)
+        feste_graph, _, _ = FesteGraph.collect(call)
+        bound = bind_task(feste_graph[call.key])
+        self.assertIs(bound.obj, backend)
+        self.assertEqual(bound.batch_arg, "a")
+        self.assertEqual(bound.other_args, {"suffix": "!", "upper": True})
+
+    def test_different_params(self):
+        backend = ParamsBackend("key")
+        a = backend.echo("a", "!")
+        b = backend.echo("b", "?")
+        self.assertEqual(self.get_batches(a, b), [])
+
+    def test_default_params(self):
+        backend = ParamsBackend("key")
+        a = backend.echo("a")
+        b = backend.echo("b", suffix="")
+        self.assertEqual(self.get_batches(a, b), [sorted([a.key, b.key])])
+
+    def test_same_credentials(self):
+        a = ParamsBackend("key").echo("a", upper=True)
+        b = ParamsBackend("key").echo("b", upper=True)
+        c = ParamsBackend("other").echo("c", upper=True)
+        self.assertEqual(self.get_batches(a, b, c), [sorted([a.key, b.key])])
+
+    def test_compute(self):
+        backend = ParamsBackend("key")
+        calls = [backend.echo(t, "!", upper=True) for t in "ab"]
+        calls.append(backend.echo("c"))
+        self.assertEqual(feste.compute(calls), (["A!", "B!", "c"],))
+
+
+class TestCommonSubexpressionElimination(unittest.TestCase):
+    def optimize(self, *calls):
+        feste_graph, _, _ = FesteGraph.collect(*calls)
+        return CommonSubexpressionElimination().apply(feste_graph)
+
+    def test_prompt(self):
+        prompt = Prompt("Question: {{question}}")
+        a = prompt(question="What is your name?")
+        b = prompt(question="What is your name?")
+        c = prompt(question="Who are you?")
+        feste_graph = self.optimize(a, b, c)
+        self.assertEqual(feste_graph[b.key], a.key)
+        self.assertNotEqual(feste_graph[c.key], a.key)
+
+    def test_rewire_dependents(self):
+        prompt = Prompt("Question: {{question}}")
+        api = OpenAI("invalid-key")
+        params = CompleteParams(temperature=0)
+        a = api.complete(prompt(question="a"), params)
+        b = api.complete(prompt(question="a"), params)
+        feste_graph = self.optimize(a, b)
+        self.assertEqual(feste_graph[b.key], a.key)
+        self.assertEqual(len(feste_graph.get_all_dependencies()[a.key]), 1)
+
+    def test_temperature(self):
+        prompt = Prompt("Question: {{question}}")
+        api = OpenAI("invalid-key")
+        a = api.complete(prompt(question="a"))
+        b = api.complete(prompt(question="a"))
+        feste_graph = self.optimize(a, b)
+        self.assertEqual(feste_graph[b.key][0], feste_graph[a.key][0])
+
+    def test_equal_objects(self):
+        backend = DeterministicBackend()
+        a = backend.echo("a", datetime.date(2023, 4, 1))
+        b = backend.echo("a", datetime.date(2023, 4, 1))
+        c = backend.echo("a", datetime.date(2023, 4, 2))
+        # Objects that can't be tokenized are compared by identity
+        options = object()
+        d = backend.echo("a", options)
+        e = backend.echo("a", object())
+        f = backend.echo("a", options)
+        feste_graph = self.optimize(a, b, c, d, e, f)
+        self.assertEqual(feste_graph[b.key], a.key)
+        self.assertIsInstance(feste_graph[c.key], tuple)
+        self.assertIsInstance(feste_graph[e.key], tuple)
+        self.assertEqual(feste_graph[f.key], d.key)
+
+    def test_pure(self):
+        calls = []
+
+        @feste_task(pure=True)
+        def pure_fn(x):
+            calls.append(x)
+            return x
+
+        @feste_task
+        def impure_fn(x):
+            return x
+
+        feste_graph = self.optimize(impure_fn(1), impure_fn(1))
+        self.assertTrue(all(isinstance(t, tuple) for t in feste_graph.values()))
+
+        # Objects can't be tokenized, so the keys are different
+        obj = object()
+        a, b = pure_fn(obj), pure_fn(obj)
+        self.assertNotEqual(a.key, b.key)
+        feste_graph = self.optimize(a, b)
+        self.assertEqual(feste_graph[b.key], a.key)
+        self.assertEqual(feste.compute(a, b, scheduler_fn=get_asyncio), (obj, obj))
+        self.assertEqual(calls, [obj])
@@ -0,0 +1,77 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import feste
+from feste.pipeline import JsonlSink, iter_windows, read_jsonl
+from feste.prompt import Prompt
+from feste.task import feste_task
+
+
+@feste_task
+def shout(text):
+    return text.upper()
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.inputs = Path(self.tmpdir.name) / "inputs.jsonl"
+        with self.inputs.open("w") as fhandle:
+            for i in range(7):
+                fhandle.write(json.dumps({"id": i, "name": f"n{i}"}) + "\n")
+            fhandle.write("\n")
+
+    def test_iter_windows(self):
+        windows = list(iter_windows(range(5), 2))
+        self.assertEqual(windows, [[0, 1], [2, 3], [4]])
+        with self.assertRaises(ValueError):
+            list(iter_windows(range(5), 0))
+
+    def test_read_jsonl(self):
+        rows = list(read_jsonl(self.inputs))
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[3], {"id": 3, "name": "n3"})
+
+    def test_stream_compute(self):
+        prompt = Prompt("hi {{ name }}")
+        windows = []
+
+        def build(rows):
+            windows.append(len(rows))
+            prompts = feste.map(prompt, name=[r["name"] for r in rows])
+            return feste.map(shout, prompts)
+
+        outputs = Path(self.tmpdir.name) / "outputs.jsonl"
+        with JsonlSink(outputs, flush_every=2) as sink:
+            for row, result in feste.stream_compute(read_jsonl(self.inputs),
+                                                    build, window_size=3):
+                sink.write({"id": row["id"], "result": result})
+        self.assertEqual(windows, [3, 3, 1])
+        records = list(read_jsonl(outputs))
+        self.assertEqual([r["id"] for r in records], list(range(7)))
+        self.assertEqual(records[5]["result"], "HI N5")
+
+    def test_stream_compute_lazy(self):
+        read = []
+
+        def rows():
+            for i in range(100):
+                read.append(i)
+                yield i
+
+        def build(rows):
+            return [shout(str(row)) for row in rows]
+
+        results = feste.stream_compute(rows(), build, window_size=4,
+                                       max_windows=2)
+        self.assertEqual(next(results), (0, "0"))
+        # Only the windows being computed were read
+        self.assertEqual(len(read), 8)
+        results.close()
+
+    def test_stream_compute_length(self):
+        with self.assertRaises(ValueError):
+            list(feste.stream_compute(range(3), lambda rows: [shout("a")]))
@@ -0,0 +1,112 @@
+import unittest
+
+from dask.callbacks import Callback
+from dask.order import order
+
+import feste
+from feste import context
+from feste.backend.fake import FakeLLM, LatencyModel
+from feste.backend.openai import CompleteParams, OpenAI
+from feste.graph import FesteGraph
+from feste.priority import (CostModel, CriticalPathPriority,
+                            priority_from_context)
+from feste.prompt import Prompt
+from feste.scheduler import get_asyncio
+from feste.task import FesteBase, feste_task
+
+
+@feste_task
+def post_process(text: str) -> str:
+    return text.lower()
+
+
+class SearchBackend(FesteBase):
+    @classmethod
+    def remote_tasks(cls):
+        return [cls.search._obj]
+
+    @feste_task
+    def search(self, query: str) -> str:
+        return query
+
+
+def graph(*args):
+    return dict(FesteGraph.collect(*args)[0])
+
+
+def explode(*args):
+    raise AssertionError("the cost model executed a task")
+
+
+class TestCostModel(unittest.TestCase):
+    def test_prior(self):
+        model = CostModel(backend_latency=1.0, token_latency=0.01,
+                          default_max_tokens=50, task_latency=0.001)
+        api = OpenAI(api_key="invalid-key")
+        dsk = graph([api.complete("a", CompleteParams(max_tokens=300)),
+                     api.complete("b"), FakeLLM("cost").complete("c"),
+                     Prompt("Say {{text}}")(text="d")])
+        costs = sorted(model.estimate(task) for task in dsk.values())
+        self.assertEqual(costs, [0.001, 1.16, 1.5, 4.0])
+
+    def test_prior_remote_tasks(self):
+        model = CostModel(backend_latency=1.0, token_latency=0.01,
+                          default_max_tokens=50, task_latency=0.001)
+        # Remote calls are estimated as backend calls, even if not cacheable
+        (task,) = graph(SearchBackend().search("a")).values()
+        self.assertEqual(model.prior(task), 1.5)
+
+    def test_prior_literal_arguments(self):
+        model = CostModel(backend_latency=1.0, token_latency=0.01,
+                          default_max_tokens=50)
+        api = OpenAI(api_key="invalid-key")
+        (task,) = graph(api.complete("a", CompleteParams(max_tokens=300))).values()
+        params = task[-1]
+        # Tasks building the parameters are never executed
+        self.assertEqual(model.prior(task[:-1] + ((explode, params),)), 1.5)
+        computed = params[:3] + ((explode, 300),) + params[4:]
+        self.assertEqual(model.prior(task[:-1] + (computed,)), 1.5)
+
+    def test_observe(self):
+        model = CostModel(backend_latency=1.0, token_latency=0.0, smoothing=0.5)
+        api = FakeLLM("cost")
+        (task,) = graph(api.complete("a")).values()
+        model.observe(task, 0.2)
+        self.assertAlmostEqual(model.estimate(task), 0.2)
+        model.observe(task, 0.4)
+        self.assertAlmostEqual(model.estimate(task), 0.3)
+
+
+class TestCriticalPath(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeLLM("priority", latency=LatencyModel(0.0))
+        text = self.api.complete("chain")
+        for _ in range(3):
+            text = self.api.complete(post_process(text))
+        self.chain = text
+        self.wide = [post_process(self.api.complete(str(i))) for i in range(4)]
+
+    def test_ranks(self):
+        dsk = graph([self.chain] + self.wide)
+        priority = CriticalPathPriority(dsk, order(dsk), cost_model=CostModel())
+        root = min(priority.ranks, key=priority.sortkey)
+        self.assertEqual(dsk[root][-1], "chain")
+        self.assertGreater(priority.ranks[root], 4.0)
+        # Batches get the priority of their best task
+        priority.batches["batch"] = [root, self.wide[0].key]
+        self.assertEqual(priority.sortkey("batch"), priority.sortkey(root))
+
+    def test_fire_chain_first(self):
+        fired = []
+        with context.set(**{"scheduler.priority": "critical_path",
+                            "asyncio.max_concurrency": 1}), \
+                Callback(pretask=lambda key, dsk, state: fired.append(dsk[key])):
+            (ret,) = feste.compute([self.chain] + self.wide, scheduler_fn=get_asyncio,
+                                   optimize_graph=False)
+        self.assertEqual(ret[0], "CHAIN [PRIORITY] [PRIORITY] [PRIORITY] [priority]")
+        self.assertEqual(fired[0][-1], "chain")
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            priority_from_context({}, {}, {}, "unknown")
+        self.assertIsNone(priority_from_context({}, {}, {}, "order"))
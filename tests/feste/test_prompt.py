@@ -1,4 +1,10 @@
+import pickle
+import tempfile
 import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from jinja2 import FileSystemBytecodeCache
 
 from feste.prompt import FesteEnvironment, Prompt
 
@@ -40,3 +46,40 @@ class TestPrompt(unittest.TestCase):
         c = a + b
         out = c()
         self.assertEqual(out.compute(), "prompt A prompt B")
+
+    def test_compiled_cache(self):
+        p = Prompt("Hello {{message}}.")
+        self.assertIs(p.compiled(), p.compiled())
+        # Copies sent to the workers share the compiled template
+        p_copy = pickle.loads(pickle.dumps(p))
+        self.assertIs(p_copy.compiled(), p.compiled())
+
+    def test_compiled_environment(self):
+        env_a = FesteEnvironment()
+        env_a.globals.update({"name": "A"})
+        env_b = FesteEnvironment()
+        env_b.globals.update({"name": "B"})
+        a = Prompt("{{name}}", environment=env_a)
+        b = Prompt("{{name}}", environment=env_b)
+        self.assertEqual(a.compiled().render(), "A")
+        self.assertEqual(b.compiled().render(), "B")
+
+    def test_variables_cache(self):
+        p = Prompt("{{a}} and {{b}}")
+        with patch.object(p.environment, "parse",
+                          wraps=p.environment.parse) as parse:
+            p.variables()
+            p.variables()
+        self.assertLessEqual(parse.call_count, 1)
+
+    def test_from_file_bytecode_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = Path(tmpdir) / "prompt.txt"
+            filename.write_text("Hello {{message}}.")
+            cache_dir = Path(tmpdir) / "cache"
+            cache_dir.mkdir()
+            p = Prompt.from_file(filename, bytecode_cache=cache_dir)
+            self.assertIsInstance(p.environment.bytecode_cache,
+                                  FileSystemBytecodeCache)
+            self.assertEqual(p(message="World").compute(), "Hello World.")
+            self.assertEqual(len(list(cache_dir.iterdir())), 1)
@@ -0,0 +1,111 @@
+import unittest
+from unittest import mock
+
+from dask.local import synchronous_executor
+
+from feste import context, scheduler
+from feste.backend.openai import CompleteParams
+from feste.graph import FesteGraph
+from feste.ratelimit import (RateLimit, RateLimiter, TokenBucket,
+                             estimate_usage, select_tasks)
+from feste.task import FesteBase, feste_task
+
+
+class LimitedBackend(FesteBase):
+    @feste_task
+    def echo(self, text):
+        return text + "!"
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_wait_time(self):
+        bucket = TokenBucket(60.0, burst_seconds=2.0)
+        now = bucket.last
+        self.assertEqual(bucket.wait_time(2, now), 0.0)
+        bucket.consume(2)
+        self.assertAlmostEqual(bucket.wait_time(1, now), 1.0)
+        self.assertEqual(bucket.wait_time(1, now + 1.0), 0.0)
+
+    def test_larger_than_capacity(self):
+        bucket = TokenBucket(60.0, burst_seconds=2.0)
+        self.assertEqual(bucket.wait_time(10, bucket.last), 0.0)
+        bucket.consume(10)
+        self.assertAlmostEqual(bucket.wait_time(10, bucket.last), 10.0)
+
+
+class TestRateLimit(unittest.TestCase):
+    def test_requests(self):
+        limit = RateLimit(requests_per_minute=60, burst_seconds=2.0)
+        self.assertEqual(limit.acquire(), 0.0)
+        self.assertEqual(limit.acquire(), 0.0)
+        self.assertGreater(limit.acquire(), 0.0)
+
+    def test_tokens(self):
+        limit = RateLimit(tokens_per_minute=600, burst_seconds=1.0)
+        self.assertEqual(limit.acquire(tokens=10), 0.0)
+        self.assertGreater(limit.acquire(tokens=10), 0.0)
+
+    def test_estimate_usage(self):
+        params = CompleteParams(max_tokens=10)
+        self.assertEqual(estimate_usage("a" * 8, {"params": params}), 13)
+        self.assertEqual(estimate_usage(["a" * 8] * 2, {}), 6)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def get_graph(self, backend, num_calls):
+        outputs = [backend.echo(str(i)) for i in range(num_calls)]
+        feste_graph, _, _ = FesteGraph.collect(outputs)
+        return dict(feste_graph), [o.key for o in outputs]
+
+    def test_limit_for(self):
+        limit = RateLimit(requests_per_minute=60)
+        limiter = RateLimiter({FesteBase: limit})
+        self.assertIs(limiter.limit_for(LimitedBackend()), limit)
+        self.assertIsNone(RateLimiter({}).limit_for(LimitedBackend()))
+
+    def test_select_tasks(self):
+        dsk, keys = self.get_graph(LimitedBackend(), 3)
+        limiter = RateLimiter({LimitedBackend: RateLimit(60, burst_seconds=1.0)})
+        state = {"ready": list(keys), "cache": {}}
+        selected, wait = select_tasks(dsk, state, 3, limiter)
+        self.assertEqual(selected, [keys[-1]])
+        self.assertGreater(wait, 0.0)
+        self.assertEqual(state["ready"], keys[:-1])
+
+    def test_select_tasks_costs(self):
+        dsk, keys = self.get_graph(LimitedBackend(), 3)
+        dsk["other"] = (len, "abc")
+        limit = RateLimit(60, burst_seconds=1.0)
+        limiter = RateLimiter({LimitedBackend: limit})
+        state = {"ready": ["other"] + keys, "cache": {}}
+        with mock.patch.object(limiter, "task_cost",
+                               wraps=limiter.task_cost) as task_cost, \
+                mock.patch.object(limit, "acquire", wraps=limit.acquire) as acquire:
+            select_tasks(dsk, state, 4, limiter)
+            # The other keys of the throttled limit are skipped
+            self.assertEqual(acquire.call_count, 2)
+            self.assertEqual(state["ready"], keys[:-1])
+            select_tasks(dsk, state, 4, limiter)
+        # The costs of the ready keys are only resolved once
+        self.assertEqual(task_cost.call_count, 4)
+        self.assertEqual(set(state["task_costs"]), set(keys[:-1]))
+
+    def test_get_async(self):
+        backend = LimitedBackend()
+        dsk, keys = self.get_graph(backend, 3)
+        limiter = RateLimiter({LimitedBackend: RateLimit(600, burst_seconds=0.1)})
+        with mock.patch("feste.scheduler.time.sleep",
+                        wraps=scheduler.time.sleep) as sleep:
+            ret = scheduler.get_async(synchronous_executor.submit, 1, dsk, keys,
+                                      batch_optimizations=[], chunksize=-1,
+                                      rate_limiter=limiter)
+        self.assertEqual(ret, ("0!", "1!", "2!"))
+        self.assertTrue(sleep.called)
+
+    def test_get_asyncio_context(self):
+        backend = LimitedBackend()
+        dsk, keys = self.get_graph(backend, 2)
+        limits = {LimitedBackend: RateLimit(600, burst_seconds=0.1)}
+        with context.set(**{"scheduler.rate_limits": limits}):
+            ret = scheduler.get_asyncio(dsk, keys)
+        self.assertEqual(ret, ("0!", "1!"))
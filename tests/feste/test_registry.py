@@ -0,0 +1,71 @@
+import pickle
+import unittest
+
+import cloudpickle
+
+import feste
+from feste import context
+from feste.prompt import Prompt
+from feste.registry import ObjectRegistry
+from feste.task import FesteBase, feste_task
+
+
+class CountingBackend(FesteBase):
+    pickled = 0
+
+    def __init__(self):
+        super().__init__()
+        self.payload = "x" * 10000
+
+    def __getstate__(self):
+        CountingBackend.pickled += 1
+        return self.__dict__
+
+    @feste_task
+    def echo(self, text):
+        return text
+
+
+class TestObjectRegistry(unittest.TestCase):
+    def test_register_graph(self):
+        backend = CountingBackend()
+        prompt = Prompt("{{ text }}")
+        dsk = {
+            "a": (CountingBackend.echo._obj, backend, "a"),
+            "b": (CountingBackend.echo._obj, backend, (prompt, "b")),
+            "c": [1, {"d": prompt}],
+        }
+        registry = ObjectRegistry()
+        self.assertEqual(registry.register_graph(dsk, (FesteBase,)), 2)
+        self.assertEqual(registry.register(backend), registry.register(backend))
+
+    def test_dumps_loads(self):
+        backend = CountingBackend()
+        registry = ObjectRegistry()
+        registry.register(backend)
+        task = (CountingBackend.echo._obj, backend, "a")
+        payload = registry.dumps(task)
+        self.assertLess(len(payload), len(cloudpickle.dumps(task)) - 9000)
+        self.assertIs(registry.loads(payload)[1], backend)
+
+        # Worker side, the registry is unpickled once
+        worker_registry = pickle.loads(cloudpickle.dumps(registry))
+        worker_task = worker_registry.loads(payload)
+        self.assertIsNot(worker_task[1], backend)
+        self.assertEqual(worker_task[1].payload, backend.payload)
+        # Results referencing registered objects are also sent by token
+        result = worker_registry.dumps(worker_task[1])
+        self.assertIs(registry.loads(result), backend)
+
+    def test_compute(self):
+        backend = CountingBackend()
+        tasks = [backend.echo(str(i)) for i in range(6)]
+        CountingBackend.pickled = 0
+        ret = feste.compute(tasks, optimize_graph=False)
+        self.assertEqual(ret, ([str(i) for i in range(6)],))
+        self.assertEqual(CountingBackend.pickled, 1)
+
+        CountingBackend.pickled = 0
+        with context.set(**{"multiprocessing.object_registry": False}):
+            feste.compute(tasks, optimize_graph=False)
+        self.assertGreaterEqual(CountingBackend.pickled, 6)
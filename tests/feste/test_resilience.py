@@ -0,0 +1,155 @@
+import asyncio
+import time
+import unittest
+
+from dask.local import synchronous_executor
+
+from feste import context, scheduler
+from feste.graph import FesteGraph
+from feste.resilience import (LatencyTracker, RetryPolicy, acall_with_retries,
+                              call_with_retries, latency_tracker,
+                              resilient_task)
+from feste.task import FesteBase, feste_task
+
+
+class TransientError(Exception):
+    pass
+
+
+class FlakyBackend(FesteBase):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+        self.calls = 0
+
+    @classmethod
+    def transient_errors(cls):
+        return (TransientError,)
+
+    @feste_task
+    def echo(self, text):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise TransientError()
+        return text + "!"
+
+    async def aecho(self, text):
+        return self.echo._obj(self, text)
+
+    @classmethod
+    def async_variants(cls):
+        return {cls.echo._obj: cls.aecho}
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_backoff(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=3.0)
+        for attempt in range(5):
+            delay = policy.backoff(attempt)
+            self.assertGreaterEqual(delay, 0.0)
+            self.assertLessEqual(delay, min(3.0, 2 ** attempt))
+
+    def test_latency_quantile(self):
+        tracker = LatencyTracker()
+        self.assertIsNone(tracker.quantile("f", 0.95))
+        for i in range(100):
+            tracker.observe("f", float(i))
+        self.assertEqual(tracker.quantile("f", 0.95), 95.0)
+        self.assertIsNone(tracker.quantile("f", 0.95, min_samples=101))
+
+
+class TestCallWithRetries(unittest.TestCase):
+    def test_retries(self):
+        backend = FlakyBackend(failures=2)
+        policy = RetryPolicy(max_retries=2, base_delay=0.0)
+        ret = call_with_retries(policy, (TransientError,),
+                                FlakyBackend.echo._obj, backend, "a")
+        self.assertEqual(ret, "a!")
+        self.assertEqual(backend.calls, 3)
+
+    def test_retries_exhausted(self):
+        backend = FlakyBackend(failures=2)
+        policy = RetryPolicy(max_retries=1, base_delay=0.0)
+        with self.assertRaises(TransientError):
+            call_with_retries(policy, (TransientError,),
+                              FlakyBackend.echo._obj, backend, "a")
+
+    def test_non_transient(self):
+        def fail():
+            raise ValueError()
+        with self.assertRaises(ValueError):
+            call_with_retries(RetryPolicy(base_delay=0.0), (TransientError,), fail)
+
+    def test_timeout(self):
+        calls = []
+
+        def slow():
+            calls.append(1)
+            if len(calls) == 1:
+                time.sleep(0.5)
+            return "done"
+        policy = RetryPolicy(timeout=0.05, base_delay=0.0)
+        self.assertEqual(call_with_retries(policy, (), slow), "done")
+        self.assertEqual(len(calls), 2)
+
+    def test_hedge(self):
+        calls = []
+
+        def hedged():
+            calls.append(1)
+            if len(calls) == 21:
+                time.sleep(0.5)
+            return "done"
+        policy = RetryPolicy(hedge=True)
+        for _ in range(21):
+            self.assertEqual(call_with_retries(policy, (), hedged), "done")
+        self.assertEqual(len(calls), 22)
+        latency_tracker.latencies.clear()
+
+    def test_async_retries_and_timeout(self):
+        backend = FlakyBackend(failures=1)
+        policy = RetryPolicy(base_delay=0.0)
+        ret = asyncio.run(acall_with_retries(policy, (TransientError,),
+                                             FlakyBackend.aecho, backend, "a"))
+        self.assertEqual(ret, "a!")
+
+        async def slow():
+            await asyncio.sleep(1.0)
+        with self.assertRaises(TimeoutError):
+            asyncio.run(acall_with_retries(
+                RetryPolicy(timeout=0.01, max_retries=1, base_delay=0.0), (), slow))
+
+
+class TestSchedulerRetries(unittest.TestCase):
+    def get_graph(self, backend):
+        output = backend.echo("a")
+        feste_graph, _, _ = FesteGraph.collect([output])
+        return dict(feste_graph), [output.key]
+
+    def test_resilient_task(self):
+        dsk, keys = self.get_graph(FlakyBackend(0))
+        self.assertIs(resilient_task(dsk[keys[0]], None), dsk[keys[0]])
+        task = resilient_task(dsk[keys[0]], RetryPolicy())
+        self.assertIsNot(task, dsk[keys[0]])
+        self.assertEqual(task[1:], dsk[keys[0]][1:])
+
+    def test_get_async(self):
+        backend = FlakyBackend(failures=2)
+        dsk, keys = self.get_graph(backend)
+        policy = RetryPolicy(base_delay=0.0)
+        ret = scheduler.get_async(synchronous_executor.submit, 1, dsk, keys,
+                                  batch_optimizations=[], retry_policy=policy)
+        self.assertEqual(ret, ("a!",))
+
+    def test_get_asyncio_context(self):
+        backend = FlakyBackend(failures=2)
+        dsk, keys = self.get_graph(backend)
+        with context.set(**{"scheduler.retry_policy": RetryPolicy(base_delay=0.0)}):
+            ret = scheduler.get_asyncio(dsk, keys)
+        self.assertEqual(ret, ("a!",))
+
+    def test_no_policy(self):
+        backend = FlakyBackend(failures=1)
+        dsk, keys = self.get_graph(backend)
+        with self.assertRaises(TransientError):
+            scheduler.get_asyncio(dsk, keys)
@@ -0,0 +1,159 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from dask.local import synchronous_executor
+
+import feste
+from feste import scheduler
+from feste.graph import FesteGraph
+from feste.optimization import BatchOptimization
+from feste.task import FesteBase, feste_task
+
+
+class DummyBackend(FesteBase):
+    @feste_task
+    def echo(self, text):
+        return "sync " + text
+
+    async def aecho(self, text):
+        await asyncio.sleep(0)
+        return "async " + text
+
+    @classmethod
+    def async_variants(cls):
+        return {cls.echo._obj: cls.aecho}
+
+
+class BatchBackend(FesteBase):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    @feste_task
+    def echo(self, text):
+        self.calls.append(1)
+        return text
+
+    @feste_task
+    def echo_batch(self, texts):
+        self.calls.append(len(texts))
+        return [t + "!" for t in texts]
+
+    @classmethod
+    def optimizations(cls):
+        return [BatchOptimization({cls.echo._obj: cls.echo_batch._obj})]
+
+
+class TestDynamicBatching(unittest.TestCase):
+    def get_chained_graph(self, backend):
+        @feste_task
+        def upper(text):
+            return text.upper()
+
+        outputs = [backend.echo(upper(backend.echo(t))) for t in "abc"]
+        feste_graph, _, _ = FesteGraph.collect(outputs)
+        return dict(feste_graph), [o.key for o in outputs]
+
+    def test_get_async(self):
+        backend = BatchBackend()
+        dsk, keys = self.get_chained_graph(backend)
+        ret = scheduler.get_async(synchronous_executor.submit, 1, dsk, keys,
+                                  batch_optimizations=backend.optimizations(),
+                                  chunksize=-1)
+        self.assertEqual(ret, ("A!!", "B!!", "C!!"))
+        self.assertEqual(backend.calls, [3, 3])
+
+    def test_get_async_disabled(self):
+        backend = BatchBackend()
+        dsk, keys = self.get_chained_graph(backend)
+        ret = scheduler.get_async(synchronous_executor.submit, 1, dsk, keys,
+                                  batch_optimizations=[], chunksize=-1)
+        self.assertEqual(ret, ("A", "B", "C"))
+        self.assertEqual(backend.calls, [1] * 6)
+
+    def test_get_asyncio(self):
+        backend = BatchBackend()
+        dsk, keys = self.get_chained_graph(backend)
+        ret = scheduler.get_asyncio(dsk, keys,
+                                    batch_optimizations=backend.optimizations())
+        self.assertEqual(ret, ("A!!", "B!!", "C!!"))
+        self.assertEqual(backend.calls, [3, 3])
+
+    def test_bound_once(self):
+        backend = BatchBackend()
+        dsk, keys = self.get_chained_graph(backend)
+        optim = backend.optimizations()[0]
+        # Tasks are fired one at a time, so the ready list is batched
+        # again after each task finishes
+        with patch.object(optim, "bind_call", wraps=optim.bind_call) as bind_call:
+            ret = scheduler.get_async(synchronous_executor.submit, 1, dsk, keys,
+                                      batch_optimizations=[optim], chunksize=1)
+        self.assertEqual(ret, ("A!", "B!", "C!"))
+        self.assertEqual(backend.calls, [3, 1, 1, 1])
+        self.assertEqual(bind_call.call_count, len(dsk))
+
+    def test_pretask_callbacks(self):
+        from dask.callbacks import Callback
+        backend = BatchBackend()
+        dsk, keys = self.get_chained_graph(backend)
+        started = []
+        with Callback(pretask=lambda key, dsk, state: started.append(key)):
+            scheduler.get_async(synchronous_executor.submit, 1, dsk, keys,
+                                batch_optimizations=backend.optimizations())
+        self.assertEqual(set(started), set(dsk))
+
+
+class TestAsyncioScheduler(unittest.TestCase):
+    def test_compute(self):
+        @feste_task
+        def add(x, y):
+            return x + y
+
+        a = add(1, 1)
+        b = add(2, 2)
+        v = a + b
+        ret = feste.compute(v, scheduler_fn=scheduler.get_asyncio)
+        self.assertEqual(ret, (6,))
+
+    def test_async_variant(self):
+        backend = DummyBackend()
+        ret = backend.echo(backend.echo("a"))
+        ret = feste.compute(ret, scheduler_fn=scheduler.get_asyncio)
+        self.assertEqual(ret, ("async async a",))
+
+    def test_kwargs(self):
+        @feste_task
+        def concat(x, y=""):
+            return x + y
+
+        ret = concat("a", y=concat("b", y="c"))
+        ret = feste.compute(ret, scheduler_fn=scheduler.get_asyncio)
+        self.assertEqual(ret, ("abc",))
+
+    def test_max_concurrency(self):
+        running = []
+        max_running = []
+
+        class ConcurrencyBackend(FesteBase):
+            async def arun(self, x):
+                running.append(x)
+                max_running.append(len(running))
+                await asyncio.sleep(0.01)
+                running.remove(x)
+                return x
+
+        backend = ConcurrencyBackend()
+        tasks = [feste_task(backend.arun)(i) for i in range(10)]
+        ret = feste.compute(tasks, scheduler_fn=scheduler.get_asyncio,
+                            max_concurrency=3)
+        self.assertEqual(ret, (list(range(10)),))
+        self.assertEqual(max(max_running), 3)
+
+    def test_exception(self):
+        @feste_task
+        def fail():
+            raise RuntimeError("failed")
+
+        with self.assertRaises(RuntimeError):
+            feste.compute(fail(), scheduler_fn=scheduler.get_asyncio)
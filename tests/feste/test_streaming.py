@@ -0,0 +1,93 @@
+import pickle
+import queue
+import unittest
+
+from dask.local import synchronous_executor
+
+import feste
+from feste import context, scheduler
+from feste.graph import FesteGraph
+from feste.streaming import (StreamedText, emit, stream_to, streaming_task,
+                             task_function)
+from feste.task import FesteBase, feste_task
+
+
+class StreamingBackend(FesteBase):
+    @classmethod
+    def streaming_tasks(cls):
+        return [cls.generate._obj]
+
+    @feste_task
+    def generate(self, prompt):
+        for token in prompt.split():
+            emit(token)
+        return StreamedText(prompt.upper(), 0.0, 0.0)
+
+    @feste_task
+    def silent(self, prompt):
+        emit(prompt)
+        return prompt
+
+
+class TestStreaming(unittest.TestCase):
+    def get_graph(self, backend):
+        outputs = [backend.generate("a b"), backend.silent("c")]
+        feste_graph, _, _ = FesteGraph.collect(outputs)
+        return dict(feste_graph), [o.key for o in outputs]
+
+    def test_emit(self):
+        deltas = []
+        emit("ignored")
+        with stream_to(deltas.append):
+            emit("a")
+        emit("ignored")
+        self.assertEqual(deltas, ["a"])
+
+    def test_streamed_text(self):
+        text = StreamedText("abc", 0.1, 0.5)
+        loaded = pickle.loads(pickle.dumps(text))
+        self.assertEqual(loaded, "abc")
+        self.assertEqual(loaded.time_to_first_token, 0.1)
+        self.assertEqual(loaded.elapsed, 0.5)
+
+    def test_streaming_task(self):
+        dsk, keys = self.get_graph(StreamingBackend())
+        task = dsk[keys[0]]
+        self.assertIs(task_function(task), StreamingBackend.generate._obj)
+        received = []
+        wrapped = streaming_task(keys[0], task, lambda *item: received.append(item))
+        self.assertEqual(wrapped[0](*wrapped[1:]), "A B")
+        self.assertEqual(received, [(keys[0], "a"), (keys[0], "b")])
+
+    def test_get_async(self):
+        dsk, keys = self.get_graph(StreamingBackend())
+        received = []
+        ret = scheduler.get_async(synchronous_executor.submit, 1, dsk, keys,
+                                  stream_callback=lambda *item: received.append(item))
+        self.assertEqual(ret, ("A B", "c"))
+        self.assertEqual(received, [(keys[0], "a"), (keys[0], "b")])
+
+    def test_get_async_queue(self):
+        dsk, keys = self.get_graph(StreamingBackend())
+        received = []
+        scheduler.get_async(synchronous_executor.submit, 1, dsk, keys,
+                            stream_callback=lambda *item: received.append(item),
+                            stream_queue=queue.Queue())
+        self.assertEqual(received, [(keys[0], "a"), (keys[0], "b")])
+
+    def test_get_asyncio(self):
+        dsk, keys = self.get_graph(StreamingBackend())
+        received = []
+        with context.set(**{"scheduler.stream_callback":
+                            lambda *item: received.append(item)}):
+            ret = scheduler.get_asyncio(dsk, keys)
+        self.assertEqual(ret, ("A B", "c"))
+        self.assertEqual(received, [(keys[0], "a"), (keys[0], "b")])
+
+    def test_multiprocessing(self):
+        backend = StreamingBackend()
+        received = []
+        ret = feste.compute(backend.generate("a b c"),
+                            stream_callback=lambda *item: received.append(item))
+        self.assertEqual(ret, ("A B C",))
+        self.assertEqual([delta for _, delta in received], ["a", "b", "c"])
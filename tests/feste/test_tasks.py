@@ -1,5 +1,7 @@
 import unittest
 
+import dask
+
 from feste import context, task
 
 
@@ -54,3 +56,34 @@ class TestTask(unittest.TestCase):
             self.assertIsInstance(ret, task.FesteDelayed)
 
 
+
+    def test_task_keys(self):
+        @task.feste_task
+        def add(x, y):
+            return x + y
+
+        self.assertNotEqual(add(1, 1).key, add(1, 1).key)
+        self.assertTrue(add(1, 1).key.startswith("add-"))
+
+        pure_add = task.feste_task(add._obj, pure=True)
+        self.assertEqual(pure_add(1, 1).key, pure_add(1, 1).key)
+        self.assertNotEqual(pure_add(1, 1).key, pure_add(1, 2).key)
+
+    def test_task_kwargs(self):
+        @task.feste_task
+        def add(x, y=0):
+            return x + y
+
+        a = add(1)
+        b = add(a, y=a)
+        self.assertEqual(b.compute(), 2)
+
+    def test_task_dask_graph(self):
+        @task.feste_task
+        def add(x, y):
+            return x + y
+
+        a = add(1, 1)
+        b = add(a, a)
+        self.assertSetEqual(set(b.dask), {a.key, b.key})
+        self.assertEqual(dask.compute(b, scheduler="sync")[0], 4)
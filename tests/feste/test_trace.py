@@ -0,0 +1,65 @@
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import feste
+from feste import scheduler
+from feste.task import feste_task
+from feste.trace import Tracer
+
+
+@feste_task
+def slow(text, delay):
+    time.sleep(delay)
+    return text
+
+
+@feste_task
+def join(*texts):
+    return "".join(texts)
+
+
+class TestTracer(unittest.TestCase):
+    def get_outputs(self):
+        a = slow("a", 0.05)
+        b = slow(a, 0.05)
+        c = slow("c", 0.01)
+        return a, b, c, join(b, c)
+
+    def test_critical_path(self):
+        a, b, c, output = self.get_outputs()
+        with Tracer() as tracer:
+            feste.compute(output, scheduler_fn=scheduler.get_asyncio)
+        critical = tracer.critical_path()
+        self.assertEqual(critical.keys, [a.key, b.key, output.key])
+        self.assertGreater(critical.busy_time, 0.1)
+        self.assertGreaterEqual(critical.wall_time, critical.busy_time * 0.9)
+        self.assertGreater(critical.share, 0.5)
+        report = tracer.report()
+        self.assertIn("Critical path: 3 tasks", report)
+        self.assertIn(str(a.key), report)
+
+    def test_chrome_trace(self):
+        a, b, c, output = self.get_outputs()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "trace.json"
+            ret = feste.compute(output, scheduler_fn=scheduler.get_asyncio,
+                                trace=path)
+            with open(path) as fhandle:
+                trace = json.load(fhandle)
+        self.assertEqual(ret, ("ac",))
+        spans = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+        self.assertEqual(len(spans), 4)
+        critical = {k for e in spans if e["args"]["critical"] for k in e["args"]["keys"]}
+        self.assertEqual(critical, {str(a.key), str(b.key), str(output.key)})
+        # Concurrent spans of the same worker are placed in separate lanes
+        lanes = {e["tid"] for e in spans}
+        self.assertGreater(len(lanes), 1)
+        self.assertEqual(trace["otherData"]["critical_path"][-1], str(output.key))
+
+    def test_empty(self):
+        tracer = Tracer()
+        self.assertEqual(tracer.critical_path().keys, [])
+        self.assertEqual(tracer.chrome_trace()["traceEvents"], [])
@@ -0,0 +1,88 @@
+import unittest
+
+import feste
+from feste import context
+from feste.graph import FesteGraph
+from feste.optimization import BatchOptimization
+from feste.prompt import Prompt
+from feste.scheduler import get_asyncio
+from feste.task import FesteBase, feste_task
+from feste.vectorize import FesteMapped
+
+
+class MapBackend(FesteBase):
+    @feste_task
+    def echo(self, text, suffix=""):
+        return text + suffix
+
+    @feste_task
+    def echo_batch(self, texts, suffix=""):
+        return ["batched " + t + suffix for t in texts]
+
+    @classmethod
+    def optimizations(cls):
+        return [BatchOptimization({cls.echo._obj: cls.echo_batch._obj},
+                                  max_batch_size=2)]
+
+
+@feste_task
+def add(x, y):
+    return x + y
+
+
+class TestMap(unittest.TestCase):
+    def setUp(self):
+        self.backend = MapBackend()
+
+    def test_map_function(self):
+        mapped = feste.map(add, [1, 2, 3], y=10)
+        self.assertIsInstance(mapped, FesteMapped)
+        self.assertEqual(len(mapped), 3)
+        (ret,) = feste.compute(mapped, scheduler_fn=get_asyncio)
+        self.assertEqual(ret, [11, 12, 13])
+
+    def test_map_batched_chunks(self):
+        mapped = feste.map(self.backend.echo, ["a", "b", "c", "d", "e"],
+                           suffix="!")
+        feste_graph, _, _ = FesteGraph.collect(mapped)
+        # Three chunks (at most 2 rows each) and the concatenation
+        self.assertEqual(len(feste_graph), 4)
+        (ret,) = feste.compute(mapped, scheduler_fn=get_asyncio)
+        self.assertEqual(ret, ["batched a!", "batched b!", "batched c!",
+                               "batched d!", "batched e!"])
+
+    def test_map_batch_size(self):
+        mapped = feste.map(add, list(range(10)), 1, batch_size=4)
+        self.assertEqual(mapped._bounds, [(0, 3), (3, 6), (6, 10)])
+
+    def test_map_prompt_columns(self):
+        prompt = Prompt("{{ name }} is {{ age }}")
+        data = {"name": ["Ann", "Bob"], "age": range(30, 50, 10)}
+        prompts = feste.map(prompt, data)
+        completions = feste.map(self.backend.echo, prompts)
+        (ret,) = feste.compute(completions, scheduler_fn=get_asyncio)
+        self.assertEqual(ret, ["batched Ann is 30", "batched Bob is 40"])
+
+    def test_map_chained_chunks(self):
+        first = feste.map(add, list(range(6)), 1, batch_size=3)
+        second = feste.map(add, first, 1)
+        # The chunks of the mapped column are reused
+        self.assertEqual(second._bounds, first._bounds)
+        third = feste.map(add, first, second, batch_size=2)
+        self.assertEqual(third._bounds, [(0, 1), (1, 3), (3, 4), (4, 6)])
+        (ret,) = feste.compute(second, scheduler_fn=get_asyncio)
+        self.assertEqual(ret, [2, 3, 4, 5, 6, 7])
+        (ret,) = feste.compute(third, scheduler_fn=get_asyncio)
+        self.assertEqual(ret, [3, 5, 7, 9, 11, 13])
+
+    def test_map_eager(self):
+        with context.set(eager=True):
+            backend = MapBackend()
+            ret = feste.map(backend.echo, ["a", "b"], suffix="?")
+        self.assertEqual(ret, ["a?", "b?"])
+
+    def test_map_errors(self):
+        with self.assertRaises(ValueError):
+            feste.map(add, 1, 2)
+        with self.assertRaises(ValueError):
+            feste.map(add, [1, 2], [1])